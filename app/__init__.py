@@ -2,6 +2,14 @@ from flask import Flask
 from flask_cors import CORS
 from .config import load_config
 from .models import db, init_db
+from .migrations import run_migrations
+from .sqlite_profile import configure_sqlite, install_sqlite_pragmas
+from .registry_cache import init_registry_cache
+from .archive import init_archive
+from .response_cache import init_response_cache
+from .latest import init_latest
+from .live import init_live
+from .kpis import init_kpis
 from .mqtt_worker import start_mqtt_worker
 from .summarizer import init_scheduler
 from .api import api_bp
@@ -9,14 +17,23 @@ from .web import web_bp
 
 def create_app():
     app = Flask(__name__, static_folder="static", template_folder="web/templates")
-    CORS(app)
+    CORS(app, expose_headers=["X-Next-Cursor"])  # paginated /api/events and /api/alert-events
     load_config(app)
     app.config.setdefault("SQLALCHEMY_DATABASE_URI", app.config.get("DATABASE_URL"))
     app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
 
+    configure_sqlite(app)           # WAL, single writer and read-only reader pool for SQLite files
     db.init_app(app)
+    install_sqlite_pragmas(app, db)
+    init_registry_cache(app)        # site/device lookups shared by all writers
+    init_archive(app)               # Parquet cold tier, when ARCHIVE_DIR is set
+    init_response_cache(app)        # cached API responses, invalidated by write watermarks
+    init_latest(app)                # newest value per series, from the write path
+    init_live(app)                  # pub/sub feeding /api/stream
+    init_kpis(app)                  # running energy/peak totals behind /api/kpis
     with app.app_context():
         init_db()
+        run_migrations()
 
     app.register_blueprint(api_bp, url_prefix="/api")
     app.register_blueprint(web_bp)
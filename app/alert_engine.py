@@ -6,6 +6,9 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from sqlalchemy import select, and_
 from .models import db, Alert, AlertEvent, Device, Metric, Site
+from .last_seen import last_seen
+from .latest import latest
+from .live import publish_alert
 
 class AlertEngine:
     def __init__(self, app):
@@ -125,30 +128,27 @@ class AlertEngine:
         duration_sec = rule.get('duration_sec', 300)  # Default 5 minutes
         
         since = datetime.utcnow() - timedelta(seconds=duration_sec)
+        latest.prime()
         
         for device_id in device_ids:
             device = db.session.get(Device, device_id)
             if not device:
                 continue
                 
-            # Check if device has recent data
-            recent_metric = db.session.scalars(
-                select(Metric).where(
-                    and_(
-                        Metric.device_id == device_id,
-                        Metric.ts >= since
-                    )
-                ).order_by(Metric.ts.desc()).limit(1)
-            ).first()
+            # Both last_seen and the newest stored point are kept in memory
+            newest = latest.newest_ts(device_id)
+            seen = last_seen.freshest(device_id, device.last_seen_at)
+            if seen is None or (newest is not None and newest > seen):
+                seen = newest
             
-            if not recent_metric:
+            if not seen or seen < since:
                 if self._should_fire_alert(alert):
                     self._fire_alert(alert, {
                         'type': 'nodata',
                         'device_id': device_id,
                         'device_name': device.name,
                         'duration': f"{duration_sec}s",
-                        'last_seen': device.last_seen_at.isoformat() if device.last_seen_at else None
+                        'last_seen': seen.isoformat() if seen else None
                     })
                 break
     
@@ -194,6 +194,7 @@ class AlertEngine:
         )
         db.session.add(alert_event)
         db.session.commit()
+        publish_alert(alert, alert_event)
         
         # Send notifications
         self._send_notifications(alert, payload)
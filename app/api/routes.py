@@ -1,8 +1,26 @@
-from flask import jsonify, request, Blueprint
+from flask import jsonify, request, Blueprint, Response, current_app, stream_with_context
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_, or_, func, desc
 import pandas as pd
-from ..models import db, Site, Device, Metric, Room, Event, Alert, AlertEvent, Reading, DailySummary
+from ..models import db, Site, Device, Room, Event, Alert, AlertEvent, DailySummary
+from ..legacy import legacy_readings_frame
+from ..timeseries import read_metrics, iter_metrics
+from ..export import FORMATS as EXPORT_FORMATS
+from ..rollups import parse_span
+from ..buckets import bucket_series
+from ..downsample import METHODS, downsample
+from .. import metric_formats
+from ..metric_formats import FORMATS as METRIC_FORMATS
+from ..metric_writer import upsert_metrics
+from ..decoder import parse_ts
+from ..registry_cache import registry_cache
+from ..last_seen import last_seen
+from ..latest import latest
+from ..kpis import kpis
+from ..response_cache import cached, watermarks
+from ..live import broker
+from ..pagination import paginate
+from ..sqlite_profile import writer_waits
 
 api_bp = Blueprint("api", __name__)
 
@@ -17,11 +35,14 @@ def create_site():
     data = request.get_json()
     site = Site(name=data["name"], tz=data.get("tz", "America/Toronto"))
     db.session.add(site)
+    watermarks.mark("devices")
     db.session.commit()
+    registry_cache.invalidate()
     return jsonify({"id": site.id, "name": site.name, "tz": site.tz}), 201
 
 # Devices API
 @api_bp.get("/devices")
+@cached("devices")
 def get_devices():
     site_id = request.args.get("site_id", type=int)
     device_type = request.args.get("type")
@@ -39,10 +60,75 @@ def get_devices():
     return jsonify([{
         "id": d.id, "site_id": d.site_id, "room_id": d.room_id,
         "name": d.name, "type": d.type, "unit": d.unit,
-        "capabilities": d.capabilities, "last_seen_at": d.last_seen_at.isoformat() if d.last_seen_at else None,
+        "capabilities": d.capabilities, "last_seen_at": _last_seen_iso(d),
         "is_active": d.is_active
     } for d in devices])
 
+def _last_seen_iso(device):
+    seen = last_seen.freshest(device.id, device.last_seen_at)
+    return seen.isoformat() if seen else None
+
+# Latest value per device and key, served from memory
+@api_bp.get("/latest")
+def get_latest():
+    site_id = request.args.get("site_id", type=int)
+    key = request.args.get("key")
+
+    query = select(Device).where(Device.is_active == True)
+    if site_id:
+        query = query.where(Device.site_id == site_id)
+    devices = {d.id: d for d in db.session.scalars(query)}
+
+    latest.prime()
+    return jsonify([{
+        "device_id": device_id, "device_name": devices[device_id].name, "key": metric_key,
+        "ts": ts.isoformat(), "value": value, "unit": devices[device_id].unit
+    } for device_id, points in latest.for_devices(devices, key).items()
+        for metric_key, (ts, value) in sorted(points.items())])
+
+# Today's KPIs of a site from the running totals of app.kpis
+@api_bp.get("/kpis")
+def get_kpis():
+    site_id = request.args.get("site_id", type=int)
+    device_ids = request.args.getlist("device_id", type=int)
+    if not site_id:
+        return jsonify({"error": "site_id is required"}), 400
+    site = db.session.get(Site, site_id)
+    if site is None:
+        return jsonify({"error": "Site not found"}), 404
+
+    query = select(Device).where(Device.site_id == site_id, Device.is_active == True)
+    if device_ids:
+        query = query.where(Device.id.in_(device_ids))
+    devices = {d.id: d for d in db.session.scalars(query)}
+
+    latest.prime()
+    totals = kpis.for_devices(devices)
+    price = current_app.config["ENERGY_PRICE_PER_KWH"]
+    rows = []
+    for device_id, device in devices.items():
+        day = totals[device_id]
+        point = latest.get(device_id, kpis.key)
+        current = point if point is not None and point[0] >= day.day_start else None
+        rows.append({
+            "device_id": device_id, "device_name": device.name, "unit": device.unit,
+            "current_power": kpis.watts(device_id, current[1]) if current else None,
+            "current_ts": current[0].isoformat() if current else None,
+            "energy_kwh": day.energy_wh / 1000,
+            "peak": day.peak, "peak_ts": day.peak_ts.isoformat() if day.peak_ts else None
+        })
+    peak = max((r for r in rows if r["peak"] is not None), key=lambda r: r["peak"], default=None)
+    energy_kwh = sum(r["energy_kwh"] for r in rows)
+    since = min((day.day_start for day in totals.values()), default=None)
+    return jsonify({
+        "site_id": site_id, "key": kpis.key, "since": since.isoformat() if since else None,
+        "current_power": sum(r["current_power"] for r in rows if r["current_power"] is not None),
+        "energy_kwh": energy_kwh,
+        "peak": peak and {"value": peak["peak"], "ts": peak["peak_ts"], "device_id": peak["device_id"]},
+        "cost": round(energy_kwh * price, 4), "price_per_kwh": price,
+        "devices": rows
+    })
+
 @api_bp.post("/devices")
 def create_device():
     data = request.get_json()
@@ -55,7 +141,9 @@ def create_device():
         capabilities=data.get("capabilities", ["realtime"])
     )
     db.session.add(device)
+    watermarks.mark("devices")
     db.session.commit()
+    registry_cache.invalidate()
     return jsonify({
         "id": device.id, "site_id": device.site_id, "room_id": device.room_id,
         "name": device.name, "type": device.type, "unit": device.unit,
@@ -64,90 +152,154 @@ def create_device():
 
 # Metrics API with aggregation
 @api_bp.get("/metrics")
+@cached("metrics", "events", "devices")
 def get_metrics():
     site_id = request.args.get("site_id", type=int)
     device_ids = request.args.getlist("device_id", type=int)
     key = request.args.get("key") or request.args.get("metric", "power")
     from_ts = request.args.get("from")
     to_ts = request.args.get("to")
-    resolution = request.args.get("res", "raw")  # raw, 1m, 15m
+    resolution = request.args.get("res", "raw")  # raw, or a bucket size such as 1m, 15m, 1h, 1d
+    response_format = request.args.get("format", "json")  # json, columnar or arrow
+    if response_format not in METRIC_FORMATS:
+        return jsonify({"error": f"Unsupported format: {response_format}"}), 400
+    method = request.args.get("downsample", "lttb")  # lttb or minmax
+    max_points = request.args.get("max_points", type=int)
+    if method not in METHODS or (max_points is not None and max_points < 2):
+        return jsonify({"error": "max_points must be at least 2 and downsample one of " + ", ".join(METHODS)}), 400
+    # points per device series, never more than METRICS_MAX_POINTS (0 = no cap)
+    limit = current_app.config["METRICS_MAX_POINTS"]
+    if limit:
+        max_points = min(max_points or limit, limit)
     
     # Default to last 24 hours if no time range specified
     if not to_ts:
         to_ts = datetime.utcnow()
     else:
-        to_ts = datetime.fromisoformat(to_ts.replace('Z', '+00:00'))
+        to_ts = parse_ts(to_ts)
     
     if not from_ts:
         from_ts = to_ts - timedelta(hours=24)
     else:
-        from_ts = datetime.fromisoformat(from_ts.replace('Z', '+00:00'))
-    
-    # Build query
-    query = select(Metric).join(Device).where(
-        and_(
-            Metric.ts >= from_ts,
-            Metric.ts <= to_ts,
-            Metric.key == key
-        )
-    )
-    
-    if site_id:
-        query = query.where(Device.site_id == site_id)
-    if device_ids:
-        query = query.where(Metric.device_id.in_(device_ids))
+        from_ts = parse_ts(from_ts)
     
-    metrics = db.session.scalars(query).all()
-    
-    if not metrics:
-        return jsonify({"series": [], "devices": []})
+    if resolution == "raw":
+        df = read_metrics(from_ts, to_ts, key=key, device_ids=device_ids, site_id=site_id)
+    else:
+        span = parse_span(resolution)
+        if span is None:
+            return jsonify({"error": f"Unsupported resolution: {resolution}"}), 400
+        # GROUP BY in the database, over the coarsest rollup tier that tiles the buckets
+        df = bucket_series(span, from_ts, to_ts, key, device_ids=device_ids, site_id=site_id)
     
-    # Convert to DataFrame for aggregation
-    df = pd.DataFrame([{
-        "ts": m.ts, "device_id": m.device_id, "value": m.value
-    } for m in metrics])
+    if max_points and not df.empty:
+        events = _event_windows(from_ts, to_ts, set(df["device_id"].unique().tolist()), site_id)
+        df = downsample(df, max_points, method, column="value" if resolution == "raw" else "mean", events=events)
     
     # Get device info
-    device_ids = df["device_id"].unique()
-    devices = db.session.scalars(select(Device).where(Device.id.in_(device_ids))).all()
+    device_ids = df["device_id"].unique().tolist()
+    devices = db.session.scalars(select(Device).where(Device.id.in_(device_ids))).all() if device_ids else []
     device_info = {d.id: {"name": d.name, "type": d.type, "unit": d.unit} for d in devices}
     
-    if resolution == "raw":
-        series = [{
-            "t": row["ts"].isoformat(),
-            "device_id": row["device_id"],
-            "value": row["value"],
-            "device_name": device_info.get(row["device_id"], {}).get("name", f"Device {row['device_id']}")
-        } for _, row in df.iterrows()]
-    else:
-        # Aggregate by resolution
-        df["ts"] = pd.to_datetime(df["ts"])
-        if resolution == "1m":
-            df["ts_agg"] = df["ts"].dt.floor("1T")
-        elif resolution == "15m":
-            df["ts_agg"] = df["ts"].dt.floor("15T")
-        
-        agg_df = df.groupby(["ts_agg", "device_id"])["value"].mean().reset_index()
-        series = [{
-            "t": row["ts_agg"].isoformat(),
-            "device_id": row["device_id"],
-            "value": row["value"],
-            "device_name": device_info.get(row["device_id"], {}).get("name", f"Device {row['device_id']}")
-        } for _, row in agg_df.iterrows()]
-    
+    if response_format == "arrow":
+        return Response(metric_formats.arrow_stream(df, device_info), mimetype=metric_formats.ARROW_MIMETYPE)
+    series = metric_formats.columnar(df, device_info) if response_format == "columnar" else metric_formats.points(df, device_info)
     return jsonify({
         "series": series,
         "devices": list(device_info.values())
     })
 
+# Several (devices, key, resolution) selections over one window, in one pass per resolution
+@api_bp.post("/metrics/batch")
+def get_metrics_batch():
+    data = request.get_json(silent=True) or {}
+    selections = data.get("selections")
+    if not isinstance(selections, list) or not selections:
+        return jsonify({"error": "selections must be a non-empty list"}), 400
+    site_id = data.get("site_id")
+    if site_id is not None and not isinstance(site_id, int):
+        return jsonify({"error": "site_id must be an integer"}), 400
+    method = data.get("downsample", "lttb")
+    max_points = data.get("max_points")
+    if method not in METHODS or (max_points is not None and (not isinstance(max_points, int) or max_points < 2)):
+        return jsonify({"error": "max_points must be at least 2 and downsample one of " + ", ".join(METHODS)}), 400
+    limit = current_app.config["METRICS_MAX_POINTS"]
+    if limit:
+        max_points = min(max_points or limit, limit)
+
+    groups = {}  # resolution -> [(position, key, device ids or None)]
+    for position, selection in enumerate(selections):
+        key = selection.get("key") if isinstance(selection, dict) else None
+        device_ids = selection.get("device_ids") if isinstance(selection, dict) else None
+        resolution = selection.get("res", "raw") if isinstance(selection, dict) else None
+        if not isinstance(key, str) or not (device_ids is None or (
+                isinstance(device_ids, list) and all(isinstance(d, int) for d in device_ids))):
+            return jsonify({"error": f"selections[{position}] needs a key and optional list of device ids"}), 400
+        if not isinstance(resolution, str) or (resolution != "raw" and parse_span(resolution) is None):
+            return jsonify({"error": f"Unsupported resolution: {resolution}"}), 400
+        groups.setdefault(resolution, []).append((position, key, set(device_ids) if device_ids else None))
+
+    to_ts = parse_ts(data["to"]) if data.get("to") else datetime.utcnow()
+    from_ts = parse_ts(data["from"]) if data.get("from") else to_ts - timedelta(hours=24)
+
+    frames = {}
+    for resolution, group in groups.items():
+        keys = sorted({key for _, key, _ in group})
+        # one read for every selection at this resolution, over the union of their devices
+        scope = None if any(ids is None for _, _, ids in group) else sorted(set().union(*(ids for _, _, ids in group)))
+        if resolution == "raw":
+            df = read_metrics(from_ts, to_ts, key=keys, device_ids=scope, site_id=site_id)
+        else:
+            df = bucket_series(parse_span(resolution), from_ts, to_ts, keys, device_ids=scope, site_id=site_id)
+        for position, key, ids in group:
+            rows = df["key"] == key
+            if ids is not None:
+                rows &= df["device_id"].isin(ids)
+            frames[position] = (resolution, key, df[rows].drop(columns="key"))
+
+    seen = sorted({int(d) for _, _, df in frames.values() for d in df["device_id"].unique()})
+    devices = db.session.scalars(select(Device).where(Device.id.in_(seen))).all() if seen else []
+    device_info = {d.id: {"name": d.name, "type": d.type, "unit": d.unit} for d in devices}
+    events = _event_windows(from_ts, to_ts, set(seen), site_id) if max_points and seen else {}
+
+    results = []
+    for position in range(len(selections)):
+        resolution, key, df = frames[position]
+        if max_points and not df.empty:
+            df = downsample(df, max_points, method, column="value" if resolution == "raw" else "mean", events=events)
+        results.append({"key": key, "res": resolution, "series": metric_formats.columnar(df, device_info)})
+    return jsonify({
+        "from": from_ts.isoformat(), "to": to_ts.isoformat(),
+        "results": results,
+        "devices": device_info
+    })
+
+def _event_windows(from_ts, to_ts, device_ids, site_id):
+    """{device_id: [(start_ts, end_ts, type)]} of detected events overlapping the range"""
+    query = select(Event.start_ts, Event.end_ts, Event.type, Event.device_ids).where(
+        Event.start_ts <= to_ts, Event.end_ts >= from_ts
+    )
+    if site_id:
+        query = query.where(Event.site_id == site_id)
+    windows = {}
+    for start_ts, end_ts, event_type, event_devices in db.session.execute(query):
+        for device_id in set(event_devices or []) & device_ids:
+            windows.setdefault(device_id, []).append((start_ts, end_ts, event_type))
+    return windows
+
 # Events API
 @api_bp.get("/events")
+@cached("events")
 def get_events():
     site_id = request.args.get("site_id", type=int)
     from_ts = request.args.get("from")
     to_ts = request.args.get("to")
     device_ids = request.args.getlist("device_id", type=int)
     
+    limit = _page_limit()
+    if limit is None:
+        return jsonify({"error": f"limit must be between 1 and {current_app.config['API_PAGE_LIMIT']}"}), 400
+    
     query = select(Event)
     if site_id:
         query = query.where(Event.site_id == site_id)
@@ -156,12 +308,49 @@ def get_events():
     if to_ts:
         query = query.where(Event.end_ts <= datetime.fromisoformat(to_ts.replace('Z', '+00:00')))
     
-    events = db.session.scalars(query).all()
-    return jsonify([{
+    try:
+        events, next_cursor = paginate(query, Event.start_ts, Event.id, limit, request.args.get("cursor"),
+                                       descending=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify([{
         "id": e.id, "site_id": e.site_id, "start_ts": e.start_ts.isoformat(),
         "end_ts": e.end_ts.isoformat(), "type": e.type, "severity": e.severity,
         "device_ids": e.device_ids, "meta": e.meta
     } for e in events])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+def _page_limit():
+    """The limit query parameter, defaulting to and capped at API_PAGE_LIMIT; None if out of range"""
+    cap = current_app.config["API_PAGE_LIMIT"]
+    limit = request.args.get("limit", cap, type=int)
+    return limit if 1 <= limit <= cap else None
+
+# Live readings, events and alert firings as Server-Sent Events
+@api_bp.get("/stream")
+def stream():
+    subscription = broker.subscribe(request.args.get("site_id", type=int))
+    if subscription is None:
+        return jsonify({"error": "Too many live clients"}), 503
+    response = Response(stream_with_context(broker.listen(subscription)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # let reverse proxies pass frames through unbuffered
+    return response
+
+@api_bp.get("/stream/stats")
+def stream_stats():
+    return jsonify(broker.stats())
+
+# Ingest pipeline status (queue/spool depth, replay rate, waits for the SQLite writer)
+@api_bp.get("/ingest/stats")
+def ingest_stats():
+    from ..ingest import get_pipeline
+    pipeline = get_pipeline()
+    if not pipeline:
+        return jsonify({"running": False})
+    return jsonify({"running": pipeline.running, **pipeline.stats(), "writer_pool": writer_waits.stats()})
 
 # Demo Mode API
 @api_bp.post("/demo/toggle")
@@ -222,44 +411,39 @@ def import_csv():
         
         for i in range(0, total_rows, batch_size):
             batch = df.iloc[i:i+batch_size]
+            rows = {}
             
             for _, row in batch.iterrows():
                 try:
-                    # Parse timestamp
+                    # Parse timestamp (stored as naive UTC)
                     ts = pd.to_datetime(row['timestamp'])
+                    if ts.tzinfo is not None:
+                        ts = ts.tz_convert(None)
+                    ts = ts.to_pydatetime()
                     
                     # Get or create device
-                    device = Device.query.filter_by(
-                        name=row['device_name'],
-                        site_id=site_id
-                    ).first()
-                    
-                    if not device:
-                        device = Device(
-                            site_id=site_id,
-                            name=row['device_name'],
-                            type=row.get('key', 'power'),
-                            unit=row.get('unit', 'W'),
-                            capabilities=["historical"]
-                        )
-                        db.session.add(device)
-                        db.session.commit()
+                    device = registry_cache.resolve_site_device(
+                        site_id, row['device_name'],
+                        device_type=row.get('key', 'power'),
+                        unit=row.get('unit', 'W'),
+                        capabilities=["historical"]
+                    )
                     
                     # Store metric
-                    metric = Metric(
-                        ts=ts,
-                        device_id=device.id,
-                        key=row.get('key', 'power'),
-                        value=float(row['value'])
-                    )
-                    db.session.add(metric)
-                    imported_count += 1
+                    key = row.get('key', 'power')
+                    rows[(device.id, ts, key)] = {
+                        "ts": ts,
+                        "device_id": device.id,
+                        "key": key,
+                        "value": float(row['value'])
+                    }
                     
                 except Exception as e:
                     print(f"Error processing row {i}: {e}")
                     continue
-        
-        db.session.commit()
+            
+            imported_count += len(upsert_metrics(rows.values()))
+            db.session.commit()  # don't hold the writer across batches
         
         return jsonify({
             "status": "success",
@@ -404,6 +588,10 @@ def get_alert_events():
     from_ts = request.args.get("from")
     to_ts = request.args.get("to")
     
+    limit = _page_limit()
+    if limit is None:
+        return jsonify({"error": f"limit must be between 1 and {current_app.config['API_PAGE_LIMIT']}"}), 400
+    
     query = select(AlertEvent)
     if alert_id:
         query = query.where(AlertEvent.alert_id == alert_id)
@@ -412,11 +600,18 @@ def get_alert_events():
     if to_ts:
         query = query.where(AlertEvent.ts <= datetime.fromisoformat(to_ts.replace('Z', '+00:00')))
     
-    events = db.session.scalars(query.order_by(AlertEvent.ts.desc())).all()
-    return jsonify([{
+    try:
+        events, next_cursor = paginate(query, AlertEvent.ts, AlertEvent.id, limit, request.args.get("cursor"),
+                                       descending=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify([{
         "id": e.id, "alert_id": e.alert_id, "ts": e.ts.isoformat(),
         "payload": e.payload
     } for e in events])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 # Export API
 @api_bp.get("/export")
@@ -428,42 +623,29 @@ def export_data():
     to_ts = request.args.get("to")
     format_type = request.args.get("format", "csv")
     
+    if format_type not in EXPORT_FORMATS:
+        return jsonify({"error": "Unsupported format"}), 400
     if not from_ts:
         from_ts = (datetime.utcnow() - timedelta(hours=24)).isoformat()
     if not to_ts:
         to_ts = datetime.utcnow().isoformat()
     
-    # Build query
-    query = select(Metric).join(Device).where(
-        and_(
-            Metric.ts >= datetime.fromisoformat(from_ts.replace('Z', '+00:00')),
-            Metric.ts <= datetime.fromisoformat(to_ts.replace('Z', '+00:00')),
-            Metric.key == key
-        )
-    )
-    
+    # Devices are resolved once; rows are streamed chunk by chunk
+    query = select(Device.id, Device.name, Device.unit)
     if site_id:
         query = query.where(Device.site_id == site_id)
     if device_ids:
-        query = query.where(Metric.device_id.in_(device_ids))
-    
-    metrics = db.session.scalars(query).all()
-    
-    if format_type == "csv":
-        # Generate CSV
-        csv_data = "timestamp,device_id,device_name,key,value,unit\n"
-        for metric in metrics:
-            device = Device.query.get(metric.device_id)
-            csv_data += f"{metric.ts.isoformat()},{metric.device_id},{device.name},{metric.key},{metric.value},{device.unit}\n"
-        
-        from flask import Response
-        return Response(
-            csv_data,
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename=wattboard_export_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.csv'}
-        )
-    
-    return jsonify({"error": "Unsupported format"}), 400
+        query = query.where(Device.id.in_(device_ids))
+    devices = {device_id: (name, unit) for device_id, name, unit in db.session.execute(query)}
+    
+    encode, mimetype, extension = EXPORT_FORMATS[format_type]
+    chunks = iter_metrics(parse_ts(from_ts), parse_ts(to_ts), key=key, device_ids=device_ids, site_id=site_id)
+    filename = f'wattboard_export_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    return Response(
+        stream_with_context(encode(chunks, devices)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 # Legacy API for backward compatibility
 @api_bp.get("/timeseries")
@@ -471,14 +653,9 @@ def timeseries():
     hours = int(request.args.get("hours", 24))
     end = datetime.utcnow()
     start = end - timedelta(hours=hours)
-    rows = db.session.scalars(
-        select(Reading).where(Reading.ts >= start, Reading.ts <= end)
-    ).all()
-    if not rows:
+    df = legacy_readings_frame(start, end)
+    if df.empty:
         return jsonify({"series": [], "peak": None})
-    df = pd.DataFrame([{
-        "ts": r.ts, "meter_id": r.meter_id, "kw": r.kw, "volts": r.volts
-    } for r in rows])
     df["ts"] = pd.to_datetime(df["ts"])
     g = df.groupby("ts").agg({"kw":"sum", "volts":"mean"}).sort_index()
     peak_kw = float(g["kw"].max())
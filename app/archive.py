@@ -0,0 +1,154 @@
+"""Parquet cold-storage tier for closed days of metrics.
+
+When ``ARCHIVE_DIR`` is set, a scheduler job exports every UTC day older than
+``ARCHIVE_AFTER_DAYS`` from the live database (metrics rows and compressed
+segments) to zstd-compressed Parquet under
+``<ARCHIVE_DIR>/site_id=<id>/date=<YYYY-MM-DD>/``, then deletes what it
+exported; raw retention (app.retention) archives days the same way when they
+expire sooner. Files are sorted by (device_id, key, ts) so row-group statistics
+let pyarrow skip most of a file when reads filter on those columns; reads go
+through ``app.timeseries.read_metrics``, which treats the archive as the
+lowest-priority tier.
+"""
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import select, delete, func
+from .models import db, Device, Metric, MetricSegment
+from .sqlite_profile import maintenance_lock, yield_writer
+
+_SCHEMA = pa.schema([
+    ("ts", pa.timestamp("us")),
+    ("device_id", pa.int64()),
+    ("key", pa.string()),
+    ("value", pa.float64()),
+])
+_PARTITION_SCHEMA = pa.schema([("site_id", pa.int64()), ("date", pa.string())])
+_PARTITIONING = ds.partitioning(_PARTITION_SCHEMA, flavor="hive")
+_DATASET_SCHEMA = pa.unify_schemas([_SCHEMA, _PARTITION_SCHEMA])
+
+class ParquetArchive:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write_day(self, site_id, day, df):
+        """Write one site's points for one UTC day as a new part file; returns its path"""
+        partition = os.path.join(self.directory, f"site_id={site_id}", f"date={day.isoformat()}")
+        os.makedirs(partition, exist_ok=True)
+        df = df.sort_values(["device_id", "key", "ts"])
+        table = pa.Table.from_pandas(df[_SCHEMA.names], schema=_SCHEMA, preserve_index=False)
+        path = os.path.join(partition, f"part-{uuid.uuid4().hex}.parquet")
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp, compression="zstd", row_group_size=64 * 1024)
+        os.replace(tmp, path)  # readers never see a partial file
+        return path
+
+    def _partitions(self, first_day=None, last_day=None, site_id=None):
+        """Paths of the date= partitions between first_day and last_day (inclusive), of one site or all"""
+        sites = [f"site_id={site_id}"] if site_id else _listdir(self.directory, "site_id=")
+        first = f"date={first_day.isoformat()}" if first_day else None
+        last = f"date={last_day.isoformat()}" if last_day else None
+        return [
+            os.path.join(self.directory, site, date)
+            for site in sites for date in _listdir(os.path.join(self.directory, site), "date=")
+            if (first is None or date >= first) and (last is None or date <= last)
+        ]
+
+    def read(self, start, end, key=None, device_ids=None, site_id=None):
+        """Archived points with start <= ts <= end as a DataFrame (ts, device_id, key, value)"""
+        # only the partition directories of the range are listed, never the whole tree
+        files = [
+            os.path.join(partition, name)
+            for partition in self._partitions(start.date(), end.date(), site_id)
+            for name in _listdir(partition) if name.endswith(".parquet")
+        ]
+        if not files:
+            return None
+        dataset = ds.dataset(files, schema=_DATASET_SCHEMA, format="parquet", partitioning=_PARTITIONING,
+                             partition_base_dir=self.directory)
+        # filters on the sort columns are pushed down to row-group statistics
+        expr = (ds.field("ts") >= pa.scalar(start, pa.timestamp("us"))) & (ds.field("ts") <= pa.scalar(end, pa.timestamp("us")))
+        if key:
+            expr &= ds.field("key") == key if isinstance(key, str) else ds.field("key").isin(list(key))
+        if device_ids:
+            expr &= ds.field("device_id").isin(list(device_ids))
+        df = dataset.to_table(columns=_SCHEMA.names, filter=expr).to_pandas()
+        # a day exported again after a crash between writing it and deleting it has two part files
+        return df.drop_duplicates(["device_id", "key", "ts"], keep="last", ignore_index=True)
+
+    def drop_before(self, day):
+        """Delete the date= partitions of every day before day; returns partitions deleted"""
+        partitions = self._partitions(last_day=day - timedelta(days=1))
+        for partition in partitions:
+            shutil.rmtree(partition, ignore_errors=True)
+        return len(partitions)
+
+    def archive_before(self, cutoff):
+        """Move every whole UTC day before cutoff out of the live database; returns points archived"""
+        oldest = min(
+            (ts for ts in (
+                db.session.scalar(select(func.min(Metric.ts))),
+                db.session.scalar(select(func.min(MetricSegment.start_ts)))
+            ) if ts is not None),
+            default=None
+        )
+        if oldest is None:
+            return 0
+        from .timeseries import read_metrics  # the read path itself consults the archive
+
+        day, last_day = oldest.date(), cutoff.date()
+        sites = dict(db.session.execute(select(Device.id, Device.site_id)).all())
+        archived = 0
+        while day < last_day:
+            start = datetime.combine(day, datetime.min.time())
+            end = start + timedelta(days=1)
+            # reads may come from another connection, so only rows that already existed
+            # before the export (ids up to these) are deleted; later ones wait for the next run
+            last_metric = db.session.scalar(select(func.max(Metric.id))) or 0
+            last_segment = db.session.scalar(select(func.max(MetricSegment.id))) or 0
+            df = read_metrics(start, end - timedelta(microseconds=1), include_archive=False)
+            if not df.empty:
+                for site_id, site_df in df.groupby(df["device_id"].map(sites)):
+                    self.write_day(int(site_id), day, site_df)
+                db.session.execute(delete(Metric).where(Metric.ts >= start, Metric.ts < end, Metric.id <= last_metric))
+                # a segment straddling midnight goes once the day it ends in is archived
+                db.session.execute(delete(MetricSegment).where(MetricSegment.end_ts < end,
+                                                               MetricSegment.id <= last_segment))
+                db.session.commit()
+                archived += len(df)
+                yield_writer()
+            day += timedelta(days=1)
+        return archived
+
+def _listdir(path, prefix=""):
+    try:
+        return sorted(name for name in os.listdir(path) if name.startswith(prefix))
+    except FileNotFoundError:
+        return []
+
+# Global archive, None unless ARCHIVE_DIR is configured
+archive = None
+
+def init_archive(app):
+    global archive
+    archive = ParquetArchive(app.config["ARCHIVE_DIR"]) if app.config["ARCHIVE_DIR"] else None
+    return archive
+
+def archive_metrics_job(app):
+    """Background job moving closed days to the Parquet archive"""
+    with app.app_context(), maintenance_lock:
+        if archive is None:
+            return
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=app.config["ARCHIVE_AFTER_DAYS"])
+            archived = archive.archive_before(cutoff)
+            if archived:
+                print(f"Archived {archived} metrics to {archive.directory}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error archiving metrics: {e}")
@@ -0,0 +1,176 @@
+"""Bucketed aggregation of metrics computed by the database.
+
+``bucket_series`` returns count, mean, min, max and last per (bucket, device, key)
+for any bucket size ``app.rollups.parse_span`` accepts. Buckets follow the
+wall clock of the device's site like the rollup tiers. Grouping is a SQL
+GROUP BY on a computed bucket (integer division of epoch seconds on SQLite,
+``date_bin`` on PostgreSQL) over the coarsest rollup tier that tiles the
+bucket, or over raw points for sizes no tier tiles (e.g. 10s, 90s). The query
+range is split wherever a site's UTC offset changes, so each GROUP BY shifts
+by a single offset. Several keys are aggregated by the same queries.
+"""
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from sqlalchemy import select, func, cast, and_, Integer
+from .models import db, Metric, MetricRollup
+from .rollups import TIERS, device_zones, select_tier
+from .timeseries import cold_points
+
+COLUMNS = ["ts", "device_id", "key", "count", "mean", "min", "max", "last"]
+_AGGREGATES = ["count", "sum", "min", "max", "last_ts", "last"]
+_EPOCH = datetime(1970, 1, 1)
+_DAY = timedelta(days=1)
+
+def _sqlite_bucket(column, seconds, offset):
+    """Wall-clock bucket start as epoch seconds"""
+    return (cast(func.strftime("%s", column), Integer) + offset) // seconds * seconds
+
+def _postgres_bucket(column, seconds, offset):
+    """Wall-clock bucket start as a timestamp"""
+    return func.date_bin(timedelta(seconds=seconds), column + timedelta(seconds=offset), _EPOCH)
+
+_BUCKET_EXPRESSIONS = {
+    "sqlite": _sqlite_bucket,
+    "postgresql": _postgres_bucket,
+}
+
+def _utc_offset(zone, ts):
+    return ts.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset()
+
+def offset_periods(zone, start, end):
+    """Split [start, end) (naive UTC) into (lo, hi, offset) ranges of constant UTC offset in zone"""
+    periods, lo, offset = [], start, _utc_offset(zone, start)
+    probe = start
+    while probe < end:
+        step = min(probe + _DAY, end)
+        if step == end or _utc_offset(zone, step) == offset:
+            probe = step
+            continue
+        low, high = probe, step  # the offset changes in (low, high], on a whole second
+        while high - low > timedelta(seconds=1):
+            mid = low + (high - low) / 2
+            low, high = (mid, high) if _utc_offset(zone, mid) == offset else (low, mid)
+        change = low.replace(microsecond=0) + timedelta(seconds=1)
+        periods.append((lo, change, offset))
+        lo, offset, probe = change, _utc_offset(zone, change), change
+    periods.append((lo, end, offset))
+    return periods
+
+def _raw_query(bucket, lo, hi, keys, device_ids):
+    grouped = select(
+        bucket.label("bucket"), Metric.device_id, Metric.key, func.count().label("count"),
+        func.sum(Metric.value).label("sum"), func.min(Metric.value).label("min"),
+        func.max(Metric.value).label("max"), func.max(Metric.ts).label("last_ts")
+    ).where(
+        Metric.key.in_(keys), Metric.device_id.in_(device_ids), Metric.ts >= lo, Metric.ts < hi
+    ).group_by(bucket, Metric.device_id, Metric.key).subquery()
+    return select(grouped, Metric.value).join(Metric, and_(
+        Metric.device_id == grouped.c.device_id, Metric.key == grouped.c.key, Metric.ts == grouped.c.last_ts
+    ))
+
+def _rollup_query(bucket, lo, hi, keys, device_ids, tier):
+    in_range = and_(
+        MetricRollup.tier == tier, MetricRollup.key.in_(keys), MetricRollup.device_id.in_(device_ids),
+        MetricRollup.bucket_start >= lo, MetricRollup.bucket_start < hi
+    )
+    grouped = select(
+        bucket.label("bucket"), MetricRollup.device_id, MetricRollup.key,
+        func.sum(MetricRollup.count).label("count"),
+        func.sum(MetricRollup.sum).label("sum"), func.min(MetricRollup.min).label("min"),
+        func.max(MetricRollup.max).label("max"), func.max(MetricRollup.last_ts).label("last_ts")
+    ).where(in_range).group_by(bucket, MetricRollup.device_id, MetricRollup.key).subquery()
+    # a point lies in exactly one bucket of a tier, so last_ts picks a single row
+    return select(grouped, MetricRollup.last).join(MetricRollup, and_(
+        in_range, MetricRollup.device_id == grouped.c.device_id, MetricRollup.key == grouped.c.key,
+        MetricRollup.last_ts == grouped.c.last_ts
+    ))
+
+def _bucket_starts(wall, span, zone, offset):
+    """Naive UTC start of each bucket from its wall-clock start"""
+    wall = pd.to_datetime(wall, unit="s") if pd.api.types.is_numeric_dtype(wall) else pd.to_datetime(wall)
+    if span < _DAY:
+        return wall - offset
+    # whole-day buckets start at local midnight, whatever the offset of the rows in them
+    local = wall.dt.tz_localize(zone, ambiguous=True, nonexistent="shift_forward")
+    return local.dt.tz_convert("UTC").dt.tz_localize(None)
+
+def _cold_buckets(span, start, end, keys, zones):
+    """Aggregates of points in segments and the archive that the metrics table does not hold"""
+    frames = [f for f in cold_points(start, end, keys, device_ids=list(zones)) if not f.empty]
+    if not frames:
+        return None
+    cold = pd.concat(frames, ignore_index=True).drop_duplicates(subset=["device_id", "key", "ts"], keep="last")
+    cold["ts"] = pd.to_datetime(cold["ts"])
+    hot = pd.DataFrame(db.session.execute(
+        select(Metric.device_id, Metric.key, Metric.ts).where(
+            Metric.key.in_(keys), Metric.device_id.in_(list(zones)),
+            Metric.ts >= cold["ts"].min(), Metric.ts <= cold["ts"].max()
+        )
+    ).all(), columns=["device_id", "key", "ts"])
+    if not hot.empty:
+        hot["ts"] = pd.to_datetime(hot["ts"])
+        cold = cold.merge(hot, how="left", on=["device_id", "key", "ts"], indicator=True)
+        cold = cold[cold["_merge"] == "left_only"]
+        if cold.empty:
+            return None
+
+    offsets = pd.Series(pd.NaT, index=cold.index, dtype="timedelta64[ns]")
+    for zone in set(zones.values()):
+        rows = cold["device_id"].map(zones) == zone
+        utc = cold.loc[rows, "ts"].dt.tz_localize("UTC")
+        offsets[rows] = utc.dt.tz_convert(zone).dt.tz_localize(None) - cold.loc[rows, "ts"]
+    cold = cold.sort_values("ts")
+    cold["bucket"] = (cold["ts"] + offsets).dt.floor(span) - offsets
+    return cold.groupby(["bucket", "device_id", "key"], as_index=False).agg(
+        count=("value", "count"), sum=("value", "sum"), min=("value", "min"), max=("value", "max"),
+        last_ts=("ts", "last"), last=("value", "last")
+    ).rename(columns={"bucket": "ts"})
+
+def _combine(frames):
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    df["last_ts"] = pd.to_datetime(df["last_ts"])
+    # buckets cut by an offset change or split across tiers are merged here
+    df = df.sort_values("last_ts", kind="stable").groupby(["ts", "device_id", "key"], as_index=False).agg(
+        count=("count", "sum"), sum=("sum", "sum"), min=("min", "min"), max=("max", "max"), last=("last", "last")
+    )
+    df["mean"] = df["sum"] / df["count"]
+    df["count"] = df["count"].astype(int)
+    return df[COLUMNS].sort_values(["ts", "device_id", "key"], kind="stable").reset_index(drop=True)
+
+def bucket_series(span, start, end, key, device_ids=None, site_id=None):
+    """Per-device aggregates of span buckets holding points with start <= ts <= end.
+
+    ``key`` is a metric key or a list of keys. Returns a DataFrame of COLUMNS
+    sorted by ts. When a rollup tier is used, the tier buckets overlapping
+    start are counted whole.
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in _BUCKET_EXPRESSIONS:
+        raise ValueError(f"Bucketed reads are not supported on {dialect}")
+    bucket_expression = _BUCKET_EXPRESSIONS[dialect]
+    zones = device_zones(device_ids or None, site_id)
+    by_zone = {}
+    for device_id, zone in zones.items():
+        by_zone.setdefault(zone, []).append(device_id)
+
+    tier = select_tier(span)
+    stop = end + timedelta(microseconds=1)
+    first = start if tier is None else start - TIERS[tier] + timedelta(microseconds=1)
+    column = Metric.ts if tier is None else MetricRollup.bucket_start
+    frames = []
+    for zone, ids in by_zone.items():
+        for lo, hi, offset in offset_periods(zone, first, stop):
+            bucket = bucket_expression(column, int(span.total_seconds()), int(offset.total_seconds()))
+            query = (_raw_query(bucket, lo, hi, keys, ids) if tier is None
+                     else _rollup_query(bucket, lo, hi, keys, ids, tier))
+            frame = pd.DataFrame(db.session.execute(query).all(), columns=["bucket", "device_id", "key", *_AGGREGATES])
+            if not frame.empty:
+                frame["ts"] = _bucket_starts(frame.pop("bucket"), span, zone, offset)
+                frames.append(frame)
+    if tier is None and zones:
+        frames.append(_cold_buckets(span, start, end, keys, zones))
+    return _combine(frames)
@@ -5,10 +5,47 @@ def load_config(app):
     load_dotenv()
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")
     app.config["DATABASE_URL"] = os.getenv("DATABASE_URL", "sqlite:///energy.db")
+    app.config["SQLITE_PROFILE"] = os.getenv("SQLITE_PROFILE", "default")
+    app.config["SQLITE_READERS"] = int(os.getenv("SQLITE_READERS", "4"))
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    app.config["SQLITE_MMAP_BYTES"] = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
     app.config["MQTT_BROKER_HOST"] = os.getenv("MQTT_BROKER_HOST", "localhost")
     app.config["MQTT_BROKER_PORT"] = int(os.getenv("MQTT_BROKER_PORT", "1883"))
     app.config["MQTT_TOPICS"] = os.getenv("MQTT_TOPICS", "utility/meter/+/reading")
+    app.config["MQTT_CONSUMERS"] = int(os.getenv("MQTT_CONSUMERS", "1"))
+    app.config["MQTT_PARTITION_INDEX"] = int(os.getenv("MQTT_PARTITION_INDEX", "0"))
+    app.config["MQTT_PARTITION_COUNT"] = int(os.getenv("MQTT_PARTITION_COUNT", "1"))
+    app.config["MQTT_SHARED_GROUP"] = os.getenv("MQTT_SHARED_GROUP", "")
+    # other processes ingest too, so in-process caches cannot see every write
+    app.config["MULTI_PROCESS_INGEST"] = app.config["MQTT_PARTITION_COUNT"] > 1 or bool(app.config["MQTT_SHARED_GROUP"])
+    app.config["PUBLISH_BATCH"] = os.getenv("PUBLISH_BATCH", "false").lower() == "true"
+    app.config["PUBLISH_FORMAT"] = os.getenv("PUBLISH_FORMAT", "json")
+    app.config["PUBLISH_BATCH_SHARDS"] = int(os.getenv("PUBLISH_BATCH_SHARDS", "4"))
     app.config["TIMEZONE"] = os.getenv("TIMEZONE", "UTC")
+    app.config["INGEST_BATCH_SIZE"] = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    app.config["INGEST_FLUSH_INTERVAL"] = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+    app.config["INGEST_QUEUE_LIMIT"] = int(os.getenv("INGEST_QUEUE_LIMIT", "10000"))
+    app.config["INGEST_SPOOL_DIR"] = os.getenv("INGEST_SPOOL_DIR", "")
+    app.config["INGEST_SPOOL_SEGMENT_BYTES"] = int(os.getenv("INGEST_SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+    app.config["INGEST_SPOOL_MAX_BYTES"] = int(os.getenv("INGEST_SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+    app.config["INGEST_MAX_ATTEMPTS"] = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+    app.config["LAST_SEEN_FLUSH_SECONDS"] = int(os.getenv("LAST_SEEN_FLUSH_SECONDS", "30"))
+    app.config["REGISTRY_CACHE_SIZE"] = int(os.getenv("REGISTRY_CACHE_SIZE", "4096"))
+    app.config["SEGMENT_STORE_ENABLED"] = os.getenv("SEGMENT_STORE_ENABLED", "false").lower() == "true"
+    app.config["SEGMENT_HOT_HOURS"] = int(os.getenv("SEGMENT_HOT_HOURS", "48"))
+    app.config["SEGMENT_SPAN_MINUTES"] = int(os.getenv("SEGMENT_SPAN_MINUTES", "60"))
+    app.config["ARCHIVE_DIR"] = os.getenv("ARCHIVE_DIR", "")
+    app.config["ARCHIVE_AFTER_DAYS"] = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    app.config["METRICS_MAX_POINTS"] = int(os.getenv("METRICS_MAX_POINTS", "5000"))
+    app.config["RESPONSE_CACHE_MAX_BYTES"] = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    app.config["RESPONSE_CACHE_TTL_SECONDS"] = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+    app.config["RESPONSE_CACHE_CLOSED_AFTER_SECONDS"] = int(os.getenv("RESPONSE_CACHE_CLOSED_AFTER_SECONDS", "300"))
+    app.config["API_PAGE_LIMIT"] = int(os.getenv("API_PAGE_LIMIT", "1000"))
+    app.config["KPI_MAX_GAP_SECONDS"] = int(os.getenv("KPI_MAX_GAP_SECONDS", "300"))
+    app.config["ENERGY_PRICE_PER_KWH"] = float(os.getenv("ENERGY_PRICE_PER_KWH", "0.15"))
+    app.config["LIVE_CLIENT_BUFFER"] = int(os.getenv("LIVE_CLIENT_BUFFER", "256"))
+    app.config["LIVE_MAX_CLIENTS"] = int(os.getenv("LIVE_MAX_CLIENTS", "100"))
+    app.config["LIVE_KEEPALIVE_SECONDS"] = float(os.getenv("LIVE_KEEPALIVE_SECONDS", "15"))
 
     app_cfg_path = os.path.join("config", "app.example.yml")
     if os.path.exists(app_cfg_path):
@@ -0,0 +1,176 @@
+import json
+import zlib
+from datetime import datetime, timezone
+import pandas as pd
+
+try:  # optional faster JSON backend
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+try:  # optional compact binary payloads
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_JSON_START = frozenset(b"{[ \t\r\n")
+
+# Payload keys accepted on the MQTT topics and the metric key they map to
+METRIC_KEYS = {
+    "kw": "power", "power": "power", "w": "power",
+    "volts": "voltage", "voltage": "voltage", "v": "voltage",
+    "kvar": "reactive_power", "reactive_power": "reactive_power",
+    "hertz": "frequency", "frequency": "frequency", "hz": "frequency",
+    "temp": "temp", "temperature": "temp",
+    "aqi": "aqi", "humidity": "humidity"
+}
+
+# Legacy meter payloads report several quantities regardless of the device unit
+LEGACY_KEYS = {"kw": "power", "kvar": "reactive_power", "volts": "voltage", "hertz": "frequency"}
+
+UNIT_KEYS = {
+    "W": ("kw", "power", "w"),
+    "V": ("volts", "voltage", "v"),
+    "A": ("current", "amps"),
+    "°C": ("temp", "temperature"),
+    "AQI": ("aqi",),
+    "%": ("humidity", "percent")
+}
+
+def _validate_unit(device_unit, payload_key):
+    """Validate that the payload key matches the device unit"""
+    keys = UNIT_KEYS.get(device_unit)
+    if keys is None:
+        return True  # Allow unknown combinations
+    return payload_key in keys
+
+def parse_ts(value):
+    """Parse a payload timestamp into a naive UTC datetime"""
+    if value is None:
+        return datetime.utcnow()
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        # epoch numbers and the odd formats only pandas understands
+        ts = pd.to_datetime(value, unit="s" if isinstance(value, (int, float)) else None).to_pydatetime()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def batch_segment(device_name, shards):
+    """Topic segment of the batch shard carrying device_name, so a device keeps one ingest partition"""
+    return f"batch-{zlib.crc32(device_name.encode('utf-8')) % max(1, shards)}"
+
+def is_batch_segment(segment):
+    """Whether a topic's device segment names a batch shard rather than a device"""
+    return segment is not None and (segment == "batch" or segment.startswith("batch-"))
+
+def is_legacy(payload):
+    """Whether a payload uses the legacy utility meter format"""
+    return "kw" in payload or "volts" in payload
+
+class PayloadDecoder:
+    """Decodes MQTT payloads into readings with as little per-message work as possible.
+
+    The payload keys a device accepts depend only on its unit, so the
+    ``(payload_key, metric_key)`` pairs are computed once per unit and reused
+    for every reading of every device sharing it.
+    """
+
+    def __init__(self):
+        self._accepted = {}
+
+    def accepted_keys(self, unit):
+        keys = self._accepted.get(unit)
+        if keys is None:
+            keys = tuple(
+                (payload_key, metric_key) for payload_key, metric_key in METRIC_KEYS.items()
+                if _validate_unit(unit, payload_key)
+            )
+            self._accepted[unit] = keys
+        return keys
+
+    def decode(self, topic, raw):
+        """Decode a raw MQTT message into a list of readings for the pipeline.
+
+        Accepts a single reading object, a JSON array of readings, or a batch
+        envelope ``{"site": ..., "readings": [...]}`` whose top-level fields
+        are defaults for every reading; each encoded as JSON or MessagePack.
+        On batch topics (``.../batch-<n>/...``) readings must carry their own
+        ``device_name``; those without one are skipped.
+        """
+        try:
+            payload = self._loads(raw)
+        except Exception:
+            return []
+
+        parts = topic.split("/")
+        topic_device = parts[2] if len(parts) >= 3 else None
+        batch_topic = is_batch_segment(topic_device)
+        if batch_topic:
+            topic_device = None  # the segment names a shard; readings carry their device
+        unknown = None if batch_topic else "UNKNOWN"
+        if isinstance(payload, dict) and "readings" not in payload:
+            device_name = topic_device or payload.get("device_name") or unknown
+            return self._reading(payload, device_name) if device_name else []
+
+        if isinstance(payload, dict):
+            defaults = {k: v for k, v in payload.items() if k != "readings"}
+            items = payload["readings"]
+        else:
+            defaults, items = None, payload
+        if not isinstance(items, list):
+            return []
+
+        readings = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if defaults:
+                item = {**defaults, **item}
+            device_name = item.get("device_name") or topic_device or unknown
+            if device_name:
+                readings.extend(self._reading(item, device_name))
+        return readings
+
+    def _loads(self, raw):
+        if raw[:1] and raw[0] not in _JSON_START and msgpack is not None:
+            return msgpack.unpackb(raw, raw=False)
+        return _loads(raw)
+
+    def _reading(self, payload, device_name):
+        try:
+            ts = parse_ts(payload.get("ts"))
+        except Exception:
+            return []
+        return [{
+            "site": payload.get("site", "Home"),  # Default to Home site
+            "device": device_name,
+            "ts": ts, "payload": payload
+        }]
+
+    def metric_values(self, unit, payload):
+        """Yield (metric_key, value) pairs the device's unit accepts from payload"""
+        keys = self.accepted_keys(unit)
+        if is_legacy(payload):
+            keys = keys + tuple(LEGACY_KEYS.items())
+        for payload_key, metric_key in keys:
+            value = payload.get(payload_key)
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue  # a malformed value must not poison the whole batch
+            yield metric_key, value
+
+def encode_batch(readings, fmt="json", **defaults):
+    """Encode readings as a batch envelope in "json" or "msgpack" form"""
+    envelope = {**defaults, "readings": readings}
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        return msgpack.packb(envelope, use_bin_type=True)
+    return json.dumps(envelope).encode("utf-8")
@@ -0,0 +1,92 @@
+"""Visual downsampling of metric series for charts.
+
+``downsample`` caps every device series of a frame at ``max_points`` rows,
+picked with Largest-Triangle-Three-Buckets (``lttb``) or the min and max of
+each pixel column (``minmax``). The peak of every spike and the trough of
+every sag flagged by app.event_detector is always kept, so events stay
+visible however far the chart is zoomed out.
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ("lttb", "minmax")
+
+def lttb_indices(x, y, n):
+    """Indices of the n points of (x, y) Largest-Triangle-Three-Buckets keeps"""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1][:max(n, 0)])
+    # n - 2 buckets over the interior points; the first and last point are always kept
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i == n - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        # twice the area of the triangle (a, candidate, next bucket average)
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(x, y, n):
+    """Indices of the min and max of each of n // 2 equal-width x columns"""
+    if n >= len(x):
+        return np.arange(len(x))
+    columns = max(n // 2, 1)
+    width = x[-1] - x[0]
+    column = np.zeros(len(x), dtype=np.int64) if width <= 0 else np.minimum(
+        ((x - x[0]) / width * columns).astype(np.int64), columns - 1)
+    order = np.lexsort((y, column))  # by column, then value
+    first = np.flatnonzero(np.r_[True, column[order][1:] != column[order][:-1]])
+    last = np.r_[first[1:], len(order)] - 1
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+_SELECTORS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+def _event_extremes(ts, y, events):
+    """Index of the peak (spike), trough (sag) or largest deviation of each event window"""
+    kept = []
+    for start, end, kind in events:
+        lo, hi = np.searchsorted(ts, np.datetime64(start, "ns")), np.searchsorted(ts, np.datetime64(end, "ns"), "right")
+        if lo >= hi:
+            continue
+        window = y[lo:hi]
+        if kind == "spike":
+            kept.append(lo + int(np.argmax(window)))
+        elif kind == "sag":
+            kept.append(lo + int(np.argmin(window)))
+        else:
+            kept.append(lo + int(np.argmax(np.abs(window - np.median(y)))))
+    return np.unique(np.array(kept, dtype=np.int64))
+
+def downsample(df, max_points, method="lttb", column="value", events=None):
+    """Rows of df (sorted by ts) reduced to at most max_points per device_id.
+
+    ``events`` maps device ids to (start_ts, end_ts, type) windows whose
+    extreme point must survive; they take at most half of the budget.
+    """
+    select_indices = _SELECTORS[method]
+    events = events or {}
+    parts = []
+    for device_id, series in df.groupby("device_id", sort=False):
+        if len(series) <= max_points:
+            parts.append(series)
+            continue
+        ts = series["ts"].to_numpy("datetime64[ns]")
+        x = (ts - ts[0]) / np.timedelta64(1, "s")
+        y = series[column].to_numpy(float)
+        forced = _event_extremes(ts, y, events.get(device_id, ()))
+        if len(forced) > max_points // 2:
+            forced = np.sort(forced[np.argsort(-np.abs(y[forced] - np.median(y)))[:max_points // 2]])
+        picked = select_indices(x, y, max_points - len(forced))
+        parts.append(series.iloc[np.union1d(picked, forced)])
+    if not parts:
+        return df
+    return pd.concat(parts).sort_values(["ts", "device_id"], kind="stable").reset_index(drop=True)
@@ -2,7 +2,10 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_
-from .models import db, Device, Metric, Event, Site
+from .models import db, Device, Event, Site
+from .timeseries import read_metrics
+from .response_cache import watermarks
+from .live import publish_events
 
 class EventDetector:
     def __init__(self, app):
@@ -28,28 +31,13 @@ class EventDetector:
             all_events = []
             
             for device in devices:
-                # Get metrics for the device
-                metrics = db.session.scalars(
-                    select(Metric).where(
-                        and_(
-                            Metric.device_id == device.id,
-                            Metric.ts >= from_ts,
-                            Metric.ts <= to_ts
-                        )
-                    ).order_by(Metric.ts)
-                ).all()
+                # Get the device's own metric (legacy meters also report voltage etc.)
+                metrics = read_metrics(from_ts, to_ts, key=device.type, device_ids=[device.id])
                 
                 if len(metrics) < 10:  # Need at least 10 points for reliable detection
                     continue
                     
-                # Convert to DataFrame
-                df = pd.DataFrame([{
-                    'ts': m.ts,
-                    'value': m.value
-                } for m in metrics])
-                
-                df['ts'] = pd.to_datetime(df['ts'])
-                df = df.set_index('ts').sort_index()
+                df = metrics[['ts', 'value']].set_index('ts').sort_index()
                 
                 # Detect events for this device
                 device_events = self._detect_device_events(device, df, site_id)
@@ -185,6 +173,7 @@ class EventDetector:
     
     def _store_events(self, events):
         """Store events in the database"""
+        stored = []
         for event_data in events:
             # Check if event already exists (by time and device)
             existing = db.session.scalars(
@@ -200,8 +189,11 @@ class EventDetector:
             if not existing:
                 event = Event(**event_data)
                 db.session.add(event)
+                stored.append(event)
+                watermarks.mark("events", event_data['start_ts'])
         
         db.session.commit()
+        publish_events(stored)
     
     def get_events(self, site_id: int, from_ts: datetime = None, to_ts: datetime = None, device_ids: list = None):
         """Get events for a site with optional filtering"""
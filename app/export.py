@@ -0,0 +1,83 @@
+"""Streaming encoders for /api/export.
+
+Each encoder takes the DataFrame chunks of ``app.timeseries.iter_metrics``
+plus a {device_id: (name, unit)} map and yields the encoded bytes chunk by
+chunk, so an export never holds more than one chunk in memory. Parquet is
+written one row group per chunk.
+"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FIELDS = ["timestamp", "device_id", "device_name", "key", "value", "unit"]
+
+_PARQUET_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us")),
+    ("device_id", pa.int64()),
+    ("device_name", pa.string()),
+    ("key", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+])
+
+def _with_devices(chunk, devices):
+    chunk = chunk.rename(columns={"ts": "timestamp"})
+    chunk["device_name"] = chunk["device_id"].map({d: name for d, (name, _) in devices.items()})
+    chunk["unit"] = chunk["device_id"].map({d: unit for d, (_, unit) in devices.items()})
+    return chunk[FIELDS]
+
+def _isoformat(ts):
+    """datetime.isoformat() of a datetime column, vectorized"""
+    text = ts.dt.strftime("%Y-%m-%dT%H:%M:%S")
+    micros = ts.dt.microsecond
+    return text.where(micros == 0, text + "." + micros.astype(str).str.zfill(6))
+
+def csv_chunks(chunks, devices):
+    yield (",".join(FIELDS) + "\n").encode()
+    for chunk in chunks:
+        rows = _with_devices(chunk, devices)
+        rows["timestamp"] = _isoformat(rows["timestamp"])
+        yield rows.to_csv(header=False, index=False, lineterminator="\n").encode()
+
+def ndjson_chunks(chunks, devices):
+    for chunk in chunks:
+        rows = _with_devices(chunk, devices)
+        rows["timestamp"] = _isoformat(rows["timestamp"])
+        yield rows.to_json(orient="records", lines=True).rstrip("\n").encode() + b"\n"
+
+class _Drain:
+    """Write-only file object whose contents are taken after each row group"""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+def parquet_chunks(chunks, devices):
+    sink = _Drain()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), _PARQUET_SCHEMA, compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(_with_devices(chunk, devices), schema=_PARQUET_SCHEMA,
+                                                    preserve_index=False))
+            yield sink.take()
+    yield sink.take()  # footer
+
+# format -> (encoder, mimetype, file extension)
+FORMATS = {
+    "csv": (csv_chunks, "text/csv", "csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson", "ndjson"),
+    "parquet": (parquet_chunks, "application/vnd.apache.parquet", "parquet"),
+}
@@ -0,0 +1,131 @@
+"""Gorilla-style compression for one (device, key) series.
+
+Timestamps (integer microseconds) are stored as delta-of-deltas and values as
+the XOR of consecutive float64 bit patterns, following Pelkonen et al.,
+"Gorilla: A Fast, Scalable, In-Memory Time Series Database" (VLDB 2015).
+Regularly sampled meters cost about one bit per timestamp, and slowly changing
+values cost a few bits each.
+
+Layout: ``<IqQ`` header (count, first timestamp, first value bits), then the
+bit stream for the remaining points, padded to a whole byte.
+"""
+import struct
+import numpy as np
+
+_HEADER = struct.Struct("<IqQ")
+
+# (control prefix, prefix length, payload bits) for delta-of-delta buckets
+_DOD_BUCKETS = [(0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12), (0b11110, 5, 32)]
+_DOD_FALLBACK = (0b11111, 5, 64)
+
+class _BitWriter:
+    def __init__(self):
+        self.buf = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.buf.append((self.acc >> self.nbits) & 0xFF)
+        self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self):
+        if self.nbits:
+            self.buf.append((self.acc << (8 - self.nbits)) & 0xFF)
+            self.acc = self.nbits = 0
+        return bytes(self.buf)
+
+class _BitReader:
+    def __init__(self, data, offset):
+        self.data = data
+        self.pos = offset * 8
+
+    def read(self, nbits):
+        start = self.pos >> 3
+        end = (self.pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], "big")
+        self.pos += nbits
+        return (chunk >> (end * 8 - self.pos)) & ((1 << nbits) - 1)
+
+    def read_prefix(self, limit):
+        """Count leading 1 bits, consuming the terminating 0 (up to limit bits)"""
+        ones = 0
+        while ones < limit and self.read(1):
+            ones += 1
+        return ones
+
+def _signed(value, nbits):
+    return value - (1 << nbits) if value >> (nbits - 1) else value
+
+def encode_series(timestamps, values):
+    """Compress parallel sequences of int microsecond timestamps and floats"""
+    timestamps = [int(t) for t in timestamps]
+    bits = np.asarray(values, dtype="<f8").view("<u8").tolist()
+    if not timestamps:
+        return _HEADER.pack(0, 0, 0)
+    out = _BitWriter()
+    prev_ts, prev_delta = timestamps[0], 0
+    prev_bits, prev_lead, prev_trail = bits[0], -1, 0
+    for ts, value_bits in zip(timestamps[1:], bits[1:]):
+        delta = ts - prev_ts
+        dod = delta - prev_delta
+        if dod == 0:
+            out.write(0, 1)
+        else:
+            for prefix, prefix_len, payload in _DOD_BUCKETS:
+                if -(1 << (payload - 1)) <= dod < (1 << (payload - 1)):
+                    break
+            else:
+                prefix, prefix_len, payload = _DOD_FALLBACK
+            out.write(prefix, prefix_len)
+            out.write(dod, payload)
+        prev_ts, prev_delta = ts, delta
+
+        xor = value_bits ^ prev_bits
+        if xor == 0:
+            out.write(0, 1)
+        else:
+            lead = min(64 - xor.bit_length(), 31)
+            trail = (xor & -xor).bit_length() - 1
+            if prev_lead >= 0 and lead >= prev_lead and trail >= prev_trail:
+                out.write(0b10, 2)
+                out.write(xor >> prev_trail, 64 - prev_lead - prev_trail)
+            else:
+                meaningful = 64 - lead - trail
+                out.write(0b11, 2)
+                out.write(lead, 5)
+                out.write(meaningful & 0x3F, 6)  # 64 is stored as 0
+                out.write(xor >> trail, meaningful)
+                prev_lead, prev_trail = lead, trail
+        prev_bits = value_bits
+    return _HEADER.pack(len(timestamps), timestamps[0], bits[0]) + out.getvalue()
+
+def decode_series(data):
+    """Inverse of encode_series: (list of int timestamps, list of floats)"""
+    count, ts, value_bits = _HEADER.unpack_from(data)
+    if count == 0:
+        return [], []
+    timestamps, bits = [ts], [value_bits]
+    reader = _BitReader(data, _HEADER.size)
+    delta, lead, trail = 0, 0, 0
+    for _ in range(count - 1):
+        bucket = reader.read_prefix(4)
+        if bucket:
+            payload = _DOD_BUCKETS[bucket - 1][2]
+            if bucket == 4 and reader.read(1):
+                payload = _DOD_FALLBACK[2]
+            delta += _signed(reader.read(payload), payload)
+        ts += delta
+        timestamps.append(ts)
+
+        if reader.read(1):
+            if reader.read(1):
+                lead = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trail = 64 - lead - meaningful
+            value_bits ^= reader.read(64 - lead - trail) << trail
+        bits.append(value_bits)
+    return timestamps, np.array(bits, dtype="<u8").view("<f8").tolist()
@@ -0,0 +1,278 @@
+import collections
+import os
+import queue
+import threading
+import time
+import zlib
+from sqlalchemy.exc import DisconnectionError, OperationalError, TimeoutError as PoolTimeout
+from .models import db
+from .last_seen import last_seen
+from .registry_cache import registry_cache
+from .decoder import PayloadDecoder, is_legacy
+from .reorder import ReorderBuffer
+from .spool import Spool
+from .metric_writer import insert_metrics, upsert_metrics
+from .live import publish_readings
+
+# Failures worth retrying the same records for: the database is unreachable, locked or out of connections
+TRANSIENT_ERRORS = (OperationalError, DisconnectionError, PoolTimeout, OSError)
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) or getattr(error, "connection_invalidated", False)
+
+class _MemoryQueue:
+    """Bounded in-process queue with the same interface as Spool.
+
+    Records handed out by ``get_batch()`` are held until ``ack()``; ``rewind()``
+    puts them back in front of the queue so a failed batch is retried (until
+    the process exits) instead of lost. Dead-lettered records are only counted.
+    """
+
+    durable = False
+
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._retry = collections.deque()  # rewound records, served before the queue
+        self._unacked = []
+        self.dead_lettered = 0
+
+    def put(self, item, timeout=None):
+        self._queue.put(item, timeout=timeout)
+
+    def get_batch(self, max_items, timeout):
+        batch = []
+        while self._retry and len(batch) < max_items:
+            batch.append(self._retry.popleft())
+        deadline = time.monotonic() + timeout
+        while len(batch) < max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._unacked.extend(batch)
+        return batch
+
+    def ack(self):
+        self._unacked = []
+
+    def dead_letter(self, records):
+        self.dead_lettered += len(records)  # nowhere to keep them; the flusher logs each one
+
+    def rewind(self):
+        self._retry.extendleft(reversed(self._unacked))
+        self._unacked = []
+
+    def pending(self):
+        return bool(self._retry) or not self._queue.empty()
+
+    def stats(self):
+        return {"queued": self._queue.qsize() + len(self._retry), "dead_lettered": self.dead_lettered}
+
+class IngestPipeline:
+    """Partitioned bounded queues between the MQTT callback and the database.
+
+    The callback only routes raw messages to a partition; each partition has
+    its own flusher thread that decodes messages and writes Metric rows
+    in bulk whenever ``batch_size`` messages are waiting or ``flush_interval``
+    seconds have passed. Messages are partitioned by topic, so every reading of
+    a device is handled by the same flusher and stays in order.
+
+    While the database is unreachable the flusher keeps retrying a failed batch
+    with backoff. Any other error replays the batch one record at a time; a
+    record failing ``max_attempts`` times is dead-lettered so the records
+    behind it are not held up. With ``spool_dir`` set, each partition queues
+    through a durable on-disk Spool instead of memory: messages survive
+    restarts, and dead-lettered records are kept in the spool's dead-letter
+    file rather than dropped.
+
+    ``process_partition`` is an ``(index, count)`` pair that lets several
+    worker processes subscribe to the same topics and each ingest only the
+    topics hashing to their index. Every process still receives every message;
+    an MQTT shared subscription (``MQTT_SHARED_GROUP``) has the broker deliver
+    each message to one process instead, at the cost of a device's readings
+    spreading over processes (rows stay unique through the upsert path).
+    """
+
+    def __init__(self, app, decoder=None, batch_size=500, flush_interval=1.0, queue_limit=10000,
+                 partitions=1, process_partition=(0, 1), out_of_order_seconds=120, update_late=False,
+                 spool_dir=None, spool_segment_bytes=16 * 1024 * 1024, spool_max_bytes=None, max_attempts=3):
+        self.app = app
+        self.decoder = decoder or PayloadDecoder()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        if spool_dir:
+            self.queues = [
+                Spool(os.path.join(spool_dir, f"partition-{n}"), segment_bytes=spool_segment_bytes,
+                      max_bytes=spool_max_bytes // partitions if spool_max_bytes else None)
+                for n in range(partitions)
+            ]
+        else:
+            self.queues = [_MemoryQueue(max(1, queue_limit // partitions)) for _ in range(partitions)]
+        self.process_index, self.process_count = process_partition
+        self.out_of_order_seconds = out_of_order_seconds
+        self.buffers = [ReorderBuffer(out_of_order_seconds) for _ in range(partitions)]
+        self.update_late = update_late
+        self.max_attempts = max_attempts
+        self.running = False
+        self.dropped = 0
+        self.written = [0] * partitions
+
+    def start(self):
+        """Start one flusher thread per partition"""
+        if self.running:
+            return
+        self.running = True
+        for partition in range(len(self.queues)):
+            thread = threading.Thread(target=self._run, args=(partition,), daemon=True)
+            thread.start()
+
+    def stop(self):
+        """Stop the flushers after draining what is already queued"""
+        self.running = False
+
+    def _topic_hash(self, topic):
+        return zlib.crc32(topic.encode("utf-8"))
+
+    def owns(self, topic):
+        """Whether this process is responsible for the given topic"""
+        return self._topic_hash(topic) % self.process_count == self.process_index
+
+    def partition_for(self, topic):
+        return (self._topic_hash(topic) // self.process_count) % len(self.queues)
+
+    def submit(self, topic, payload, timeout=1.0):
+        """Route a raw message to its partition; returns False if that queue stayed full"""
+        try:
+            self.queues[self.partition_for(topic)].put((topic, payload), timeout=timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"Ingest queue full, dropped {self.dropped} messages so far")
+            return False
+
+    def stats(self):
+        return {
+            "partitions": len(self.queues),
+            "queues": [q.stats() for q in self.queues],
+            "written": list(self.written),
+            "dropped": self.dropped,
+            "duplicates": sum(b.duplicates for b in self.buffers),
+            "late": sum(b.late for b in self.buffers)
+        }
+
+    def _run(self, partition):
+        """Drain one partition in batches, triggered by size or time"""
+        q = self.queues[partition]
+        failures = 0
+        isolate = 0   # records still to replay one at a time after a permanent failure
+        attempts = 0  # failed attempts at the record being replayed alone
+        with self.app.app_context():
+            while self.running or q.pending():
+                batch = q.get_batch(1 if isolate else self.batch_size, self.flush_interval)
+                if not batch:
+                    continue
+                try:
+                    readings = []
+                    for topic, payload in batch:
+                        readings.extend(self.decoder.decode(topic, payload))
+                    if readings:
+                        self.written[partition] += self._flush(readings, partition)
+                except Exception as e:
+                    db.session.rollback()
+                    # the batch never reached the database, so forget it was admitted
+                    self.buffers[partition] = ReorderBuffer(self.out_of_order_seconds)
+                    if isolate and not is_transient(e):
+                        attempts += 1
+                        if attempts >= self.max_attempts:
+                            print(f"Dead-lettering ingest record on {batch[0][0]} after {attempts} attempts: {e}")
+                            q.dead_letter(batch)
+                            q.ack()
+                            isolate, attempts = isolate - 1, 0
+                            continue
+                    print(f"Error flushing ingest batch of {len(batch)} on partition {partition}: {e}")
+                    q.rewind()
+                    if is_transient(e):
+                        failures += 1
+                        time.sleep(min(30, 2 ** failures))  # back off until the database is back
+                    elif not isolate:
+                        isolate = len(batch)  # find the record the database rejects
+                    continue
+                q.ack()
+                failures = 0
+                if isolate:
+                    isolate, attempts = isolate - 1, 0
+
+    def _flush(self, batch, partition=0):
+        """Write one batch of readings as bulk inserts in a single transaction"""
+        devices = {}
+        metric_rows = {}
+
+        for item in batch:
+            site_name, device_name, ts, payload = item["site"], item["device"], item["ts"], item["payload"]
+            device = registry_cache.resolve_device(
+                site_name, device_name,
+                device_type=payload.get("type", "power"), unit=payload.get("unit", "W")
+            )
+            devices[device.id] = device
+
+            for metric_key, value in self.decoder.metric_values(device.unit, payload):
+                metric_rows[(device.id, ts, metric_key)] = {
+                    "ts": ts, "device_id": device.id, "key": metric_key, "value": value
+                }
+
+            # Legacy meters are stored as metrics only; the Meter row marks them for app.legacy
+            if is_legacy(payload):
+                registry_cache.ensure_meter(
+                    f"{site_name}_{device_name}",
+                    voltage_level=payload.get("voltage_level", "LV"), feeder=payload.get("feeder")
+                )
+
+        # Drop retransmissions in memory; rows beyond the window go through an upsert
+        fresh, late = self.buffers[partition].admit(metric_rows.values())
+        # fresh rows fall back to an upsert if they collide with rows written
+        # before the window was populated (e.g. after a restart)
+        written = insert_metrics(fresh, self.update_late) + upsert_metrics(late, self.update_late)
+        db.session.commit()
+        # last_seen is tracked in memory and written back periodically; like the
+        # simulator it records the newest reading stored per device, not arrival time
+        newest = {}
+        for row in written:
+            device_id = row["device_id"]
+            if device_id not in newest or row["ts"] > newest[device_id]:
+                newest[device_id] = row["ts"]
+        for device_id, ts in newest.items():
+            last_seen.touch(device_id, ts)
+        publish_readings(written, {device_id: device.site_id for device_id, device in devices.items()})
+
+        return len(written)
+
+# Global pipeline instance
+_pipeline = None
+
+def get_pipeline():
+    global _pipeline
+    return _pipeline
+
+def init_pipeline(app):
+    global _pipeline
+    _pipeline = IngestPipeline(
+        app,
+        batch_size=app.config["INGEST_BATCH_SIZE"],
+        flush_interval=app.config["INGEST_FLUSH_INTERVAL"],
+        queue_limit=app.config["INGEST_QUEUE_LIMIT"],
+        out_of_order_seconds=app.config.get("ingest", {}).get("accept_out_of_order_seconds", 120),
+        update_late=app.config.get("ingest", {}).get("on_conflict", "ignore") == "update",
+        partitions=app.config["MQTT_CONSUMERS"],
+        # with a shared subscription the broker already split the topics between processes
+        process_partition=(0, 1) if app.config["MQTT_SHARED_GROUP"] else
+                          (app.config["MQTT_PARTITION_INDEX"], app.config["MQTT_PARTITION_COUNT"]),
+        spool_dir=app.config["INGEST_SPOOL_DIR"] or None,
+        spool_segment_bytes=app.config["INGEST_SPOOL_SEGMENT_BYTES"],
+        spool_max_bytes=app.config["INGEST_SPOOL_MAX_BYTES"],
+        max_attempts=app.config["INGEST_MAX_ATTEMPTS"]
+    )
+    return _pipeline
@@ -0,0 +1,164 @@
+"""Running per-device aggregates behind ``/api/kpis``.
+
+Every power point stored through app.metric_writer is folded into today's
+totals of its device: energy integrated since local midnight of the device's
+site (each value holds until the next point, as in the daily summaries, but
+not across gaps longer than ``KPI_MAX_GAP_SECONDS``) and the peak with its
+timestamp. Reads are dictionary lookups. A device whose totals are unknown
+(after a restart) or no longer exact (a point arrived out of order or
+overwrote one) is recomputed once from today's stored points on its next read;
+points stored while that recompute runs are buffered and folded in after it.
+Totals are in watts: legacy meters store power in kW (app.legacy) and are
+scaled on the way in. When other processes ingest too (``exclusive`` False)
+every read recomputes.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from .legacy import legacy_devices
+from .rollups import device_zones, floor_local
+from .timeseries import read_metrics
+
+DAY = timedelta(days=1)
+
+class DayTotals:
+    """Energy (Wh) and peak of one device since day_start (naive UTC local midnight)"""
+
+    __slots__ = ("day_start", "energy_wh", "peak", "peak_ts", "last_ts", "last_value")
+
+    def __init__(self, day_start, energy_wh=0.0, peak=None, peak_ts=None, last_ts=None, last_value=None):
+        self.day_start = day_start
+        self.energy_wh = energy_wh
+        self.peak = peak
+        self.peak_ts = peak_ts
+        self.last_ts = last_ts
+        self.last_value = last_value
+
+class KpiStore:
+    """DayTotals per device for one metric key, folded on write"""
+
+    def __init__(self, key="power", max_gap=timedelta(minutes=5)):
+        self.key = key
+        self.max_gap = max_gap
+        self._totals = {}
+        self._stale = set()
+        self._zones = {}
+        self._scales = {}  # device_id -> factor to watts, for legacy kW meters
+        self._computing = {}  # device_id -> [recomputes running, (ts, watts) stored meanwhile]
+        self._lock = threading.Lock()
+        self.exclusive = True
+
+    def update(self, rows):
+        rows = sorted((r for r in rows if r["key"] == self.key), key=lambda r: r["ts"])
+        if not rows:
+            return
+        # only devices read through for_devices have totals, and it loaded their zones and scales
+        with self._lock:
+            for r in rows:
+                device_id, value = r["device_id"], self.watts(r["device_id"], r["value"])
+                computing = self._computing.get(device_id)
+                if computing is not None:
+                    computing[1].append((r["ts"], value))  # the recompute may have read past it already
+                totals = self._totals.get(device_id)
+                if totals is not None:
+                    self._fold(device_id, totals, r["ts"], value)
+
+    def _fold(self, device_id, totals, ts, value):
+        day_start = floor_local(ts, DAY, self._zones.get(device_id, timezone.utc))
+        if day_start < totals.day_start:
+            return  # an earlier day
+        if day_start > totals.day_start:
+            totals = self._totals[device_id] = DayTotals(day_start)  # local midnight passed
+        if totals.last_ts is not None and ts <= totals.last_ts:
+            if ts < totals.last_ts or value != totals.last_value:
+                self._stale.add(device_id)  # late or overwritten: the integral or peak is no longer exact
+            return
+        if totals.last_ts is not None and ts - totals.last_ts <= self.max_gap:
+            totals.energy_wh += totals.last_value * (ts - totals.last_ts).total_seconds() / 3600
+        totals.last_ts, totals.last_value = ts, value
+        if totals.peak is None or value > totals.peak:
+            totals.peak, totals.peak_ts = value, ts
+
+    def for_devices(self, device_ids, now=None):
+        """{device_id: DayTotals} of today for the given devices"""
+        now = now or datetime.utcnow()
+        device_ids = list(device_ids)
+        self._load_devices(device_ids)
+        result, missing = {}, []
+        with self._lock:
+            for device_id in device_ids:
+                today = floor_local(now, DAY, self._zones.get(device_id, timezone.utc))
+                totals = self._totals.get(device_id)
+                if (totals is None or not self.exclusive or device_id in self._stale
+                        or totals.day_start < today):
+                    missing.append((device_id, today))
+                    self._computing.setdefault(device_id, [0, []])[0] += 1
+                else:
+                    result[device_id] = totals
+        for device_id, today in missing:
+            try:
+                totals = self._compute(device_id, today, now)
+            except Exception:
+                with self._lock:
+                    self._end_compute(device_id)
+                raise
+            with self._lock:
+                stored = self._end_compute(device_id)
+                self._totals[device_id] = totals
+                self._stale.discard(device_id)
+                # points stored since the read began; ones it already saw are skipped as equal
+                for ts, value in sorted(stored, key=lambda point: point[0]):
+                    self._fold(device_id, self._totals[device_id], ts, value)
+                result[device_id] = self._totals[device_id]
+        return result
+
+    def _end_compute(self, device_id):
+        """Points stored while a recompute of device_id ran; call with the lock held"""
+        computing = self._computing[device_id]
+        computing[0] -= 1
+        if not computing[0]:
+            del self._computing[device_id]
+        return computing[1]
+
+    def _compute(self, device_id, day_start, now):
+        """DayTotals from the stored points of device_id since day_start"""
+        df = read_metrics(day_start, now, key=self.key, device_ids=[device_id])
+        totals = DayTotals(day_start)
+        if df.empty:
+            return totals
+        df["value"] = df["value"] * self._scales.get(device_id, 1.0)
+        gaps = df["ts"].diff()
+        held = df["value"].shift() * gaps.dt.total_seconds() / 3600
+        totals.energy_wh = float(held[gaps <= self.max_gap].sum())
+        peak = df["value"].idxmax()
+        totals.peak, totals.peak_ts = float(df["value"][peak]), df["ts"][peak].to_pydatetime()
+        totals.last_ts, totals.last_value = df["ts"].iloc[-1].to_pydatetime(), float(df["value"].iloc[-1])
+        return totals
+
+    def watts(self, device_id, value):
+        """A stored power value of device_id in watts"""
+        return value * self._scales.get(device_id, 1.0)
+
+    def _load_devices(self, device_ids):
+        unknown = [d for d in device_ids if d not in self._zones]
+        if unknown:
+            zones = device_zones(unknown)
+            legacy = legacy_devices(unknown)
+            with self._lock:
+                self._zones.update(zones)
+                self._scales.update((device_id, 1000.0 if device_id in legacy else 1.0) for device_id in unknown)
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+            self._stale.clear()
+            self._zones.clear()
+            self._scales.clear()
+
+# Shared by app.metric_writer and /api/kpis
+kpis = KpiStore()
+
+def init_kpis(app):
+    kpis.max_gap = timedelta(seconds=app.config["KPI_MAX_GAP_SECONDS"])
+    kpis.exclusive = not app.config["MULTI_PROCESS_INGEST"]
+    kpis.clear()
+    return kpis
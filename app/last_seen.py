@@ -0,0 +1,71 @@
+import threading
+from sqlalchemy import update
+from .models import db, Device
+from .response_cache import watermarks
+
+class LastSeenTracker:
+    """In-memory Device.last_seen_at, written back to the devices table in batches.
+
+    Ingest calls ``touch()`` for every reading; only the newest timestamp per
+    device is kept, and ``flush()`` (a scheduler job) writes the devices that
+    changed since the last flush in one bulk UPDATE. Readers use ``freshest()``
+    to combine the tracked value with whatever the row holds.
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def touch(self, device_id, ts):
+        with self._lock:
+            current = self._seen.get(device_id)
+            if current is not None and ts <= current:
+                return
+            self._seen[device_id] = ts
+            self._dirty.add(device_id)
+        watermarks.bump("devices", ts)  # /api/devices reports last_seen_at
+
+    def get(self, device_id):
+        with self._lock:
+            return self._seen.get(device_id)
+
+    def freshest(self, device_id, stored):
+        """The newer of the tracked value and the stored Device.last_seen_at"""
+        tracked = self.get(device_id)
+        if tracked is None or (stored is not None and stored > tracked):
+            return stored
+        return tracked
+
+    def flush(self):
+        """Write changed last_seen_at values in one bulk UPDATE; returns rows written"""
+        with self._lock:
+            rows = [{"id": device_id, "last_seen_at": self._seen[device_id]} for device_id in self._dirty]
+            self._dirty.clear()
+        if not rows:
+            return 0
+        try:
+            db.session.execute(update(Device), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._dirty.update(row["id"] for row in rows)  # retry on the next flush
+            raise
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self._dirty.clear()
+
+# Shared by the MQTT pipeline, the simulator, /api/devices and the alert engine
+last_seen = LastSeenTracker()
+
+def flush_last_seen_job(app):
+    """Background job writing coalesced last_seen_at values"""
+    with app.app_context():
+        try:
+            last_seen.flush()
+        except Exception as e:
+            print(f"Error flushing device last_seen: {e}")
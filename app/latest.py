@@ -0,0 +1,85 @@
+import threading
+from sqlalchemy import select, and_, func
+from .models import db, Metric
+
+class LatestStore:
+    """Newest (ts, value) per (device_id, key), kept in memory.
+
+    Every point stored through app.metric_writer passes through ``update()``,
+    so "current value" lookups (``/api/latest``, the nodata alert rule) are
+    dictionary reads instead of ORDER BY ts DESC LIMIT 1 queries. After a
+    restart the store is empty; ``prime()`` loads the newest row of every
+    series from the metrics table once and merges it with what ingest has
+    added since. When other processes ingest too (``exclusive`` False),
+    ``prime()`` reloads on every call so their writes are seen.
+    """
+
+    def __init__(self):
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._prime_lock = threading.Lock()
+        self._primed = False
+        self.exclusive = True
+
+    def update(self, rows):
+        with self._lock:
+            for row in rows:
+                device = self._latest.setdefault(row["device_id"], {})
+                current = device.get(row["key"])
+                if current is None or row["ts"] >= current[0]:
+                    device[row["key"]] = (row["ts"], row["value"])
+
+    def prime(self):
+        """Load the newest stored point of every series, once per process unless it is not exclusive"""
+        if self._primed and self.exclusive:
+            return
+        with self._prime_lock:
+            if self._primed and self.exclusive:
+                return
+            newest = (
+                select(Metric.device_id, Metric.key, func.max(Metric.ts).label("ts"))
+                .group_by(Metric.device_id, Metric.key)
+                .subquery()
+            )
+            rows = db.session.execute(
+                select(Metric.device_id, Metric.key, Metric.ts, Metric.value).join(newest, and_(
+                    Metric.device_id == newest.c.device_id, Metric.key == newest.c.key, Metric.ts == newest.c.ts
+                ))
+            ).mappings().all()
+            self.update(rows)
+            self._primed = True
+
+    def get(self, device_id, key):
+        """(ts, value) of the newest point of a series, or None"""
+        with self._lock:
+            return self._latest.get(device_id, {}).get(key)
+
+    def for_devices(self, device_ids, key=None):
+        """{device_id: {key: (ts, value)}} for the given devices"""
+        result = {}
+        with self._lock:
+            for device_id in device_ids:
+                points = self._latest.get(device_id, {})
+                if key is not None:
+                    points = {key: points[key]} if key in points else {}
+                if points:
+                    result[device_id] = dict(points)
+        return result
+
+    def newest_ts(self, device_id):
+        """Timestamp of the device's newest point across all keys, or None"""
+        with self._lock:
+            return max((ts for ts, _ in self._latest.get(device_id, {}).values()), default=None)
+
+    def clear(self):
+        with self._lock:
+            self._latest.clear()
+            self._primed = False
+
+# Shared by app.metric_writer, /api/latest and the alert engine
+latest = LatestStore()
+
+def init_latest(app):
+    latest.exclusive = not app.config["MULTI_PROCESS_INGEST"]
+    latest.clear()
+    return latest
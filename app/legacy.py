@@ -0,0 +1,60 @@
+"""Legacy Reading-shaped views served from the Metric table.
+
+Legacy meter payloads (kw/kvar/volts/hertz) are stored once, as Metric rows
+of the device the meter resolves to. A Meter row named ``<site>_<device>``
+marks which devices came from the legacy format, and these helpers pivot their
+metrics back into the old ``readings`` columns for ``/api/timeseries`` and the
+daily rollup.
+"""
+import pandas as pd
+from sqlalchemy import select
+from .models import db, Site, Device, Meter
+from .timeseries import read_metrics
+
+# Metric key -> legacy Reading column
+LEGACY_COLUMNS = {"power": "kw", "reactive_power": "kvar", "voltage": "volts", "frequency": "hertz"}
+
+def split_meter_id(meter_id, site_names):
+    """Split "<site>_<device>" into (site name, device name) given the known sites"""
+    for site_name in sorted(site_names, key=len, reverse=True):
+        if meter_id.startswith(site_name + "_"):
+            return site_name, meter_id[len(site_name) + 1:]
+    site_name, _, device_name = meter_id.partition("_")
+    return (site_name, device_name) if device_name else ("Home", meter_id)
+
+def meter_devices():
+    """Map legacy meter ids to the device ids their metrics are stored under"""
+    meter_ids = db.session.scalars(select(Meter.meter_id)).all()
+    if not meter_ids:
+        return {}
+    rows = db.session.execute(select(Device.id, Device.name, Site.name).join(Site, Device.site_id == Site.id)).all()
+    by_name = {f"{site_name}_{device_name}": device_id for device_id, device_name, site_name in rows}
+    return {meter_id: by_name[meter_id] for meter_id in meter_ids if meter_id in by_name}
+
+def legacy_devices(device_ids):
+    """Ids among device_ids whose metrics come from legacy meter payloads (power in kW)"""
+    return set(db.session.scalars(
+        select(Device.id).join(Site, Device.site_id == Site.id).where(
+            Device.id.in_(list(device_ids)), (Site.name + "_" + Device.name).in_(select(Meter.meter_id))
+        )
+    ))
+
+def legacy_readings_frame(start, end):
+    """Reading-shaped DataFrame (ts, meter_id, kw, kvar, volts, hertz, quality_ok) for [start, end)"""
+    meters = meter_devices()
+    if not meters:
+        return pd.DataFrame()
+    meter_of = {device_id: meter_id for meter_id, device_id in meters.items()}
+    df = read_metrics(start, end, device_ids=list(meter_of))
+    df = df[df["key"].isin(list(LEGACY_COLUMNS)) & (df["ts"] < end)]
+    if df.empty:
+        return pd.DataFrame()
+
+    df = df.pivot_table(index=["ts", "device_id"], columns="key", values="value", aggfunc="last").reset_index()
+    df = df.rename(columns=LEGACY_COLUMNS)
+    for column in LEGACY_COLUMNS.values():
+        if column not in df:
+            df[column] = float("nan")
+    df["meter_id"] = df["device_id"].map(meter_of)
+    df["quality_ok"] = True
+    return df[["ts", "meter_id", "kw", "kvar", "volts", "hertz", "quality_ok"]]
@@ -0,0 +1,160 @@
+"""In-process pub/sub behind the ``/api/stream`` Server-Sent Events endpoint.
+
+Writers publish once their transaction has committed: the ingest pipeline and
+the simulator publish the readings of each flushed batch, the event detector
+new Event rows, and the alert engine AlertEvent firings. A message is encoded
+to its SSE frame once and put on the bounded queue of every client subscribed
+to its site. A client whose queue is full is dropped instead of slowing the
+publisher; its stream ends with a ``dropped`` event and the browser's
+EventSource reconnects and refetches.
+"""
+import json
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+Message = namedtuple("Message", ["frame", "published_at"])
+
+class Subscription:
+    """One connected client: the site it follows and its bounded message queue"""
+
+    def __init__(self, site_id, maxsize):
+        self.site_id = site_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+class LiveBroker:
+    """Fans published messages out to the subscribed clients of their site"""
+
+    def __init__(self, buffer_size=256, max_clients=100, keepalive=15):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self.keepalive = keepalive
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1024)  # seconds from publish to write, recent deliveries
+        self.published = 0
+        self.delivered = 0
+        self.dropped_clients = 0
+
+    def subscribe(self, site_id=None):
+        """A new Subscription (site_id None: every site), or None when max_clients are connected"""
+        with self._lock:
+            if self.max_clients and len(self._subscribers) >= self.max_clients:
+                return None
+            subscription = Subscription(site_id, self.buffer_size)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self, site_id=None):
+        with self._lock:
+            return any(s.site_id is None or site_id is None or s.site_id == site_id for s in self._subscribers)
+
+    def publish(self, site_id, kind, data):
+        """Queue one message for every client following site_id; returns the number of clients"""
+        with self._lock:
+            targets = [s for s in self._subscribers if s.site_id is None or s.site_id == site_id]
+        if not targets:
+            return 0
+        message = Message(f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n",
+                          time.monotonic())
+        slow = []
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                slow.append(subscription)
+        with self._lock:
+            self.published += 1
+            for subscription in slow:
+                subscription.dropped = True
+                self._subscribers.discard(subscription)
+                self.dropped_clients += 1
+        return len(targets) - len(slow)
+
+    def listen(self, subscription):
+        """SSE frames for one client until it is dropped or disconnects"""
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.dropped:
+                try:
+                    message = subscription.queue.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped:
+                    break
+                with self._lock:
+                    self.delivered += 1
+                    self._latencies.append(time.monotonic() - message.published_at)
+                yield message.frame
+            yield 'event: dropped\ndata: {"reason":"client too slow"}\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {"clients": len(self._subscribers), "max_clients": self.max_clients,
+                     "buffer_size": self.buffer_size, "published": self.published,
+                     "delivered": self.delivered, "dropped_clients": self.dropped_clients}
+        if latencies:
+            stats["fanout_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3)
+            }
+        return stats
+
+    def clear(self):
+        with self._lock:
+            for subscription in self._subscribers:
+                subscription.dropped = True
+            self._subscribers.clear()
+            self._latencies.clear()
+            self.published = self.delivered = self.dropped_clients = 0
+
+# Shared by /api/stream and every writer publishing after its commit
+broker = LiveBroker()
+
+def init_live(app):
+    broker.buffer_size = app.config["LIVE_CLIENT_BUFFER"]
+    broker.max_clients = app.config["LIVE_MAX_CLIENTS"]
+    broker.keepalive = app.config["LIVE_KEEPALIVE_SECONDS"]
+    broker.clear()
+    return broker
+
+def publish_readings(rows, site_ids):
+    """Publish stored metric rows as one ``metrics`` message per site; site_ids maps device_id to site_id"""
+    if not broker.has_subscribers():
+        return
+    by_site = {}
+    for row in rows:
+        by_site.setdefault(site_ids[row["device_id"]], []).append({
+            "t": row["ts"].isoformat(), "device_id": row["device_id"], "key": row["key"], "value": row["value"]
+        })
+    for site_id, points in by_site.items():
+        broker.publish(site_id, "metrics", points)
+
+def publish_events(events):
+    """Publish newly stored Event rows, in the shape of /api/events"""
+    for e in events:
+        if broker.has_subscribers(e.site_id):
+            broker.publish(e.site_id, "event", {
+                "id": e.id, "site_id": e.site_id, "start_ts": e.start_ts.isoformat(),
+                "end_ts": e.end_ts.isoformat(), "type": e.type, "severity": e.severity,
+                "device_ids": e.device_ids, "meta": e.meta
+            })
+
+def publish_alert(alert, alert_event):
+    """Publish an AlertEvent firing of alert"""
+    if broker.has_subscribers(alert.site_id):
+        broker.publish(alert.site_id, "alert", {
+            "id": alert_event.id, "alert_id": alert.id, "alert_name": alert.name,
+            "ts": alert_event.ts.isoformat(), "payload": alert_event.payload
+        })
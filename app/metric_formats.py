@@ -0,0 +1,68 @@
+"""Response encodings of /api/metrics.
+
+- ``json`` (default): one object per point, ``{"t", "device_id", "value", "device_name"}``
+- ``columnar``: one object per device holding parallel arrays, ``t`` in epoch
+  milliseconds plus one array per value column
+- ``arrow``: an Arrow IPC stream with columns device_id, t (timestamp[ms]) and
+  the value columns; device names and units are in the schema metadata
+
+Bucketed resolutions add the count/min/max/last columns of app.buckets in
+every encoding, with ``value`` holding the bucket mean.
+"""
+import json
+import numpy as np
+import pyarrow as pa
+
+FORMATS = ("json", "columnar", "arrow")
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+BUCKET_COLUMNS = ["count", "min", "max", "last"]
+
+def value_columns(df):
+    """Columns besides ts/device_id in the response, value first"""
+    if "count" in df:
+        return ["value", *BUCKET_COLUMNS]
+    return ["value"]
+
+def _frame(df):
+    return df.rename(columns={"mean": "value"}) if "mean" in df else df
+
+def points(df, devices):
+    """Per-point dicts of the default json format"""
+    df = _frame(df)
+    columns = value_columns(df)
+    names = {device_id: info["name"] for device_id, info in devices.items()}
+    ts = df["ts"]
+    return [{
+        "t": t.isoformat(), "device_id": device_id, **dict(zip(columns, values)),
+        "device_name": names.get(device_id, f"Device {device_id}")
+    } for t, device_id, *values in zip(ts, df["device_id"].tolist(), *(df[c].tolist() for c in columns))]
+
+def columnar(df, devices):
+    """One dict of parallel arrays per device"""
+    df = _frame(df)
+    columns = value_columns(df)
+    series = []
+    for device_id, group in df.groupby("device_id", sort=True):
+        info = devices.get(device_id, {})
+        series.append({
+            "device_id": int(device_id), "device_name": info.get("name", f"Device {device_id}"),
+            "unit": info.get("unit"),
+            "t": group["ts"].to_numpy("datetime64[ms]").astype(np.int64).tolist(),
+            **{c: group[c].tolist() for c in columns}
+        })
+    return series
+
+def arrow_stream(df, devices):
+    """Arrow IPC stream bytes of the frame"""
+    df = _frame(df)
+    columns = value_columns(df)
+    metadata = {"devices": json.dumps({str(device_id): info for device_id, info in devices.items()})}
+    table = pa.table({
+        "device_id": pa.array(df["device_id"].to_numpy(np.int64)),
+        "t": pa.array(df["ts"].to_numpy("datetime64[ms]"), pa.timestamp("ms")),
+        **{c: pa.array(df[c].to_numpy(np.int64 if c == "count" else np.float64)) for c in columns}
+    }).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,114 @@
+"""Single write path for metric points.
+
+Ingest, the simulator, CSV import and migrations store metrics through these
+functions so the rollup tiers (app.rollups) always match what was stored and the
+in-memory latest values (app.latest) and KPI totals (app.kpis) stay current.
+Rows are dicts with ts, device_id, key and value, unique on (device_id, ts, key).
+Both writers return the rows they actually stored (added, or overwritten with a
+new value), so callers publish and count only those. The in-memory state is
+only updated once the writing transaction commits.
+"""
+import pandas as pd
+from sqlalchemy import event, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .kpis import kpis
+from .latest import latest
+from .models import db, Metric
+from .response_cache import watermarks
+from .rollups import apply_rollups, rebuild_rollups
+from .timeseries import cold_points
+from .upsert import upsert
+
+METRIC_KEY = ["device_id", "ts", "key"]
+
+def insert_metrics(rows, update_existing=False):
+    """Bulk insert rows expected to be new; on a collision fall back to upsert_metrics"""
+    rows = list(rows)
+    if not rows:
+        return []
+    # no unique index catches points already moved to segments or the archive,
+    # e.g. replayed after a restart emptied the ingest reorder buffer
+    if _cold_values([_key(r) for r in rows]):
+        return upsert_metrics(rows, update_existing)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Metric), rows)
+    except IntegrityError:
+        return upsert_metrics(rows, update_existing)
+    apply_rollups(rows)
+    _after_commit(rows)
+    watermarks.mark("metrics", min(r["ts"] for r in rows))
+    return rows
+
+def upsert_metrics(rows, update_existing=False):
+    """Store rows, skipping ones already stored or, with update_existing, overwriting their value.
+
+    Only rows that were actually added are folded into the rollups; buckets
+    holding an overwritten value are recomputed.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    stored = _stored_values(rows)
+    added = [r for r in rows if _key(r) not in stored]
+    changed = [r for r in rows if _key(r) in stored and stored[_key(r)] != r["value"]] if update_existing else []
+    # points already moved to segments or the archive are not in the metrics table to collide with
+    upsert(Metric, rows if update_existing else added, METRIC_KEY, ["value"] if update_existing else None)
+    apply_rollups(added)
+    if changed:
+        rebuild_rollups(changed, stored)
+    written = added + changed
+    _after_commit(written)
+    if written:
+        watermarks.mark("metrics", min(r["ts"] for r in written))
+    return written
+
+def _after_commit(rows):
+    """Queue stored rows for latest and kpis until the session's transaction commits"""
+    db.session.info.setdefault("stored_metrics", []).extend(rows)
+
+def _apply_stored(session):
+    if session.in_nested_transaction():
+        return  # a savepoint was released, not the outermost transaction
+    rows = session.info.pop("stored_metrics", None)
+    if rows:
+        latest.update(rows)
+        kpis.update(rows)
+
+# ahead of the watermark listener, so a view cached under the new watermark sees these rows
+event.listen(Session, "after_commit", _apply_stored, insert=True)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_stored(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("stored_metrics", None)  # rolled back
+
+def _key(row):
+    return row["device_id"], row["ts"], row["key"]
+
+def _stored_values(rows, chunk_size=500):
+    """{(device_id, ts, key): value} for the rows that are already stored in any tier"""
+    keys = [_key(r) for r in rows]
+    stored = {}
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        stored.update(((d, ts, k), v) for d, ts, k, v in db.session.execute(
+            select(Metric.device_id, Metric.ts, Metric.key, Metric.value)
+            .where(tuple_(Metric.device_id, Metric.ts, Metric.key).in_(chunk))
+        ))
+    for point, value in _cold_values(keys).items():
+        stored.setdefault(point, value)
+    return stored
+
+def _cold_values(keys):
+    """{(device_id, ts, key): value} for the keys stored in segments or the archive"""
+    timestamps = [ts for _, ts, _ in keys]
+    wanted = set(keys)
+    stored = {}
+    for cold in cold_points(min(timestamps), max(timestamps), device_ids=list({d for d, _, _ in keys})):
+        for ts, device_id, key, value in cold.itertuples(index=False):
+            point = (device_id, pd.Timestamp(ts).to_pydatetime(), key)
+            if point in wanted:
+                stored[point] = value  # segments come after the archive and win
+    return stored
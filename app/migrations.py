@@ -0,0 +1,104 @@
+"""One-time, idempotent data migrations run at startup after ``init_db()``."""
+from datetime import timedelta
+from sqlalchemy import select, delete, func, text
+from .models import db, Site, Metric, MetricSegment, MetricRollup, Reading
+from .legacy import LEGACY_COLUMNS, split_meter_id
+from .registry_cache import registry_cache
+from .metric_writer import upsert_metrics
+from .rollups import apply_rollups
+from .retention import is_hypertable
+from .timeseries import read_metrics
+
+def run_migrations():
+    create_missing_indexes()
+    enable_timescale()
+    backfill_rollups()
+    migrate_legacy_readings()
+
+def create_missing_indexes():
+    """CREATE INDEX IF NOT EXISTS for model indexes added after a table was created"""
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    db.session.commit()
+
+def enable_timescale(chunk_interval="1 day"):
+    """Turn ``metrics`` into a TimescaleDB hypertable when the extension is installed.
+
+    Hypertables need every unique index to include the time column, so the
+    primary key becomes (id, ts). Retention then expires whole chunks.
+    """
+    if db.session.get_bind().dialect.name != "postgresql" or is_hypertable("metrics"):
+        return
+    if db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")).first() is None:
+        return
+    db.session.execute(text("ALTER TABLE metrics DROP CONSTRAINT metrics_pkey"))
+    db.session.execute(text("ALTER TABLE metrics ADD PRIMARY KEY (id, ts)"))
+    db.session.execute(text(
+        "SELECT create_hypertable('metrics', 'ts', chunk_time_interval => CAST(:interval AS interval), migrate_data => true)"
+    ), {"interval": chunk_interval})
+    db.session.commit()
+    print("Converted metrics to a TimescaleDB hypertable")
+
+def backfill_rollups(window=timedelta(days=1)):
+    """Build metric_rollups from stored metrics the first time the table exists.
+
+    Runs only while the rollup table is empty and there are metrics to fold
+    in; afterwards every write maintains the rollups incrementally. Metrics are
+    read one window at a time through the tiered read path and committed per
+    window.
+    """
+    if db.session.scalar(select(MetricRollup.id).limit(1)) is not None:
+        return
+    bounds = [
+        db.session.execute(select(func.min(Metric.ts), func.max(Metric.ts))).one(),
+        db.session.execute(select(func.min(MetricSegment.start_ts), func.max(MetricSegment.end_ts))).one(),
+    ]
+    starts = [low for low, _ in bounds if low is not None]
+    if not starts:
+        return
+    start, end = min(starts), max(high for _, high in bounds if high is not None)
+    folded = 0
+    while start <= end:
+        df = read_metrics(start, start + window - timedelta(microseconds=1))
+        if not df.empty:
+            apply_rollups({"ts": ts.to_pydatetime(), "device_id": device_id, "key": key, "value": value}
+                          for ts, device_id, key, value in df.itertuples(index=False))
+            db.session.commit()
+            folded += len(df)
+        start += window
+    print(f"Backfilled rollups from {folded} metrics")
+
+def migrate_legacy_readings(batch_size=5000):
+    """Move rows of the legacy ``readings`` table into ``metrics``.
+
+    Ingest no longer dual-writes Reading rows; this copies whatever is left
+    in the table to the device each meter resolves to and deletes the copied
+    rows, one batch per transaction. Once the table is empty it is a no-op.
+    """
+    site_names = db.session.scalars(select(Site.name)).all()
+    column_keys = {column: key for key, column in LEGACY_COLUMNS.items()}
+    moved = 0
+    while True:
+        readings = db.session.execute(
+            select(Reading.id, Reading.meter_id, Reading.ts, *[getattr(Reading, c) for c in column_keys])
+            .order_by(Reading.id).limit(batch_size)
+        ).all()
+        if not readings:
+            break
+        rows = {}
+        for r in readings:
+            site_name, device_name = split_meter_id(r.meter_id, site_names)
+            device = registry_cache.resolve_device(site_name, device_name)
+            registry_cache.ensure_meter(r.meter_id)
+            for column, key in column_keys.items():
+                value = getattr(r, column)
+                if value is not None:
+                    rows[(device.id, r.ts, key)] = {"ts": r.ts, "device_id": device.id, "key": key, "value": value}
+        upsert_metrics(rows.values())
+        db.session.execute(delete(Reading).where(Reading.id.in_([r.id for r in readings])))
+        db.session.commit()
+        moved += len(readings)
+    if moved:
+        print(f"Migrated {moved} legacy readings into metrics")
@@ -2,8 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import UniqueConstraint, ForeignKey, JSON
 from datetime import datetime
 import json
+from .sqlite_profile import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # New multi-site data model
 class Site(db.Model):
@@ -38,7 +39,45 @@ class Metric(db.Model):
     device_id = db.Column(db.Integer, ForeignKey('devices.id'), nullable=False)
     key = db.Column(db.String(32), nullable=False)  # power, voltage, current, etc.
     value = db.Column(db.Float, nullable=False)
-    __table_args__ = (UniqueConstraint("device_id", "ts", "key", name="uq_device_ts_key"),)
+    __table_args__ = (
+        UniqueConstraint("device_id", "ts", "key", name="uq_device_ts_key"),
+        # hot reads filter device_id and key and scan a ts range
+        db.Index("ix_metrics_device_key_ts", "device_id", "key", "ts", postgresql_include=["value"]),
+    )
+
+class MetricSegment(db.Model):
+    """Compacted metrics of one (device, key) for [start_ts, start_ts + span), see app.segments"""
+    __tablename__ = "metric_segments"
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, ForeignKey('devices.id'), nullable=False)
+    key = db.Column(db.String(32), nullable=False)
+    start_ts = db.Column(db.DateTime, nullable=False)  # bucket start
+    end_ts = db.Column(db.DateTime, nullable=False)  # last point in the segment
+    count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)  # app.gorilla encoded series
+    __table_args__ = (
+        UniqueConstraint("device_id", "key", "start_ts", name="uq_segment_device_key_start"),
+        db.Index("ix_segments_device_key_end", "device_id", "key", "end_ts"),
+    )
+
+class MetricRollup(db.Model):
+    """Aggregate of one (device, key) over a site-local 1m/15m/1h/1d bucket, see app.rollups"""
+    __tablename__ = "metric_rollups"
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, ForeignKey('devices.id'), nullable=False)
+    key = db.Column(db.String(32), nullable=False)
+    tier = db.Column(db.String(8), nullable=False)  # 1m, 15m, 1h, 1d
+    bucket_start = db.Column(db.DateTime, nullable=False)  # UTC start of the local bucket
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    last = db.Column(db.Float, nullable=False)
+    last_ts = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        UniqueConstraint("device_id", "key", "tier", "bucket_start", name="uq_rollup_device_key_tier_bucket"),
+        db.Index("ix_rollups_tier_key_bucket", "tier", "key", "bucket_start"),
+    )
 
 class Event(db.Model):
     __tablename__ = "events"
@@ -50,6 +89,10 @@ class Event(db.Model):
     severity = db.Column(db.Integer, nullable=False)  # 1-5
     device_ids = db.Column(JSON, nullable=False)  # [1,2,3]
     meta = db.Column(JSON, nullable=True)  # {peak_value, zmax, baseline_mu, baseline_sigma}
+    __table_args__ = (
+        # /api/events pages through a site by (start_ts, id), see app.pagination
+        db.Index("ix_events_site_start_id", "site_id", "start_ts", "id"),
+    )
 
 class Alert(db.Model):
     __tablename__ = "alerts"
@@ -65,8 +108,13 @@ class AlertEvent(db.Model):
     __tablename__ = "alert_events"
     id = db.Column(db.Integer, primary_key=True)
     alert_id = db.Column(db.Integer, ForeignKey('alerts.id'), nullable=False)
-    ts = db.Column(db.DateTime, index=True, nullable=False)
+    ts = db.Column(db.DateTime, nullable=False)
     payload = db.Column(JSON, nullable=False)
+    __table_args__ = (
+        # /api/alert-events pages newest first by (ts, id), per alert or across all of them
+        db.Index("ix_alert_events_alert_ts_id", "alert_id", "ts", "id"),
+        db.Index("ix_alert_events_ts_id", "ts", "id"),
+    )
 
 # Legacy models for backward compatibility during migration
 class Meter(db.Model):
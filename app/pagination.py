@@ -0,0 +1,40 @@
+"""Keyset pagination for the append-mostly event tables.
+
+Pages are ordered by (timestamp, id) and the cursor is the key of the last
+row of the previous page, so fetching page N costs an index seek plus
+``limit`` rows no matter how deep N is, and rows inserted meanwhile neither
+shift nor repeat later pages. Cursors are opaque url-safe strings.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+from .models import db
+
+def encode_cursor(ts, row_id):
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """(ts, id) of a cursor; ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def paginate(query, ts_column, id_column, limit, cursor=None, descending=False):
+    """Apply cursor and limit to a select of one entity; returns (rows, next cursor or None)"""
+    key = tuple_(ts_column, id_column)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.where(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(ts_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(ts_column, id_column)
+    rows = db.session.scalars(query.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_column.key), getattr(last, id_column.key))
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import select
+from .models import db, Site, Device, Meter
+from .response_cache import watermarks
+
+DeviceRef = namedtuple("DeviceRef", ["id", "site_id", "type", "unit"])
+
+class RegistryCache:
+    """LRU cache resolving site/device names and legacy meter ids to row ids.
+
+    Ingest resolves the same handful of devices for every reading, so lookups
+    are served from memory and only misses touch the database. Missing rows are
+    created and committed immediately so cached ids always refer to stored rows.
+    Call ``invalidate()`` whenever the registry is changed through the API.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._miss_lock = threading.Lock()  # serialize get-or-create on misses
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Forget every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def resolve_site(self, site_name, tz="America/Toronto"):
+        """Return the id of the named site, creating it if needed"""
+        key = ("site", site_name)
+        site_id = self._get(key)
+        if site_id is not None:
+            return site_id
+
+        with self._miss_lock:
+            self.misses += 1
+            site = db.session.scalars(select(Site).where(Site.name == site_name)).first()
+            if not site:
+                site = Site(name=site_name, tz=tz)
+                db.session.add(site)
+                watermarks.mark("devices")
+                db.session.commit()
+            site_id = site.id
+        self._put(key, site_id)
+        return site_id
+
+    def resolve_device(self, site_name, device_name, device_type="power", unit="W", capabilities=None):
+        """Return a DeviceRef for (site name, device name), creating rows if needed"""
+        site_id = self.resolve_site(site_name)
+        return self.resolve_site_device(site_id, device_name, device_type, unit, capabilities)
+
+    def resolve_site_device(self, site_id, device_name, device_type="power", unit="W", capabilities=None):
+        """Return a DeviceRef for a device name within a known site"""
+        key = ("device", site_id, device_name)
+        ref = self._get(key)
+        if ref is not None:
+            return ref
+
+        with self._miss_lock:
+            self.misses += 1
+            device = db.session.scalars(
+                select(Device).where(Device.name == device_name, Device.site_id == site_id)
+            ).first()
+            if not device:
+                device = Device(
+                    site_id=site_id,
+                    name=device_name,
+                    type=device_type,
+                    unit=unit,
+                    capabilities=capabilities or ["realtime", "historical"]
+                )
+                db.session.add(device)
+                watermarks.mark("devices")
+                db.session.commit()
+            ref = DeviceRef(device.id, device.site_id, device.type, device.unit)
+        self._put(key, ref)
+        return ref
+
+    def ensure_meter(self, meter_id, voltage_level="LV", feeder=None):
+        """Make sure a legacy Meter row exists for meter_id"""
+        key = ("meter", meter_id)
+        if self._get(key) is not None:
+            return
+
+        with self._miss_lock:
+            self.misses += 1
+            exists = db.session.scalars(select(Meter.id).where(Meter.meter_id == meter_id)).first()
+            if not exists:
+                db.session.add(Meter(meter_id=meter_id, voltage_level=voltage_level, feeder=feeder))
+                db.session.commit()
+        self._put(key, True)
+
+    def stats(self):
+        return {"size": len(self._entries), "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses}
+
+# Shared by the MQTT pipeline, the simulator and the CSV importer
+registry_cache = RegistryCache()
+
+def init_registry_cache(app):
+    registry_cache.max_size = app.config["REGISTRY_CACHE_SIZE"]
+    registry_cache.invalidate()
+    return registry_cache
@@ -0,0 +1,65 @@
+import heapq
+from datetime import timedelta
+
+class _DeviceWindow:
+    __slots__ = ("watermark", "seen", "expiry")
+
+    def __init__(self):
+        self.watermark = None   # newest ts admitted for the device
+        self.seen = set()       # (ts, key) admitted within the window
+        self.expiry = []        # heap of (ts, key) to age entries out of `seen`
+
+class ReorderBuffer:
+    """Per-device out-of-order window for ingested metric rows.
+
+    Rows are admitted in timestamp order per device. A row within
+    ``window_seconds`` of the newest timestamp seen for its device is checked
+    against the (ts, key) pairs already admitted in that window, so QoS 1
+    retransmissions are dropped in memory instead of failing a transaction.
+    Rows older than the window can no longer be checked in memory and are
+    returned as ``late`` for the caller to write with an upsert.
+
+    Not thread-safe: the pipeline keeps one buffer per partition, and a device
+    always maps to the same partition.
+    """
+
+    def __init__(self, window_seconds=120):
+        self.window = timedelta(seconds=window_seconds)
+        self._devices = {}
+        self.duplicates = 0
+        self.late = 0
+
+    def admit(self, rows):
+        """Split metric rows into (fresh, late), dropping in-window duplicates"""
+        fresh, late = [], []
+        touched = set()
+        for row in sorted(rows, key=lambda r: (r["device_id"], r["ts"])):
+            state = self._devices.get(row["device_id"])
+            if state is None:
+                state = self._devices[row["device_id"]] = _DeviceWindow()
+
+            if state.watermark is not None and row["ts"] < state.watermark - self.window:
+                late.append(row)
+                continue
+
+            entry = (row["ts"], row["key"])
+            if entry in state.seen:
+                self.duplicates += 1
+                continue
+
+            state.seen.add(entry)
+            heapq.heappush(state.expiry, entry)
+            if state.watermark is None or row["ts"] > state.watermark:
+                state.watermark = row["ts"]
+            touched.add(row["device_id"])
+            fresh.append(row)
+
+        for device_id in touched:
+            self._expire(self._devices[device_id])
+        self.late += len(late)
+        return fresh, late
+
+    def _expire(self, state):
+        horizon = state.watermark - self.window
+        while state.expiry and state.expiry[0][0] < horizon:
+            state.seen.discard(heapq.heappop(state.expiry))
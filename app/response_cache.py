@@ -0,0 +1,211 @@
+"""Response cache and conditional GET for the dashboard's polling endpoints.
+
+Views decorated with ``cached(*tables)`` are served from an in-process LRU
+bounded by ``RESPONSE_CACHE_MAX_BYTES``. Keys are the normalized query string
+plus the watermarks of the tables the view reads:
+
+- every write marks its table (``watermarks.mark``); the watermark moves once
+  the writing transaction commits (a rollback discards its marks), so a
+  cached body never predates a commit
+- a window whose ``to`` is older than ``RESPONSE_CACHE_CLOSED_AFTER_SECONDS``
+  is closed: its key uses the table's backfill watermark, which only moves
+  for writes older than that (late data, imports, retention), and the entry
+  never expires
+- open windows use the table's full watermark, expire after
+  ``RESPONSE_CACHE_TTL_SECONDS``, and have from/to floored to the TTL so
+  polls a few seconds apart share an entry; the view computes the body for
+  that floored window (a missing ``to`` becomes the floored now), so the
+  entry holds exactly what its key names
+
+Every response carries an ETag and Last-Modified, and matching
+If-None-Match / If-Modified-Since requests get a 304.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, request
+from werkzeug.datastructures import ImmutableMultiDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .decoder import parse_ts
+from .models import db
+
+CachedResponse = namedtuple("CachedResponse", ["body", "mimetype", "headers", "etag", "last_modified", "expires_at"])
+
+class Watermarks:
+    """Change counters per table, with a second counter for changes to closed windows"""
+
+    def __init__(self, closed_after=timedelta(minutes=5)):
+        self.closed_after = closed_after
+        self.started_at = datetime.utcnow().replace(microsecond=0)
+        self._versions = {}  # (table, "all" | "backfill") -> (version, changed_at)
+        self._lock = threading.Lock()
+
+    def bump(self, table, oldest=None):
+        """Record a change to table; oldest is its oldest affected ts (None: unknown)"""
+        now = datetime.utcnow()
+        scopes = ("all", "backfill") if oldest is None or oldest < now - self.closed_after else ("all",)
+        with self._lock:
+            for scope in scopes:
+                version, _ = self._versions.get((table, scope), (0, None))
+                self._versions[(table, scope)] = (version + 1, now.replace(microsecond=0))
+
+    def mark(self, table, oldest=None):
+        """Bump table when the current session transaction ends"""
+        pending = db.session.info.setdefault("watermarks", {})
+        if table in pending:
+            current = pending[table]
+            oldest = None if current is None or oldest is None else min(current, oldest)
+        pending[table] = oldest
+
+    def token(self, table, closed):
+        """(version, changed_at) of table, for closed or open windows"""
+        with self._lock:
+            return self._versions.get((table, "backfill" if closed else "all"), (0, self.started_at))
+
+@event.listens_for(Session, "after_commit")
+def _apply_marks(session):
+    if session.in_nested_transaction():
+        return  # a savepoint was released; its marks wait for the outermost commit
+    for table, oldest in session.info.pop("watermarks", {}).items():
+        watermarks.bump(table, oldest)
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_marks(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("watermarks", None)  # rolled back; a commit has already applied them
+
+class ResponseCache:
+    """LRU of response bodies bounded by total bytes, with optional per-entry expiry"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=30):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at < time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, response, last_modified, ttl):
+        body = response.get_data()
+        headers = [(k, v) for k, v in response.headers if k not in ("Content-Type", "Content-Length")]
+        entry = CachedResponse(body, response.mimetype, headers, hashlib.blake2b(body, digest_size=16).hexdigest(),
+                               last_modified, None if ttl is None else time.monotonic() + ttl)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+        return entry
+
+    def _pop(self, key):
+        self._bytes -= len(self._entries.pop(key).body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+# Shared by the cached API views and every writer marking a table
+watermarks = Watermarks()
+response_cache = ResponseCache()
+
+def init_response_cache(app):
+    # watermarks only see this process's writes, so entries could outlive writes made elsewhere
+    response_cache.max_bytes = 0 if app.config["MULTI_PROCESS_INGEST"] else app.config["RESPONSE_CACHE_MAX_BYTES"]
+    response_cache.ttl = app.config["RESPONSE_CACHE_TTL_SECONDS"]
+    watermarks.closed_after = timedelta(seconds=app.config["RESPONSE_CACHE_CLOSED_AFTER_SECONDS"])
+    response_cache.clear()
+    return response_cache
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _floor(ts, seconds):
+    if not seconds:
+        return ts
+    step = timedelta(seconds=seconds)
+    return _EPOCH + (ts - _EPOCH) // step * step
+
+def _window_key():
+    """(normalized from, normalized to, closed) of the request, or None if they don't parse"""
+    try:
+        to_ts = parse_ts(request.args["to"]) if request.args.get("to") else None
+        from_ts = parse_ts(request.args["from"]) if request.args.get("from") else None
+    except (TypeError, ValueError):
+        return None
+    closed = to_ts is not None and to_ts < datetime.utcnow() - watermarks.closed_after
+    if closed:
+        return from_ts, to_ts, True
+    ttl = int(response_cache.ttl or 0)
+    return from_ts and _floor(from_ts, ttl), _floor(to_ts or datetime.utcnow(), ttl), False
+
+def _use_window(from_ts, to_ts):
+    """Make the view read the floored window its cache key names instead of the requested one"""
+    args = request.args.copy()
+    if from_ts is not None:
+        args["from"] = from_ts.isoformat()
+    args["to"] = to_ts.isoformat()
+    request.args = ImmutableMultiDict(args)
+
+def _respond(entry):
+    response = Response(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.no_cache = True  # clients revalidate, and get a 304 when nothing changed
+    return response.make_conditional(request)
+
+def cached(*tables):
+    """Serve a GET view from the response cache, keyed on its query string and the tables' watermarks"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            window = _window_key() if response_cache.max_bytes else None
+            if window is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    response.add_etag()
+                    response = response.make_conditional(request)
+                return response
+            from_ts, to_ts, closed = window
+            if not closed:
+                _use_window(from_ts, to_ts)
+            tokens = [watermarks.token(table, closed) for table in tables]
+            params = tuple(sorted((k, v) for k, values in request.args.lists()
+                                  for v in values if k not in ("from", "to")))
+            key = (request.path, params, from_ts, to_ts, closed, tuple(version for version, _ in tokens))
+            entry = response_cache.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                last_modified = max(changed_at for _, changed_at in tokens)
+                entry = response_cache.put(key, response, last_modified, None if closed else response_cache.ttl)
+            return _respond(entry)
+        return wrapper
+    return decorator
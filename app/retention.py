@@ -0,0 +1,167 @@
+"""Per-key retention of raw metrics and rollup tiers.
+
+Policies come from the ``retention`` section of the app config::
+
+    retention:
+      default: {raw: 90d, 1m: 365d}   # tiers not listed are kept forever
+      keys:
+        power: {raw: 30d}             # overrides the default per tier
+
+``raw`` covers the metrics table and compacted segments; ``1m``/``15m``/
+``1h``/``1d`` are the rollup tiers, so raw points can expire while their
+downsampled buckets remain. Expired rows are deleted in bounded batches, one
+transaction each. When ``metrics`` is a TimescaleDB hypertable, chunks older
+than the longest raw retention are dropped outright first.
+
+The Parquet archive (app.archive) mixes keys in one file per site and day, so
+it expires by whole ``date=`` partitions: those older than ``archive`` in the
+retention config (a duration or ``forever``), by default the longest raw
+retention of any key. With the archive enabled, raw points are never deleted
+from the live database: once the shortest raw retention has passed, their
+whole UTC days are moved to the archive instead, in the same pass and before
+any other tier is touched.
+"""
+from datetime import datetime
+from sqlalchemy import select, delete, text
+from . import archive as archive_tier
+from .models import db, Metric, MetricSegment, MetricRollup
+from .rollups import TIERS, parse_span
+from .response_cache import watermarks
+from .sqlite_profile import maintenance_lock, yield_writer
+
+RAW = "raw"
+
+def load_policies(config):
+    """{key or None (default): {tier: timedelta or None (forever)}} from the retention config"""
+    def parse(tiers):
+        policy = {}
+        for tier, value in (tiers or {}).items():
+            tier = str(tier)
+            if tier != RAW and tier not in TIERS:
+                raise ValueError(f"Unknown retention tier: {tier}")
+            if value in (None, "forever"):
+                policy[tier] = None
+                continue
+            span = parse_span(str(value))
+            if span is None:
+                raise ValueError(f"Invalid retention for {tier}: {value}")
+            policy[tier] = span
+        return policy
+
+    default = parse(config.get("default"))
+    policies = {None: default}
+    for key, tiers in (config.get("keys") or {}).items():
+        policies[key] = {**default, **parse(tiers)}
+    return policies
+
+def load_archive_retention(config):
+    """How long archived days are kept: a timedelta, None (forever) or RAW (the longest raw retention)"""
+    value = config.get("archive")
+    if value is None:
+        return RAW
+    if value == "forever":
+        return None
+    span = parse_span(str(value))
+    if span is None:
+        raise ValueError(f"Invalid retention for archive: {value}")
+    return span
+
+def _longest_raw(policies):
+    """The longest raw retention of any key, None when some key keeps raw points forever"""
+    raw = [policy.get(RAW) for policy in policies.values()]
+    return None if not raw or None in raw else max(raw)
+
+def _shortest_raw(policies):
+    """The shortest raw retention of any key, None when every key keeps raw points forever"""
+    raw = [policy[RAW] for policy in policies.values() if policy.get(RAW) is not None]
+    return min(raw) if raw else None
+
+def enforce_retention(policies, now=None, batch_size=5000, archive_keep=RAW):
+    """Delete expired raw points (or archive them), rollup buckets and archived days.
+
+    Returns {tier: rows deleted}, with ``archived`` points moved to and
+    ``archive`` days deleted from the archive.
+    """
+    now = now or datetime.utcnow()
+    named = [key for key in policies if key is not None]
+    deleted = {}
+    archive = archive_tier.archive
+    if archive is not None:
+        # raw points leave through the archive, so none expire before they were exported
+        shortest = _shortest_raw(policies)
+        if shortest is not None:
+            deleted["archived"] = archive.archive_before(now - shortest)
+        keep = _longest_raw(policies) if archive_keep == RAW else archive_keep
+        if keep is not None:
+            deleted["archive"] = archive.drop_before((now - keep).date())
+            if deleted["archive"]:
+                watermarks.bump("metrics")
+    elif is_hypertable("metrics"):
+        deleted["chunks"] = _drop_chunks(policies, now)
+    for key, policy in policies.items():
+        # the default applies to every key without its own policy
+        key_filter = (lambda column: column == key) if key is not None else (lambda column: column.notin_(named))
+        for tier, keep in policy.items():
+            if keep is None or (tier == RAW and archive is not None):
+                continue
+            cutoff = now - keep
+            if tier == RAW:
+                count = _delete_batched(Metric, [key_filter(Metric.key), Metric.ts < cutoff], batch_size)
+                count += _delete_batched(MetricSegment, [key_filter(MetricSegment.key), MetricSegment.end_ts < cutoff], batch_size)
+            else:
+                count = _delete_batched(MetricRollup, [
+                    MetricRollup.tier == tier, key_filter(MetricRollup.key), MetricRollup.bucket_start < cutoff
+                ], batch_size)
+            deleted[tier] = deleted.get(tier, 0) + count
+    return deleted
+
+def _delete_batched(model, where, batch_size):
+    deleted = 0
+    while True:
+        ids = db.session.scalars(select(model.id).where(*where).limit(batch_size)).all()
+        if not ids:
+            break
+        db.session.execute(delete(model).where(model.id.in_(ids)))
+        watermarks.mark("metrics")
+        db.session.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+        yield_writer()
+    return deleted
+
+def is_hypertable(table):
+    if db.session.get_bind().dialect.name != "postgresql":
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'"
+    )).first() is not None and db.session.execute(text(
+        "SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table"
+    ), {"table": table}).first() is not None
+
+def _drop_chunks(policies, now):
+    """Drop whole metrics chunks past the longest raw retention of any key"""
+    keep = _longest_raw(policies)
+    if keep is None:
+        return 0
+    dropped = db.session.execute(
+        text("SELECT drop_chunks('metrics', older_than => CAST(:cutoff AS timestamp))"),
+        {"cutoff": now - keep}
+    ).all()
+    if dropped:
+        watermarks.mark("metrics")
+    db.session.commit()
+    return len(dropped)
+
+def run_retention_job(app):
+    """Background job enforcing the configured retention policies"""
+    with app.app_context(), maintenance_lock:
+        config = app.config.get("retention") or {}
+        try:
+            deleted = enforce_retention(load_policies(config), batch_size=config.get("batch_size", 5000),
+                                        archive_keep=load_archive_retention(config))
+            if any(deleted.values()):
+                print(f"Retention removed {deleted}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error enforcing retention: {e}")
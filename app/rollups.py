@@ -0,0 +1,177 @@
+"""Incrementally maintained rollups of metric points (1m / 15m / 1h / 1d).
+
+Every write through app.metric_writer folds the newly stored points into one
+``metric_rollups`` row per (device, key, tier, bucket) holding count, sum,
+min, max and the last value. Buckets follow the wall clock of the device's
+site ``tz`` and are stored by their UTC start, so a 1d bucket is a local
+calendar day (23 or 25 hours across DST changes). app.buckets serves
+aggregated reads from the coarsest tier that divides the requested resolution.
+"""
+import re
+from datetime import datetime, timedelta, timezone, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import select, case, and_
+from .models import db, Site, Device, MetricRollup
+from .timeseries import read_metrics
+from .upsert import merge_upsert, upsert
+
+TIERS = {
+    "1m": timedelta(minutes=1),
+    "15m": timedelta(minutes=15),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+# each tier is rebuilt from the one before it
+_SOURCE_TIER = {"15m": "1m", "1h": "15m", "1d": "1h"}
+_ROLLUP_KEY = ["device_id", "key", "tier", "bucket_start"]
+_SPAN_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+_EPOCH = datetime(1970, 1, 1)
+
+def parse_span(text):
+    """'15m' -> timedelta(minutes=15); None unless text is <n><s|m|h|d> (whole days past 24h)"""
+    match = re.fullmatch(r"(\d+)([smhd])", text or "")
+    if not match or int(match.group(1)) == 0:
+        return None
+    span = timedelta(**{_SPAN_UNITS[match.group(2)]: int(match.group(1))})
+    if span > timedelta(days=1) and span % timedelta(days=1):
+        return None  # multi-day buckets are whole local days
+    return span
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+def device_zones(device_ids=None, site_id=None):
+    """Map device ids (all of them, or the given ones / those of a site) to the ZoneInfo of their site"""
+    query = select(Device.id, Site.tz).join(Site, Device.site_id == Site.id)
+    if device_ids is not None:
+        query = query.where(Device.id.in_(list(device_ids)))
+    if site_id:
+        query = query.where(Device.site_id == site_id)
+    return {device_id: _zone(tz) for device_id, tz in db.session.execute(query).all()}
+
+def floor_local(ts, span, zone):
+    """Start (naive UTC) of the span-sized bucket of the zone's wall clock holding naive UTC ts"""
+    local = ts.replace(tzinfo=timezone.utc).astimezone(zone)
+    if span < timedelta(days=1):
+        offset = local.utcoffset()
+        wall = ts + offset
+        return _EPOCH + (wall - _EPOCH) // span * span - offset
+    days = span.days
+    day = local.date().toordinal()
+    start = datetime.fromordinal(day - (day - _EPOCH.toordinal()) % days)
+    return _local_midnight_utc(start.date(), zone)
+
+def bucket_end(start, span, zone):
+    """End (exclusive, naive UTC) of the bucket starting at start"""
+    if span < timedelta(days=1):
+        return start + span
+    local = start.replace(tzinfo=timezone.utc).astimezone(zone)
+    return _local_midnight_utc(local.date() + timedelta(days=span.days), zone)
+
+def _local_midnight_utc(day, zone):
+    return datetime.combine(day, time(0), tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+def _merge(current, incoming):
+    return {
+        "count": current["count"] + incoming["count"],
+        "sum": current["sum"] + incoming["sum"],
+        "min": case((incoming["min"] < current["min"], incoming["min"]), else_=current["min"]),
+        "max": case((incoming["max"] > current["max"], incoming["max"]), else_=current["max"]),
+        "last": case((incoming["last_ts"] >= current["last_ts"], incoming["last"]), else_=current["last"]),
+        "last_ts": case((incoming["last_ts"] >= current["last_ts"], incoming["last_ts"]), else_=current["last_ts"]),
+    }
+
+def _fold(buckets, key, value, ts, count=1, total=None, low=None, high=None):
+    agg = buckets.get(key)
+    total = value if total is None else total
+    low = value if low is None else low
+    high = value if high is None else high
+    if agg is None:
+        buckets[key] = {"count": count, "sum": total, "min": low, "max": high, "last": value, "last_ts": ts}
+        return
+    agg["count"] += count
+    agg["sum"] += total
+    agg["min"] = min(agg["min"], low)
+    agg["max"] = max(agg["max"], high)
+    if ts >= agg["last_ts"]:
+        agg["last"], agg["last_ts"] = value, ts
+
+def apply_rollups(rows):
+    """Fold newly stored metric rows (dicts with ts, device_id, key, value) into every tier"""
+    rows = list(rows)
+    if not rows:
+        return
+    zones = device_zones({r["device_id"] for r in rows})
+    buckets = {}
+    for r in rows:
+        zone = zones.get(r["device_id"], timezone.utc)
+        for tier, span in TIERS.items():
+            start = floor_local(r["ts"], span, zone)
+            _fold(buckets, (r["device_id"], r["key"], tier, start), r["value"], r["ts"])
+    merge_upsert(MetricRollup, [
+        {"device_id": device_id, "key": key, "tier": tier, "bucket_start": start, **agg}
+        for (device_id, key, tier, start), agg in buckets.items()
+    ], _ROLLUP_KEY, _merge)
+
+def rebuild_rollups(rows, previous):
+    """Recompute the buckets holding rows whose stored value was overwritten.
+
+    previous maps (device_id, ts, key) to the value each row replaced. A bucket
+    is recomputed from its source (raw points for 1m, the next finer tier
+    otherwise) when the source still holds every point the bucket counted;
+    once retention has thinned the source it is corrected by the change in
+    value instead, keeping count, sum and last exact (min/max only widen).
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    zones = device_zones({r["device_id"] for r in rows})
+    for tier, span in TIERS.items():
+        changed = {}
+        for r in rows:
+            start = floor_local(r["ts"], span, zones.get(r["device_id"], timezone.utc))
+            changed.setdefault((r["device_id"], r["key"], start), []).append(r)
+        for (device_id, key, start), bucket_rows in changed.items():
+            where = and_(MetricRollup.device_id == device_id, MetricRollup.key == key,
+                         MetricRollup.tier == tier, MetricRollup.bucket_start == start)
+            current = db.session.execute(select(MetricRollup.count, MetricRollup.sum, MetricRollup.min, MetricRollup.max,
+                                                MetricRollup.last, MetricRollup.last_ts).where(where)).mappings().first()
+            if current is None:
+                continue  # expired by retention, or never rolled up
+            end = bucket_end(start, span, zones.get(device_id, timezone.utc))
+            if tier == "1m":
+                points = read_metrics(start, end - timedelta(microseconds=1), key=key, device_ids=[device_id])
+                sources = [(v, ts.to_pydatetime(), 1, v, v, v) for ts, v in zip(points["ts"], points["value"])]
+            else:
+                sources = db.session.execute(
+                    select(MetricRollup.last, MetricRollup.last_ts, MetricRollup.count, MetricRollup.sum,
+                           MetricRollup.min, MetricRollup.max).where(
+                        MetricRollup.device_id == device_id, MetricRollup.key == key,
+                        MetricRollup.tier == _SOURCE_TIER[tier],
+                        MetricRollup.bucket_start >= start, MetricRollup.bucket_start < end
+                    )
+                ).all()
+            buckets = {}
+            for value, ts, count, total, low, high in sources:
+                _fold(buckets, start, value, ts, count, total, low, high)
+            rebuilt = buckets.get(start)
+            if rebuilt is None or rebuilt["count"] != current["count"]:
+                # the source lost points to retention: shift the stored aggregate by the change instead
+                rebuilt = dict(current)
+                for r in bucket_rows:
+                    rebuilt["sum"] += r["value"] - previous[(r["device_id"], r["ts"], r["key"])]
+                    rebuilt["min"], rebuilt["max"] = min(rebuilt["min"], r["value"]), max(rebuilt["max"], r["value"])
+                    if r["ts"] == rebuilt["last_ts"]:
+                        rebuilt["last"] = r["value"]
+            upsert(MetricRollup, [{"device_id": device_id, "key": key, "tier": tier, "bucket_start": start, **rebuilt}],
+                   _ROLLUP_KEY, ["count", "sum", "min", "max", "last", "last_ts"])
+
+def select_tier(span):
+    """Coarsest tier whose buckets tile buckets of span, or None"""
+    for tier in reversed(TIERS):
+        if span % TIERS[tier] == timedelta(0):
+            return tier
+    return None
@@ -0,0 +1,110 @@
+"""Compressed segment tier for closed time ranges of the metrics table.
+
+When ``SEGMENT_STORE_ENABLED`` is set, a scheduler job moves metrics older
+than ``SEGMENT_HOT_HOURS`` out of the row-per-value ``metrics`` table into
+``metric_segments``: one Gorilla-compressed blob per (device, key) and
+``SEGMENT_SPAN_MINUTES`` bucket. Recent data, and late rows that arrive for an
+already compacted range, stay in ``metrics`` until the next pass merges them.
+Read through ``app.timeseries.read_metrics``, which combines both tiers.
+"""
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import select, delete, and_
+from .models import db, Device, Metric, MetricSegment
+from .gorilla import encode_series, decode_series
+from .sqlite_profile import maintenance_lock, yield_writer
+
+EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+def floor_ts(ts, span):
+    return EPOCH + (ts - EPOCH) // span * span
+
+def compact_metrics(cutoff, span_minutes=60, batch_size=50000):
+    """Move metrics with ts before the span bucket holding cutoff into segments.
+
+    Works in batches ordered by (device, key, ts), one transaction each; a
+    bucket split across batches, or one that already has a segment, is merged
+    into the existing segment with the row values winning. Returns rows moved.
+    """
+    span = timedelta(minutes=span_minutes)
+    cutoff = floor_ts(cutoff, span)
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            select(Metric.id, Metric.device_id, Metric.key, Metric.ts, Metric.value)
+            .where(Metric.ts < cutoff)
+            .order_by(Metric.device_id, Metric.key, Metric.ts)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        groups = {}
+        for r in rows:
+            groups.setdefault((r.device_id, r.key, floor_ts(r.ts, span)), {})[r.ts] = r.value
+        for (device_id, key, start_ts), points in groups.items():
+            _write_segment(device_id, key, start_ts, points)
+        db.session.execute(delete(Metric).where(Metric.id.in_([r.id for r in rows])))
+        db.session.commit()
+        moved += len(rows)
+        yield_writer()
+    return moved
+
+def _write_segment(device_id, key, start_ts, points):
+    segment = db.session.scalars(
+        select(MetricSegment).where(
+            MetricSegment.device_id == device_id,
+            MetricSegment.key == key,
+            MetricSegment.start_ts == start_ts
+        )
+    ).first()
+    if segment is not None:
+        timestamps, values = decode_series(segment.data)
+        merged = {EPOCH + t * _US: v for t, v in zip(timestamps, values)}
+        merged.update(points)
+        points = merged
+    else:
+        segment = MetricSegment(device_id=device_id, key=key, start_ts=start_ts)
+        db.session.add(segment)
+    ordered = sorted(points.items())
+    segment.data = encode_series([(ts - EPOCH) // _US for ts, _ in ordered], [v for _, v in ordered])
+    segment.count = len(ordered)
+    segment.end_ts = ordered[-1][0]
+
+def segment_frame(start, end, key=None, device_ids=None, site_id=None):
+    """Decoded segment points (ts, device_id, key, value) within [start, end]"""
+    query = select(MetricSegment.device_id, MetricSegment.key, MetricSegment.data).where(
+        and_(MetricSegment.start_ts <= end, MetricSegment.end_ts >= start)
+    )
+    if key:
+        query = query.where(MetricSegment.key == key if isinstance(key, str) else MetricSegment.key.in_(key))
+    if device_ids:
+        query = query.where(MetricSegment.device_id.in_(device_ids))
+    if site_id:
+        query = query.join(Device, MetricSegment.device_id == Device.id).where(Device.site_id == site_id)
+
+    frames = []
+    for device_id, segment_key, data in db.session.execute(query):
+        timestamps, values = decode_series(data)
+        frames.append(pd.DataFrame({
+            "ts": pd.to_datetime(timestamps, unit="us"),
+            "device_id": device_id,
+            "key": segment_key,
+            "value": values
+        }))
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    return df[(df["ts"] >= start) & (df["ts"] <= end)]
+
+def compact_metrics_job(app):
+    """Background job compacting metrics older than the hot window"""
+    with app.app_context(), maintenance_lock:
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=app.config["SEGMENT_HOT_HOURS"])
+            moved = compact_metrics(cutoff, app.config["SEGMENT_SPAN_MINUTES"])
+            if moved:
+                print(f"Compacted {moved} metrics into segments")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error compacting metrics: {e}")
@@ -5,7 +5,12 @@ import threading
 from datetime import datetime, timedelta
 import pandas as pd
 import paho.mqtt.client as mqtt
-from .models import db, Site, Device, Metric
+from .models import db
+from .metric_writer import insert_metrics
+from .live import publish_readings
+from .last_seen import last_seen
+from .registry_cache import registry_cache
+from .decoder import batch_segment, encode_batch
 
 class DeterministicSimulator:
     def __init__(self, app, broker_host='localhost', broker_port=1883):
@@ -15,6 +20,11 @@ class DeterministicSimulator:
         self.running = False
         self.client = None
         self.seed = 42  # Fixed seed for deterministic behavior
+        self.batch = app.config.get("PUBLISH_BATCH", False)  # one envelope per site per tick
+        self.format = app.config.get("PUBLISH_FORMAT", "json")
+        self.batch_shards = app.config.get("PUBLISH_BATCH_SHARDS", 4)
+        self.sent_messages = 0
+        self.sent_bytes = 0
         
         # Device configurations
         self.devices = [
@@ -65,6 +75,7 @@ class DeterministicSimulator:
     def _generate_data(self):
         """Generate realistic sensor data"""
         current_time = datetime.utcnow()
+        batches = {}
         
         for device_config in self.devices:
             # Calculate time-based variations
@@ -113,11 +124,23 @@ class DeterministicSimulator:
                 device_config["type"]: round(value, 2)
             }
             
-            topic = f"sensor/{device_config['site']}/{device_config['name']}/reading"
-            self.client.publish(topic, json.dumps(payload), qos=1)
+            if self.batch:
+                shard = batch_segment(device_config["name"], self.batch_shards)
+                batches.setdefault((device_config["site"], shard), []).append(payload)
+            else:
+                topic = f"sensor/{device_config['site']}/{device_config['name']}/reading"
+                self._publish(topic, json.dumps(payload).encode("utf-8"))
             
             # Also store directly in database for immediate UI updates
             self._store_metric(device_config, current_time, value)
+        
+        for (site, shard), readings in batches.items():
+            self._publish(f"sensor/{site}/{shard}/reading", encode_batch(readings, self.format, site=site))
+    
+    def _publish(self, topic, body):
+        self.client.publish(topic, body, qos=1)
+        self.sent_messages += 1
+        self.sent_bytes += len(body)
             
     def _daily_load_pattern(self, hour, minute):
         """Generate daily load pattern with higher usage in evening"""
@@ -149,43 +172,25 @@ class DeterministicSimulator:
     def _store_metric(self, device_config, timestamp, value):
         """Store metric directly in database"""
         try:
-            # Get or create site
-            site = Site.query.filter_by(name=device_config["site"]).first()
-            if not site:
-                site = Site(name=device_config["site"], tz="America/Toronto")
-                db.session.add(site)
-                db.session.commit()
-                
-            # Get or create device
-            device = Device.query.filter_by(
-                name=device_config["name"], 
-                site_id=site.id
-            ).first()
-            
-            if not device:
-                device = Device(
-                    site_id=site.id,
-                    name=device_config["name"],
-                    type=device_config["type"],
-                    unit=device_config["unit"],
-                    capabilities=["realtime", "historical"]
-                )
-                db.session.add(device)
-                db.session.commit()
+            device = registry_cache.resolve_device(
+                device_config["site"], device_config["name"],
+                device_type=device_config["type"], unit=device_config["unit"]
+            )
                 
-            # Update last seen
-            device.last_seen_at = timestamp
-            
             # Store metric
-            metric = Metric(
-                ts=timestamp,
-                device_id=device.id,
-                key=device_config["type"],
-                value=value
-            )
-            db.session.add(metric)
+            rows = insert_metrics([{
+                "ts": timestamp,
+                "device_id": device.id,
+                "key": device_config["type"],
+                "value": value
+            }])
             db.session.commit()
             
+            # Update last seen and live views only with what was stored
+            if rows:
+                last_seen.touch(device.id, timestamp)
+                publish_readings(rows, {device.id: device.site_id})
+            
         except Exception as e:
             print(f"Error storing metric: {e}")
             db.session.rollback()
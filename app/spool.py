@@ -0,0 +1,247 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+_HEADER = struct.Struct("<IIH")  # record length, crc32, topic length
+_CHECKPOINT = struct.Struct("<QQ")  # segment number, byte offset
+
+class Spool:
+    """Append-only, segment-rotated write-ahead spool for raw MQTT messages.
+
+    The MQTT callback appends ``(topic, payload)`` records and returns without
+    touching the database. A single reader (the partition's flusher) pulls
+    batches with ``get_batch()``, writes them, and calls ``ack()`` once the
+    transaction committed; only then is the checkpoint advanced and fully
+    consumed segments deleted. If the write fails the reader calls
+    ``rewind()`` and the same records are replayed on the next attempt, so a
+    database outage costs disk space instead of readings.
+
+    Segments are named ``seg-<n>.spool``; a new one is started on every open
+    and whenever the active one exceeds ``segment_bytes``, so a torn record
+    left by a crash can only ever sit at the tail of a closed segment.
+
+    Once ``max_bytes`` are spooled but not yet acknowledged, ``put()`` waits up
+    to its timeout for the flusher to catch up and then raises ``queue.Full``,
+    like the in-memory queue, so a long outage cannot fill the disk.
+
+    Records the database rejects for good are moved with ``dead_letter()`` to
+    ``deadletter.spool`` (same record format) so they stop blocking the ones
+    behind them and can be inspected or replayed by hand.
+    """
+
+    durable = True
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync_interval=1.0, max_bytes=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        lock = threading.RLock()
+        self._cond = threading.Condition(lock)   # records appended
+        self._space = threading.Condition(lock)  # records acknowledged
+        self._checkpoint_path = os.path.join(directory, "checkpoint")
+        self._ack_pos = self._load_checkpoint()
+        self._read_pos = self._ack_pos
+        self._reader = None
+        self._unacked = 0
+
+        segments = self._segments()
+        self._write_seg = max(segments[-1] + 1 if segments else 1, self._ack_pos[0] + 1)
+        self._writer = open(self._segment_path(self._write_seg), "ab")
+        self._last_fsync = time.monotonic()
+        self._depth = self.depth_bytes()
+
+        self.appended = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self._rate = 0.0
+        self._rate_mark = (time.monotonic(), 0)
+
+    def _segment_path(self, n):
+        return os.path.join(self.directory, f"seg-{n:012d}.spool")
+
+    def _segments(self):
+        return sorted(
+            int(name[4:-6]) for name in os.listdir(self.directory)
+            if name.startswith("seg-") and name.endswith(".spool")
+        )
+
+    def _load_checkpoint(self):
+        try:
+            with open(self._checkpoint_path, "rb") as f:
+                return _CHECKPOINT.unpack(f.read(_CHECKPOINT.size))
+        except (OSError, struct.error):
+            segments = self._segments()
+            return (segments[0] if segments else 1, 0)
+
+    def _save_checkpoint(self):
+        tmp = self._checkpoint_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_CHECKPOINT.pack(*self._ack_pos))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._checkpoint_path)
+
+    @staticmethod
+    def _encode(topic, payload):
+        topic = topic.encode("utf-8")
+        body = topic + bytes(payload)
+        return _HEADER.pack(len(body), zlib.crc32(body), len(topic)) + body
+
+    def put(self, item, timeout=None):
+        """Append one (topic, payload) record; queue.Full if max_bytes stay spooled for timeout seconds"""
+        record = self._encode(*item)
+        with self._cond:
+            if self.max_bytes and not self._space.wait_for(
+                lambda: self._depth + len(record) <= self.max_bytes, timeout
+            ):
+                raise queue.Full
+            if self._writer.tell() + len(record) > self.segment_bytes and self._writer.tell() > 0:
+                self._rotate()
+            self._writer.write(record)
+            self._writer.flush()
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._writer.fileno())
+                self._last_fsync = now
+            self._depth += len(record)
+            self.appended += 1
+            self._cond.notify()
+
+    def _rotate(self):
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._writer.close()
+        self._write_seg += 1
+        self._writer = open(self._segment_path(self._write_seg), "ab")
+
+    def get_batch(self, max_items, timeout):
+        """Read up to max_items records after the read position, waiting up to timeout"""
+        deadline = time.monotonic() + timeout
+        batch = []
+        while len(batch) < max_items:
+            record = self._read_one()
+            if record is not None:
+                batch.append(record)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or batch:
+                break
+            with self._cond:
+                self._cond.wait(remaining)
+        return batch
+
+    def _read_one(self):
+        while True:
+            seg, offset = self._read_pos
+            with self._cond:
+                closed = seg < self._write_seg  # closed segments never grow again
+            f = self._open_segment(seg)
+            if f is not None:
+                f.seek(offset)
+                header = f.read(_HEADER.size)
+                if len(header) == _HEADER.size:
+                    length, crc, topic_len = _HEADER.unpack(header)
+                    body = f.read(length)
+                    if len(body) == length:
+                        if zlib.crc32(body) == crc:
+                            self._read_pos = (seg, offset + _HEADER.size + length)
+                            self._unacked += 1
+                            return body[:topic_len].decode("utf-8"), body[topic_len:]
+                        print(f"Spool segment {seg} corrupt at offset {offset}, skipping its tail")
+            if not closed:
+                return None  # caught up with the writer (or its record is half written)
+            # end of a closed segment, possibly with a torn tail record from a crash
+            self._read_pos = (seg + 1, 0)
+
+    def _open_segment(self, seg):
+        if self._reader is not None and self._reader[0] == seg:
+            return self._reader[1]
+        if self._reader is not None:
+            self._reader[1].close()
+            self._reader = None
+        try:
+            self._reader = (seg, open(self._segment_path(seg), "rb"))
+        except FileNotFoundError:
+            return None
+        return self._reader[1]
+
+    def ack(self):
+        """Mark everything read so far as durably written downstream"""
+        consumed = self._read_pos
+        acked, self._unacked = self._unacked, 0
+        self._ack_pos = consumed
+        self._save_checkpoint()
+        for n in self._segments():
+            if n < consumed[0]:
+                try:
+                    os.remove(self._segment_path(n))
+                except OSError:
+                    pass
+        with self._cond:
+            self._depth = self.depth_bytes()
+            self._space.notify_all()
+        self._track_rate(acked)
+
+    def dead_letter(self, records):
+        """Set aside read records that can never be written; call ack() afterwards to skip them"""
+        with open(os.path.join(self.directory, "deadletter.spool"), "ab") as f:
+            for topic, payload in records:
+                f.write(self._encode(topic, payload))
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += len(records)
+
+    def rewind(self):
+        """Go back to the last checkpoint so unacknowledged records are replayed"""
+        self._read_pos = self._ack_pos
+        self._unacked = 0
+
+    def pending(self):
+        """Whether records were appended past the read position"""
+        with self._cond:
+            return self._read_pos != (self._write_seg, self._writer.tell())
+
+    def depth_bytes(self):
+        """Bytes spooled but not yet acknowledged"""
+        total = 0
+        for n in self._segments():
+            if n < self._ack_pos[0]:
+                continue
+            try:
+                size = os.path.getsize(self._segment_path(n))
+            except OSError:
+                continue
+            total += size - (self._ack_pos[1] if n == self._ack_pos[0] else 0)
+        return total
+
+    def _track_rate(self, acked):
+        self.replayed += acked
+        now = time.monotonic()
+        since, count = self._rate_mark
+        if now - since >= 1.0:
+            self._rate = (self.replayed - count) / (now - since)
+            self._rate_mark = (now, self.replayed)
+
+    def stats(self):
+        return {
+            "depth_bytes": self.depth_bytes(),
+            "segments": len(self._segments()),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "dead_lettered": self.dead_lettered,
+            "replay_rate": round(self._rate, 1)
+        }
+
+    def close(self):
+        with self._cond:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+        if self._reader:
+            self._reader[1].close()
@@ -0,0 +1,149 @@
+"""Production profile for SQLite file databases.
+
+With ``SQLITE_PROFILE=production`` (opt-in; ``default`` leaves the engine
+as SQLAlchemy configures it) and a ``sqlite:///`` file database:
+
+- every connection sets ``busy_timeout`` and ``mmap_size``; the writer also
+  switches the file to WAL with ``synchronous=NORMAL``, so readers never block
+  the writer and commits skip the per-transaction fsync of the rollback journal
+- the default engine holds a single connection: MQTT ingest, the simulator,
+  scheduler jobs and requests queue on the pool for it instead of failing
+  with "database is locked"
+- a ``reader`` bind opens the same file read-only with a pool of
+  ``SQLITE_READERS`` connections, and ``RoutingSession`` sends SELECTs there
+  until the session's transaction writes, after which it stays on the writer
+  so it reads its own changes
+- checkouts of the writer are timed (``/api/ingest/stats`` reports the waits)
+  and maintenance jobs (retention, compaction, archiving) run one at a time
+  under ``maintenance_lock``, calling ``yield_writer`` between their
+  transactions so a flusher waiting for the connection gets it first
+"""
+import threading
+import time
+from collections import deque
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+READER_BIND = "reader"
+
+class WriterWaits:
+    """Checkouts of the writer connection: how many are waiting and how long recent ones waited"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=1024)  # seconds, recent checkouts
+        self.waiting = 0
+        self.checkouts = 0
+
+    def begin(self):
+        with self._lock:
+            self.waiting += 1
+
+    def end(self, seconds):
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self._waits.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {"checkouts": self.checkouts, "waiting": self.waiting}
+        if waits:
+            stats["wait_ms"] = {
+                "p50": round(waits[len(waits) // 2] * 1000, 3),
+                "p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 3),
+                "max": round(waits[-1] * 1000, 3)
+            }
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._waits.clear()
+            self.checkouts = 0
+
+# Shared by the writer pool, maintenance jobs and /api/ingest/stats
+writer_waits = WriterWaits()
+
+# Held by a maintenance job for its whole run, so at most one of them competes with ingest
+maintenance_lock = threading.Lock()
+
+class WriterPool(QueuePool):
+    """QueuePool recording how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        writer_waits.begin()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            writer_waits.end(time.perf_counter() - start)
+
+def yield_writer(limit=1.0):
+    """Between two maintenance transactions: wait up to limit seconds while others wait for the writer"""
+    deadline = time.monotonic() + limit
+    while writer_waits.waiting and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+class RoutingSession(Session):
+    """Session sending reads to the read-only pool while its transaction has not written"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and isinstance(clause, Select) and not self._flushing and not self.info.get("writing"):
+            reader = self._db.engines.get(READER_BIND)
+            if reader is not None:
+                return reader
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if not isinstance(clause, Select):
+            self.info["writing"] = True
+        return engine
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _end_write(session, transaction):
+    if transaction.parent is None:  # savepoints end inside the writing transaction
+        session.info.pop("writing", None)
+
+def configure_sqlite(app):
+    """Set engine options and the reader bind; call before ``db.init_app(app)``"""
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    url = make_url(uri)
+    if (app.config["SQLITE_PROFILE"] != "production" or not url.drivername.startswith("sqlite")
+            or url.database in (None, "", ":memory:")):
+        return False
+    connect_args = {"timeout": app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000.0, "check_same_thread": False}
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).update(
+        poolclass=WriterPool, pool_size=1, max_overflow=0, pool_timeout=60, connect_args=connect_args
+    )
+    database = url.database if url.query.get("uri") else f"file:{url.database}"
+    app.config.setdefault("SQLALCHEMY_BINDS", {})[READER_BIND] = {
+        "url": url.set(database=database, query={**url.query, "mode": "ro", "uri": "true"}),
+        "pool_size": app.config["SQLITE_READERS"],
+        "max_overflow": 0,
+        "connect_args": connect_args,
+    }
+    return True
+
+def install_sqlite_pragmas(app, db):
+    """Register per-connection PRAGMAs on the engines configured by configure_sqlite"""
+    if READER_BIND not in app.config.get("SQLALCHEMY_BINDS", {}):
+        return
+    busy_timeout = app.config["SQLITE_BUSY_TIMEOUT_MS"]
+    mmap_size = app.config["SQLITE_MMAP_BYTES"]
+
+    def pragmas(writer):
+        def on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+            cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+            if writer:
+                cursor.execute("PRAGMA journal_mode = WAL")
+                cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.close()
+        return on_connect
+
+    with app.app_context():
+        event.listen(db.engines[None], "connect", pragmas(writer=True))
+        event.listen(db.engines[READER_BIND], "connect", pragmas(writer=False))
@@ -1,10 +1,13 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import current_app
-from .models import db, Reading, DailySummary
+from .models import db, DailySummary
+from .legacy import legacy_readings_frame
 from .event_detector import run_event_detection_job
 from .alert_engine import run_alert_evaluation_job
-import pandas as pd
-from sqlalchemy import select
+from .last_seen import flush_last_seen_job
+from .segments import compact_metrics_job
+from .retention import run_retention_job
+from .archive import archive_metrics_job
 from datetime import datetime, timedelta
 
 scheduler = BackgroundScheduler()
@@ -24,28 +27,30 @@ def init_scheduler(app):
         # Alert evaluation
         scheduler.add_job(run_alert_evaluation_job, "interval", seconds=30, args=[app])
         
+        # Coalesced device last_seen_at write-back
+        scheduler.add_job(flush_last_seen_job, "interval", seconds=app.config["LAST_SEEN_FLUSH_SECONDS"], args=[app])
+        
+        # Retention of raw metrics and rollup tiers
+        scheduler.add_job(run_retention_job, "interval", hours=1, args=[app])
+        
+        # Compressed segment store for closed time ranges
+        if app.config["SEGMENT_STORE_ENABLED"]:
+            scheduler.add_job(compact_metrics_job, "interval", minutes=15, args=[app])
+        
+        # Parquet archive of closed days
+        if app.config["ARCHIVE_DIR"]:
+            scheduler.add_job(archive_metrics_job, "interval", hours=6, args=[app])
+        
     scheduler.start()
 
-def _df_from_rows(rows):
-    if not rows:
-        return pd.DataFrame()
-    df = pd.DataFrame([{
-        "ts": r.ts, "meter_id": r.meter_id,
-        "kw": r.kw, "kvar": r.kvar, "volts": r.volts, "hertz": r.hertz,
-        "quality_ok": r.quality_ok
-    } for r in rows]).set_index("ts").sort_index()
-    return df
-
 def _run_daily_rollup(app):
     with app.app_context():
         end = datetime.now()
         start = (end - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        rows = db.session.scalars(
-            select(Reading).where(Reading.ts >= start, Reading.ts < end)
-        ).all()
-        df = _df_from_rows(rows)
+        df = legacy_readings_frame(start, end)
         if df.empty: 
             return
+        df = df.set_index("ts").sort_index()
         for meter_id, g in df.groupby("meter_id"):
             g1 = g.resample("1min").ffill()
             kwh = (g1["kw"].fillna(0) / 60.0).sum()
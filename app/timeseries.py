@@ -0,0 +1,87 @@
+"""Single read path for metric points across storage tiers.
+
+API routes and background jobs read metrics through ``read_metrics`` rather
+than querying ``Metric`` directly, so points that have been moved out of the
+``metrics`` table (compressed segments, see app.segments, and the Parquet
+archive, see app.archive) are still returned.
+
+``key`` is a single metric key or a list of keys (``None``: every key).
+"""
+from datetime import timedelta
+import pandas as pd
+from sqlalchemy import select, and_
+from .models import db, Device, Metric
+from .segments import segment_frame
+from . import archive as archive_tier
+
+COLUMNS = ["ts", "device_id", "key", "value"]
+
+def read_metrics(start, end, key=None, device_ids=None, site_id=None, include_archive=True):
+    """Metric points with start <= ts <= end as a DataFrame of COLUMNS sorted by ts.
+
+    On duplicate (device_id, key, ts) the metrics table wins over compacted
+    segments, which win over the archive.
+    """
+    query = _hot_query(start, end, key, device_ids, site_id)
+    hot = pd.DataFrame(db.session.execute(query).all(), columns=COLUMNS)
+    return _merge(hot, cold_points(start, end, key, device_ids, site_id, include_archive))
+
+def iter_metrics(start, end, key=None, device_ids=None, site_id=None, window=timedelta(hours=1), chunk_rows=10000):
+    """read_metrics as a sequence of DataFrames of at most chunk_rows, in ts order.
+
+    The range is walked one window at a time. Windows with no points outside
+    the metrics table stream from a server-side cursor; others are merged
+    like read_metrics, so at most one window is held in memory.
+    """
+    lo = start
+    while lo <= end:
+        hi = min(lo + window - timedelta(microseconds=1), end)
+        query = _hot_query(lo, hi, key, device_ids, site_id).order_by(Metric.ts, Metric.device_id)
+        cold = [f for f in cold_points(lo, hi, key, device_ids, site_id) if not f.empty]
+        if cold:
+            df = _merge(pd.DataFrame(db.session.execute(query).all(), columns=COLUMNS), cold)
+            for i in range(0, len(df), chunk_rows):
+                yield df.iloc[i:i + chunk_rows]
+        else:
+            result = db.session.execute(query.execution_options(yield_per=chunk_rows))
+            for rows in result.partitions():
+                chunk = pd.DataFrame(rows, columns=COLUMNS)
+                chunk["ts"] = pd.to_datetime(chunk["ts"])
+                yield chunk
+        lo = hi + timedelta(microseconds=1)
+
+def _hot_query(start, end, key, device_ids, site_id):
+    query = select(Metric.ts, Metric.device_id, Metric.key, Metric.value).where(
+        and_(Metric.ts >= start, Metric.ts <= end)
+    )
+    if key:
+        query = query.where(Metric.key == key if isinstance(key, str) else Metric.key.in_(key))
+    if device_ids:
+        query = query.where(Metric.device_id.in_(device_ids))
+    if site_id:
+        query = query.join(Device, Metric.device_id == Device.id).where(Device.site_id == site_id)
+    return query
+
+def _merge(hot, cold):
+    frames = [f for f in cold if not f.empty]
+    if not hot.empty:
+        frames.append(hot)
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    if len(frames) > 1:
+        df = df.drop_duplicates(subset=["device_id", "key", "ts"], keep="last")
+    df["ts"] = pd.to_datetime(df["ts"])
+    return df.sort_values(["ts", "device_id"], kind="stable").reset_index(drop=True)
+
+def cold_points(start, end, key=None, device_ids=None, site_id=None, include_archive=True):
+    """Frames of points stored outside the metrics table, lowest priority first"""
+    frames = []
+    if include_archive and archive_tier.archive is not None:
+        archived = archive_tier.archive.read(start, end, key=key, device_ids=device_ids, site_id=site_id)
+        if archived is not None:
+            frames.append(archived)
+    segments = segment_frame(start, end, key=key, device_ids=device_ids, site_id=site_id)
+    if segments is not None:
+        frames.append(segments)
+    return frames
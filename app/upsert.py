@@ -0,0 +1,78 @@
+from sqlalchemy import insert, update, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .models import db
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def _dialect_insert():
+    return _DIALECT_INSERTS.get(db.session.get_bind().dialect.name)
+
+def insert_ignore(model, rows, index_elements):
+    """Bulk insert rows, skipping any that collide on index_elements"""
+    upsert(model, rows, index_elements, update_columns=None)
+
+def upsert(model, rows, index_elements, update_columns=None):
+    """Bulk insert rows with ON CONFLICT DO NOTHING, or DO UPDATE of update_columns.
+
+    Dialects without ON CONFLICT support fall back to one savepoint per row,
+    which is slow but never aborts the surrounding transaction.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    dialect_insert = _dialect_insert()
+    if dialect_insert is None:
+        _upsert_rowwise(model, rows, index_elements, update_columns)
+        return
+
+    stmt = dialect_insert(model)
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={c: stmt.excluded[c] for c in update_columns}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+    db.session.execute(stmt, rows)
+
+def merge_upsert(model, rows, index_elements, merge):
+    """Bulk insert rows; on conflict set columns to merge(current, incoming).
+
+    ``merge`` gets the table columns and the incoming row (``excluded``, or
+    literal values in the row-wise fallback), both indexable by column name,
+    and returns {column: SQL expression} for the update.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    dialect_insert = _dialect_insert()
+    if dialect_insert is None:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model), [row])
+            except IntegrityError:
+                incoming = {c: literal(v) for c, v in row.items()}
+                db.session.execute(
+                    update(model).filter_by(**{c: row[c] for c in index_elements})
+                    .values(merge(model.__table__.c, incoming))
+                )
+        return
+
+    stmt = dialect_insert(model)
+    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=merge(model.__table__.c, stmt.excluded))
+    db.session.execute(stmt, rows)
+
+def _upsert_rowwise(model, rows, index_elements, update_columns):
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model), [row])
+        except IntegrityError:
+            if update_columns:
+                key = {c: row[c] for c in index_elements}
+                db.session.query(model).filter_by(**key).update({c: row[c] for c in update_columns})
@@ -0,0 +1,67 @@
+"""Broker bytes/messages and decode rate for single vs batched MQTT payloads.
+
+Groups the recorded payloads in samples/mqtt_payloads.jsonl into batch
+envelopes of --batch readings (as the publishers do in PUBLISH_BATCH mode)
+and compares, per format, how many messages and bytes cross the broker and how
+many readings/sec app.decoder.PayloadDecoder turns into pipeline readings.
+
+    python benchmarks/bench_batch.py [path/to/payloads.jsonl] [--batch N] [--rounds N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.decoder import PayloadDecoder, encode_batch, msgpack  # noqa: E402
+
+def load_readings(path):
+    readings = []
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            device_name = record["topic"].split("/")[2]
+            readings.append((record["topic"], {"device_name": device_name, **record["payload"]}))
+    return readings
+
+def single_messages(readings):
+    return [(topic, json.dumps(payload).encode("utf-8")) for topic, payload in readings]
+
+def batch_messages(readings, size, fmt):
+    messages = []
+    for i in range(0, len(readings), size):
+        chunk = [payload for _, payload in readings[i:i + size]]
+        messages.append(("utility/meter/batch-0/reading", encode_batch(chunk, fmt)))
+    return messages
+
+def measure(decoder, messages, rounds):
+    decoded = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for topic, raw in messages:
+            decoded += len(decoder.decode(topic, raw))
+    return decoded / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "samples", "mqtt_payloads.jsonl"))
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    readings = load_readings(args.path)
+    decoder = PayloadDecoder()
+    variants = [("single json", single_messages(readings)), ("batch json", batch_messages(readings, args.batch, "json"))]
+    if msgpack is not None:
+        variants.append(("batch msgpack", batch_messages(readings, args.batch, "msgpack")))
+
+    print(f"readings: {len(readings)}, batch size: {args.batch}")
+    print(f"{'variant':<15} {'messages':>9} {'bytes':>10} {'bytes/reading':>14} {'readings/s':>12}")
+    for name, messages in variants:
+        size = sum(len(raw) for _, raw in messages)
+        rate = measure(decoder, messages, args.rounds)
+        print(f"{name:<15} {len(messages):>9} {size:>10} {size / len(readings):>14.1f} {rate:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
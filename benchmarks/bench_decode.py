@@ -0,0 +1,102 @@
+"""Messages/sec of the MQTT payload decode path, before and after the precompiled decoder.
+
+Replays recorded payloads from samples/mqtt_payloads.jsonl through the
+original per-message code (json + pandas timestamp + unit checks rebuilt per
+key) and through app.decoder.PayloadDecoder. Only decoding and metric key
+selection are measured; no database is involved.
+
+    python benchmarks/bench_decode.py [path/to/payloads.jsonl] [--rounds N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.decoder import PayloadDecoder, orjson  # noqa: E402
+
+UNITS = {"power": "W", "temp": "°C"}
+
+def load_payloads(path):
+    messages = []
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            raw = json.dumps(record["payload"]).encode("utf-8")
+            messages.append((record["topic"], raw, UNITS.get(record["payload"].get("type"), "W")))
+    return messages
+
+def legacy_validate_unit(device_unit, payload_key):
+    unit_mappings = {
+        "W": ["kw", "power", "w"],
+        "V": ["volts", "voltage", "v"],
+        "A": ["current", "amps"],
+        "°C": ["temp", "temperature"],
+        "AQI": ["aqi"],
+        "%": ["humidity", "percent"]
+    }
+    for unit, keys in unit_mappings.items():
+        if device_unit == unit:
+            return payload_key in keys
+    return True
+
+def legacy_decode(topic, raw, unit):
+    payload = json.loads(raw.decode("utf-8"))
+    parts = topic.split("/")
+    device_name = parts[2] if len(parts) >= 3 else payload.get("device_name", "UNKNOWN")
+    site_name = payload.get("site", "Home")
+    ts = pd.to_datetime(payload.get("ts", datetime.utcnow())).to_pydatetime()
+    metric_keys = {
+        "kw": "power", "power": "power", "w": "power",
+        "volts": "voltage", "voltage": "voltage", "v": "voltage",
+        "kvar": "reactive_power", "reactive_power": "reactive_power",
+        "hertz": "frequency", "frequency": "frequency", "hz": "frequency",
+        "temp": "temp", "temperature": "temp",
+        "aqi": "aqi", "humidity": "humidity"
+    }
+    values = []
+    for payload_key, metric_key in metric_keys.items():
+        if payload_key in payload and payload[payload_key] is not None:
+            if legacy_validate_unit(unit, payload_key):
+                values.append((metric_key, float(payload[payload_key])))
+    return site_name, device_name, ts, values
+
+def new_decode(decoder):
+    def run(topic, raw, unit):
+        reading = decoder.decode(topic, raw)[0]
+        return reading["site"], reading["device"], reading["ts"], list(decoder.metric_values(unit, reading["payload"]))
+    return run
+
+def measure(fn, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for topic, raw, unit in messages:
+            fn(topic, raw, unit)
+    elapsed = time.perf_counter() - start
+    return len(messages) * rounds / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "samples", "mqtt_payloads.jsonl"))
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    messages = load_payloads(args.path)
+    decoder = PayloadDecoder()
+
+    # the new path yields every value the old one did (plus the legacy meter
+    # quantities that used to go to the readings table)
+    for topic, raw, unit in messages:
+        assert set(legacy_decode(topic, raw, unit)[3]) <= set(new_decode(decoder)(topic, raw, unit)[3])
+
+    before = measure(legacy_decode, messages, args.rounds)
+    after = measure(new_decode(decoder), messages, args.rounds)
+    print(f"payloads: {len(messages)} x {args.rounds} rounds, JSON backend: {'orjson' if orjson else 'json'}")
+    print(f"before: {before:12,.0f} msg/s")
+    print(f"after:  {after:12,.0f} msg/s  ({after / before:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""/api/events latency as the events table grows: one keyset page vs every row.
+
+For each --sizes table size, fills a scratch SQLite database with that many
+Event rows (with a JSON meta like the detector writes) and times
+/api/events?limit=--limit for the first page and for a page deep into the
+table (following a cursor), and the same request with limit set to the whole
+table, which is what the endpoint returned before pagination. Page latency
+should stay flat while the unbounded request grows with the table.
+
+    python benchmarks/bench_event_pagination.py [--sizes 10000,100000,400000] [--limit N] [--rounds N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench_sqlite_concurrency import make_app  # noqa: E402
+from app.models import db, Event, Site  # noqa: E402
+from app.pagination import encode_cursor  # noqa: E402
+from app.response_cache import init_response_cache  # noqa: E402
+
+START = datetime(2025, 1, 1)
+
+def fill(app, size):
+    with app.app_context():
+        site = Site(name="Home", tz="UTC")
+        db.session.add(site)
+        db.session.commit()
+        for offset in range(0, size, 50000):
+            db.session.execute(insert(Event), [{
+                "site_id": site.id, "start_ts": START + timedelta(seconds=30 * i),
+                "end_ts": START + timedelta(seconds=30 * i + 5), "type": "spike", "severity": 2,
+                "device_ids": [1 + i % 8], "meta": {"peak_value": 3000.0 + i % 500, "zmax": 4.2,
+                                                    "baseline_mu": 1200.0, "baseline_sigma": 150.0}
+            } for i in range(offset, min(size, offset + 50000))])
+            db.session.commit()
+        deep = db.session.execute(select(Event.start_ts, Event.id).order_by(Event.start_ts.desc(), Event.id.desc())
+                                  .offset(int(size * 0.9)).limit(1)).one()
+        return site.id, encode_cursor(*deep)
+
+def timed(client, params, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get("/api/events", query_string=params)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return min(timings) * 1000, len(response.get_data())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,400000")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    os.environ["API_PAGE_LIMIT"] = str(max(sizes))  # lets the unbounded request through
+    os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"    # time the query, not the response cache
+    print(f"{'rows':>8} {'first page ms':>14} {'deep page ms':>13} {'all rows ms':>12} {'all rows bytes':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, "bench.db"), "production")
+            init_response_cache(app)
+            site_id, deep_cursor = fill(app, size)
+            client = app.test_client()
+            first, _ = timed(client, {"site_id": site_id, "limit": args.limit}, args.rounds)
+            deep, _ = timed(client, {"site_id": site_id, "limit": args.limit, "cursor": deep_cursor}, args.rounds)
+            everything, body = timed(client, {"site_id": site_id, "limit": size}, 1)
+            print(f"{size:>8,} {first:>14.1f} {deep:>13.1f} {everything:>12.1f} {body:>15,}")
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""/api/kpis latency vs downloading the raw day the KPI cards used to need.
+
+Fills a scratch SQLite database with --devices power meters reporting every
+--interval seconds up to now, for each --sizes points per device, then times
+/api/kpis (after the first request has primed the running totals) against
+/api/metrics returning the same window raw. KPI latency should not grow with
+the number of points.
+
+    python benchmarks/bench_kpis.py [--devices N] [--sizes 3600,20000,80000] [--interval S] [--rounds N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bench_sqlite_concurrency import make_app  # noqa: E402
+from app.kpis import init_kpis  # noqa: E402
+from app.latest import latest  # noqa: E402
+from app.metric_writer import insert_metrics  # noqa: E402
+from app.models import db  # noqa: E402
+from app.registry_cache import registry_cache  # noqa: E402
+from app.response_cache import init_response_cache  # noqa: E402
+
+def timed(client, path, params, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.get(path, query_string=params)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return min(timings) * 1000, len(response.get_data())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=5)
+    parser.add_argument("--sizes", default="3600,20000,80000")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"  # time the work, not the response cache
+    os.environ["METRICS_MAX_POINTS"] = "0"        # the whole raw day, as the cards needed
+    print(f"{'points/device':>14} {'kpis ms':>9} {'kpis bytes':>11} {'raw day ms':>11} {'raw day bytes':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, "bench.db"), "production")
+            init_response_cache(app)
+            init_kpis(app)
+            latest.clear()
+            now = datetime.utcnow().replace(microsecond=0)
+            start = now - timedelta(seconds=args.interval * (size - 1))
+            with app.app_context():
+                devices = [registry_cache.resolve_device("Home", f"Meter {n}") for n in range(args.devices)]
+                for device in devices:
+                    for offset in range(0, size, 20000):
+                        insert_metrics([{"ts": start + timedelta(seconds=args.interval * i), "device_id": device.id,
+                                         "key": "power", "value": 1000.0 + i % 300}
+                                        for i in range(offset, min(size, offset + 20000))])
+                        db.session.commit()
+            client = app.test_client()
+            site = {"site_id": devices[0].site_id}
+            client.get("/api/kpis", query_string=site)  # primes the running totals once
+            kpis_ms, kpis_bytes = timed(client, "/api/kpis", site, args.rounds)
+            raw_ms, raw_bytes = timed(client, "/api/metrics", {**site, "key": "power", "from": start.isoformat(),
+                                                               "to": now.isoformat()}, 1)
+            print(f"{size:>14,} {kpis_ms:>9.2f} {kpis_bytes:>11,} {raw_ms:>11.1f} {raw_bytes:>14,}")
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Fan-out latency of the /api/stream pub/sub with many connected clients.
+
+Subscribes --clients clients to one site, each drained by its own thread
+through LiveBroker.listen (the generator the SSE response iterates), then
+publishes --messages batches of --points readings and reports publish time,
+the broker's publish-to-write latency percentiles and any dropped clients.
+--slow makes that many clients stop reading, to show they are dropped
+without delaying the others.
+
+    python benchmarks/bench_live_fanout.py [--clients N] [--messages N] [--points N] [--slow N]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.live import LiveBroker  # noqa: E402
+
+def drain(broker, subscription, done):
+    for frame in broker.listen(subscription):
+        if done.is_set():
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=20)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--buffer", type=int, default=256)
+    args = parser.parse_args()
+
+    broker = LiveBroker(buffer_size=args.buffer, max_clients=0, keepalive=1)
+    done = threading.Event()
+    subscriptions = [broker.subscribe(1) for _ in range(args.clients)]
+    threads = [threading.Thread(target=drain, args=(broker, s, done), daemon=True)
+               for s in subscriptions[args.slow:]]  # the first --slow clients never read
+    for t in threads:
+        t.start()
+
+    t0 = datetime(2025, 1, 15)
+    elapsed = 0.0
+    for i in range(args.messages):
+        points = [{"t": (t0 + timedelta(seconds=i)).isoformat(), "device_id": d, "key": "power", "value": 1000.0 + d}
+                  for d in range(args.points)]
+        start = time.perf_counter()
+        broker.publish(1, "metrics", points)
+        elapsed += time.perf_counter() - start
+    time.sleep(0.5)
+    done.set()
+
+    stats = broker.stats()
+    print(f"{args.clients} clients ({args.slow} not reading), {args.messages} messages of {args.points} readings")
+    print(f"publish:   {elapsed / args.messages * 1e6:.1f} us/message")
+    print(f"fan-out:   p50 {stats['fanout_ms']['p50']} ms, p99 {stats['fanout_ms']['p99']} ms, "
+          f"max {stats['fanout_ms']['max']} ms")
+    print(f"delivered: {stats['delivered']:,}, dropped clients: {stats['dropped_clients']}")
+
+if __name__ == "__main__":
+    main()
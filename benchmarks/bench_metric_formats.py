@@ -0,0 +1,61 @@
+"""Payload bytes and serialization time of the /api/metrics response formats.
+
+Builds a synthetic raw series of --points points per device for --devices
+devices and times how long app.metric_formats plus Flask's JSON encoder take
+to produce each response body (json per-point dicts, columnar arrays, Arrow
+IPC), and how large the body is raw and gzip-compressed.
+
+    python benchmarks/bench_metric_formats.py [--devices N] [--points N] [--rounds N]
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app import metric_formats  # noqa: E402
+
+def make_frame(devices, points):
+    ts = pd.date_range("2025-01-15", periods=points, freq="s")
+    rng = np.random.default_rng(0)
+    frames = [pd.DataFrame({"ts": ts, "device_id": device_id, "key": "power",
+                            "value": 1000 + rng.normal(0, 50, points)}) for device_id in range(1, devices + 1)]
+    return pd.concat(frames).sort_values(["ts", "device_id"], kind="stable").reset_index(drop=True)
+
+def encoders(app):
+    def json_body(encode):
+        def run(df, devices):
+            return app.json.dumps({"series": encode(df, devices), "devices": list(devices.values())}).encode()
+        return run
+    return {
+        "json": json_body(metric_formats.points),
+        "columnar": json_body(metric_formats.columnar),
+        "arrow": metric_formats.arrow_stream,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=5)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask("bench")
+    df = make_frame(args.devices, args.points)
+    devices = {d: {"name": f"Meter {d}", "type": "power", "unit": "W"} for d in range(1, args.devices + 1)}
+    print(f"{len(df):,} points ({args.devices} devices x {args.points:,})")
+    print(f"{'format':<10} {'bytes':>12} {'gzip bytes':>12} {'encode ms':>10}")
+    for name, encode in encoders(app).items():
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            body = encode(df, devices)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<10} {len(body):>12,} {len(gzip.compress(body)):>12,} {min(timings) * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
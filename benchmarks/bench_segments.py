@@ -0,0 +1,75 @@
+"""Bytes per point of the metrics table vs compressed segments, and segment decode rate.
+
+Generates --hours of 1 Hz meter readings (a random walk rounded to two
+decimals, like the recorded payloads) for --devices devices, stores them as
+rows in a scratch SQLite ``metrics`` table built from app.models, and encodes
+the same series with app.gorilla in SEGMENT_SPAN_MINUTES-sized segments.
+
+    python benchmarks/bench_segments.py [--devices N] [--hours N] [--span MINUTES]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.gorilla import encode_series, decode_series  # noqa: E402
+from app.models import db  # noqa: E402
+
+def series(seed, points):
+    rng = random.Random(seed)
+    value = rng.uniform(200, 800)
+    for _ in range(points):
+        value += rng.gauss(0, 2)
+        yield round(value, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--hours", type=int, default=6)
+    parser.add_argument("--span", type=int, default=60)
+    args = parser.parse_args()
+
+    points = args.hours * 3600
+    start = datetime(2025, 1, 15)
+    t0 = int((start - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+    data = {d: list(series(d, points)) for d in range(1, args.devices + 1)}
+    total = args.devices * points
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db.metadata.create_all(create_engine(f"sqlite:///{path}"), tables=[db.metadata.tables["metrics"]])
+        conn = sqlite3.connect(path)
+        conn.executemany(
+            "INSERT INTO metrics (ts, device_id, key, value) VALUES (?, ?, 'power', ?)",
+            ((str(start + timedelta(seconds=i)), d, v) for d, values in data.items() for i, v in enumerate(values))
+        )
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        table_bytes = os.path.getsize(path)
+
+    span = args.span * 60
+    blobs = []
+    for values in data.values():
+        for i in range(0, points, span):
+            chunk = values[i:i + span]
+            blobs.append(encode_series([t0 + (i + j) * 1_000_000 for j in range(len(chunk))], chunk))
+    segment_bytes = sum(len(b) for b in blobs)
+
+    begin = time.perf_counter()
+    decoded = sum(len(decode_series(b)[0]) for b in blobs)
+    rate = decoded / (time.perf_counter() - begin)
+
+    print(f"points: {total:,} ({args.devices} devices x {args.hours} h at 1 Hz), {len(blobs)} segments")
+    print(f"metrics table: {table_bytes / total:6.1f} bytes/point (SQLite file incl. indexes)")
+    print(f"segments:      {segment_bytes / total:6.1f} bytes/point ({table_bytes / segment_bytes:.0f}x smaller)")
+    print(f"decode:        {rate:,.0f} points/s")
+
+if __name__ == "__main__":
+    main()
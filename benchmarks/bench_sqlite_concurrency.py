@@ -0,0 +1,122 @@
+"""Read latency on SQLite while ingest is writing, with and without SQLITE_PROFILE=production.
+
+For each profile, builds the app's database in a scratch file, starts
+--writers threads that write batches of metrics through app.metric_writer
+the way the ingest flushers do, and meanwhile issues /api/metrics requests
+from --readers threads. Reports request latency percentiles, write
+throughput, and how many operations failed with "database is locked".
+
+    python benchmarks/bench_sqlite_concurrency.py [--seconds N] [--writers N] [--readers N] [--batch N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.api import api_bp  # noqa: E402
+from app.config import load_config  # noqa: E402
+from app.metric_writer import insert_metrics  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models import db, init_db  # noqa: E402
+from app.registry_cache import init_registry_cache, registry_cache  # noqa: E402
+from app.sqlite_profile import configure_sqlite, install_sqlite_pragmas  # noqa: E402
+
+START = datetime(2025, 1, 15)
+
+def make_app(path, profile):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["SQLITE_PROFILE"] = profile
+    app = Flask("app")
+    load_config(app)
+    app.config["SQLALCHEMY_DATABASE_URI"] = app.config["DATABASE_URL"]
+    configure_sqlite(app)
+    db.init_app(app)
+    install_sqlite_pragmas(app, db)
+    init_registry_cache(app)
+    with app.app_context():
+        init_db()
+        run_migrations()
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def run(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"), profile)
+        with app.app_context():
+            devices = [registry_cache.resolve_device("Home", f"Meter {n}").id for n in range(args.writers)]
+        stop = threading.Event()
+        latencies, written, locked = [], [0], [0]
+        lock = threading.Lock()
+
+        def writer(device_id):
+            ts = START
+            with app.app_context():
+                while not stop.is_set():
+                    rows = [{"ts": ts + timedelta(seconds=i), "device_id": device_id, "key": "power", "value": float(i)}
+                            for i in range(args.batch)]
+                    try:
+                        insert_metrics(rows)
+                        db.session.commit()
+                        with lock:
+                            written[0] += len(rows)
+                    except Exception as e:
+                        db.session.rollback()
+                        with lock:
+                            locked[0] += "locked" in str(e)
+                    ts += timedelta(seconds=args.batch)
+
+        def reader(n):
+            client = app.test_client()
+            query = {"device_id": devices[n % len(devices)], "key": "power",
+                     "from": START.isoformat(), "to": (START + timedelta(hours=1)).isoformat()}
+            while not stop.is_set():
+                begin = time.perf_counter()
+                response = client.get("/api/metrics", query_string=query)
+                elapsed = time.perf_counter() - begin
+                with lock:
+                    if response.status_code == 200:
+                        latencies.append(elapsed)
+                    else:
+                        locked[0] += 1
+
+        threads = [threading.Thread(target=writer, args=(d,)) for d in devices]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    ms = [v * 1000 for v in latencies]
+    print(f"{profile:<11} {len(ms):>8} {percentile(ms, 0.5):>8.1f} {percentile(ms, 0.95):>8.1f} "
+          f"{percentile(ms, 0.99):>8.1f} {written[0] / args.seconds:>12,.0f} {locked[0]:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.batch} rows/batch, {args.readers} readers, {args.seconds:g}s per profile")
+    print(f"{'profile':<11} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rows/s':>12} {'errors':>7}")
+    for profile in ("default", "production"):
+        run(profile, args)
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,8 @@ function Dashboard() {
     siteId: selectedSiteId,
     deviceIds: selectedDeviceIds,
     key: selectedMetric,
-    hours: timeRange.hours
+    hours: timeRange.hours,
+    maxPoints: 2000 // about one point per pixel of the timeline
   })
   const { events, loading: eventsLoading } = useEvents({
     siteId: selectedSiteId,
@@ -34,8 +34,16 @@ export function Header({ sites, selectedSiteId, selectedDeviceIds, selectedMetri
       }
     } else if (format === 'csv') {
       // Export data as CSV
-      const url = `/api/metrics?site_id=${selectedSiteId}&format=csv`
-      window.open(url, '_blank')
+      const to = new Date()
+      const from = new Date(to.getTime() - timeRange.hours * 60 * 60 * 1000)
+      const params = new URLSearchParams({
+        site_id: selectedSiteId?.toString() || '',
+        key: selectedMetric,
+        from: from.toISOString(),
+        to: to.toISOString(),
+        format: 'csv'
+      })
+      window.open(`/api/export?${params.toString()}`, '_blank')
     }
     setShowExportDropdown(false)
   }
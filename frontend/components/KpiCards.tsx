@@ -1,6 +1,7 @@
 'use client'
 
-import { TrendingUp, TrendingDown, Zap, DollarSign } from 'lucide-react'
+import { TrendingUp, Zap, DollarSign } from 'lucide-react'
+import { useKpis } from '@/hooks/useKpis'
 
 interface KpiCardsProps {
   siteId: number | null
@@ -9,50 +10,45 @@ interface KpiCardsProps {
 }
 
 export function KpiCards({ siteId, deviceIds, loading }: KpiCardsProps) {
-  // Mock data for now - will be replaced with real API calls
-  const kpiData = {
-    current_power: 1247.5,
-    daily_energy: 28.4,
-    peak_today: 1543.2,
-    cost_estimate: 4.26
-  }
+  // Running totals since local midnight, computed during ingest
+  const { kpis: kpiData, loading: kpisLoading } = useKpis(siteId, deviceIds)
 
   const kpis = [
     {
       title: 'Current Power',
-      value: kpiData.current_power,
+      value: kpiData?.current_power ?? 0,
       unit: 'W',
       icon: Zap,
-      trend: { value: 5.2, direction: 'up' as const },
+      detail: null,
       color: 'text-accent'
     },
     {
-      title: '24h Energy',
-      value: kpiData.daily_energy,
+      title: 'Energy Today',
+      value: kpiData?.energy_kwh ?? 0,
       unit: 'kWh',
       icon: TrendingUp,
-      trend: { value: 2.1, direction: 'up' as const },
+      detail: null,
       color: 'text-accent-2'
     },
     {
       title: 'Peak Today',
-      value: kpiData.peak_today,
+      value: kpiData?.peak?.value ?? 0,
       unit: 'W',
       icon: TrendingUp,
-      trend: { value: 8.7, direction: 'down' as const },
+      detail: kpiData?.peak ? new Date(kpiData.peak.ts + 'Z').toLocaleTimeString() : null,
       color: 'text-yellow-400'
     },
     {
       title: 'Cost Est.',
-      value: kpiData.cost_estimate,
+      value: kpiData?.cost ?? 0,
       unit: '$',
       icon: DollarSign,
-      trend: { value: 1.3, direction: 'up' as const },
+      detail: kpiData ? `@ $${kpiData.price_per_kwh}/kWh` : null,
       color: 'text-green-400'
     }
   ]
 
-  if (loading) {
+  if (loading || (kpisLoading && !kpiData)) {
     return (
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
         {[...Array(4)].map((_, i) => (
@@ -70,7 +66,6 @@ export function KpiCards({ siteId, deviceIds, loading }: KpiCardsProps) {
     <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
       {kpis.map((kpi, index) => {
         const Icon = kpi.icon
-        const TrendIcon = kpi.trend.direction === 'up' ? TrendingUp : TrendingDown
         
         return (
           <div key={index} className="kpi-card">
@@ -79,12 +74,9 @@ export function KpiCards({ siteId, deviceIds, loading }: KpiCardsProps) {
                 <Icon className={`h-5 w-5 ${kpi.color}`} />
                 <h3 className="text-sm font-medium text-muted">{kpi.title}</h3>
               </div>
-              <div className={`flex items-center space-x-1 text-xs ${
-                kpi.trend.direction === 'up' ? 'text-green-400' : 'text-red-400'
-              }`}>
-                <TrendIcon className="h-3 w-3" />
-                <span>{kpi.trend.value}%</span>
-              </div>
+              {kpi.detail && (
+                <span className="text-xs text-muted">{kpi.detail}</span>
+              )}
             </div>
             
             <div className="flex items-baseline space-x-2">
@@ -2,12 +2,19 @@
 
 import { useState, useEffect } from 'react'
 import { Alert } from '@/types'
+import { useStream, LiveAlert } from '@/hooks/useStream'
 
 export function useAlerts(siteId?: number | null) {
   const [alerts, setAlerts] = useState<Alert[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
 
+  useStream(siteId, (kind, data) => {
+    if (kind !== 'alert') return
+    const fired = data as LiveAlert
+    setAlerts(current => current.map(a => a.id === fired.alert_id ? { ...a, last_fired_at: fired.ts } : a))
+  })
+
   useEffect(() => {
     const fetchAlerts = async () => {
       if (!siteId) {
@@ -2,6 +2,7 @@
 
 import { useState, useEffect } from 'react'
 import { Event } from '@/types'
+import { useStream } from '@/hooks/useStream'
 
 interface UseEventsOptions {
   siteId?: number | null
@@ -15,6 +16,18 @@ export function useEvents(options: UseEventsOptions = {}) {
   const [events, setEvents] = useState<Event[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
+  const [reload, setReload] = useState(0)
+
+  useStream(options.siteId, (kind, data) => {
+    if (kind === 'dropped') {
+      setReload(n => n + 1)
+    } else if (kind === 'event') {
+      const event = data as Event
+      if (!options.deviceIds?.length || event.device_ids.some(id => options.deviceIds!.includes(id))) {
+        setEvents(current => [...current.filter(e => e.id !== event.id), event])
+      }
+    }
+  })
 
   useEffect(() => {
     const fetchEvents = async () => {
@@ -41,14 +54,15 @@ export function useEvents(options: UseEventsOptions = {}) {
         if (options.from) params.append('from', options.from)
         if (options.to) params.append('to', options.to)
         
+        // One page, newest first, bounds the load in busy windows; older pages are not charted
         const response = await fetch(`/api/events?${params.toString()}`)
-        
+
         if (!response.ok) {
           throw new Error('Failed to fetch events')
         }
-        
-        const data = await response.json()
-        setEvents(data)
+
+        const data: Event[] = await response.json()
+        setEvents(data.reverse())
         setError(null)
       } catch (err) {
         setError(err instanceof Error ? err.message : 'Unknown error')
@@ -59,7 +73,7 @@ export function useEvents(options: UseEventsOptions = {}) {
     }
 
     fetchEvents()
-  }, [options.siteId, options.deviceIds, options.from, options.to, options.hours])
+  }, [options.siteId, options.deviceIds, options.from, options.to, options.hours, reload])
 
   return { events, loading, error }
 }
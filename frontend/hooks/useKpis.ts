@@ -0,0 +1,58 @@
+'use client'
+
+import { useState, useEffect, useRef } from 'react'
+import { Kpis } from '@/types'
+import { useStream } from '@/hooks/useStream'
+
+// Refetch at most this often while live readings arrive
+const REFRESH_MS = 10000
+
+export function useKpis(siteId?: number | null, deviceIds?: number[]) {
+  const [kpis, setKpis] = useState<Kpis | null>(null)
+  const [loading, setLoading] = useState(true)
+  const [error, setError] = useState<string | null>(null)
+  const [reload, setReload] = useState(0)
+  const lastFetch = useRef(0)
+
+  useStream(siteId, (kind) => {
+    if (kind === 'metrics' && Date.now() - lastFetch.current > REFRESH_MS) {
+      lastFetch.current = Date.now()
+      setReload(n => n + 1)
+    }
+  })
+
+  useEffect(() => {
+    const fetchKpis = async () => {
+      if (!siteId) {
+        setKpis(null)
+        setLoading(false)
+        return
+      }
+
+      try {
+        lastFetch.current = Date.now()
+        const params = new URLSearchParams()
+        params.append('site_id', siteId.toString())
+        deviceIds?.forEach(id => params.append('device_id', id.toString()))
+
+        const response = await fetch(`/api/kpis?${params.toString()}`)
+
+        if (!response.ok) {
+          throw new Error('Failed to fetch KPIs')
+        }
+
+        setKpis(await response.json())
+        setError(null)
+      } catch (err) {
+        setError(err instanceof Error ? err.message : 'Unknown error')
+        setKpis(null)
+      } finally {
+        setLoading(false)
+      }
+    }
+
+    fetchKpis()
+  }, [siteId, deviceIds, reload])
+
+  return { kpis, loading, error }
+}
@@ -2,6 +2,7 @@
 
 import { useState, useEffect } from 'react'
 import { MetricsResponse } from '@/types'
+import { useStream, LiveReading } from '@/hooks/useStream'
 
 interface UseMetricsOptions {
   siteId?: number | null
@@ -11,12 +12,40 @@ interface UseMetricsOptions {
   from?: string
   to?: string
   resolution?: 'raw' | '1m' | '15m'
+  maxPoints?: number
 }
 
 export function useMetrics(options: UseMetricsOptions = {}) {
   const [metrics, setMetrics] = useState<MetricsResponse>({ series: [], devices: [] })
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
+  const [reload, setReload] = useState(0)
+
+  // Sliding raw windows append streamed readings instead of refetching
+  useStream(options.siteId, (kind, data) => {
+    if (kind === 'dropped') {
+      setReload(n => n + 1)
+      return
+    }
+    if (kind !== 'metrics' || !options.hours || (options.resolution && options.resolution !== 'raw')) return
+    const key = options.key || 'power'
+    const readings = (data as LiveReading[]).filter(r =>
+      r.key === key && (!options.deviceIds?.length || options.deviceIds.includes(r.device_id)))
+    if (!readings.length) return
+    const since = Date.now() - options.hours * 60 * 60 * 1000
+    setMetrics(current => {
+      const names = new Map(current.series.map(m => [m.device_id, m.device_name]))
+      const appended = readings.map(r => ({
+        t: r.t, device_id: r.device_id, value: r.value,
+        device_name: names.get(r.device_id) || `Device ${r.device_id}`
+      }))
+      return {
+        ...current,
+        // timestamps are naive UTC; without the 'Z' Date would read them as local time
+        series: current.series.concat(appended).filter(m => new Date(m.t + 'Z').getTime() >= since)
+      }
+    })
+  })
 
   useEffect(() => {
     const fetchMetrics = async () => {
@@ -44,6 +73,7 @@ export function useMetrics(options: UseMetricsOptions = {}) {
         if (options.from) params.append('from', options.from)
         if (options.to) params.append('to', options.to)
         if (options.resolution) params.append('res', options.resolution)
+        if (options.maxPoints) params.append('max_points', options.maxPoints.toString())
         
         const response = await fetch(`/api/metrics?${params.toString()}`)
         
@@ -63,7 +93,7 @@ export function useMetrics(options: UseMetricsOptions = {}) {
     }
 
     fetchMetrics()
-  }, [options.siteId, options.deviceIds, options.key, options.hours, options.from, options.to, options.resolution])
+  }, [options.siteId, options.deviceIds, options.key, options.hours, options.from, options.to, options.resolution, options.maxPoints, reload])
 
   return { metrics, loading, error }
 }
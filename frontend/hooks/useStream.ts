@@ -0,0 +1,62 @@
+'use client'
+
+import { useEffect, useRef } from 'react'
+
+export interface LiveReading {
+  t: string
+  device_id: number
+  key: string
+  value: number
+}
+
+export interface LiveAlert {
+  id: number
+  alert_id: number
+  alert_name: string
+  ts: string
+  payload: Record<string, unknown>
+}
+
+// 'dropped': the server gave up on this client for reading too slowly; refetch to fill the gap
+export type StreamKind = 'metrics' | 'event' | 'alert' | 'dropped'
+type Listener = (kind: StreamKind, data: any) => void
+
+const KINDS: StreamKind[] = ['metrics', 'event', 'alert', 'dropped']
+
+// One EventSource per site, shared by every hook following it
+const sources = new Map<number, { source: EventSource; listeners: Set<Listener> }>()
+
+function connect(siteId: number, listener: Listener) {
+  let entry = sources.get(siteId)
+  if (!entry) {
+    const source = new EventSource(`/api/stream?site_id=${siteId}`)
+    const listeners = new Set<Listener>()
+    KINDS.forEach(kind => {
+      source.addEventListener(kind, (e) => {
+        const data = JSON.parse((e as MessageEvent).data)
+        listeners.forEach(l => l(kind, data))
+      })
+    })
+    entry = { source, listeners }
+    sources.set(siteId, entry)
+  }
+  const current = entry
+  current.listeners.add(listener)
+  return () => {
+    current.listeners.delete(listener)
+    if (!current.listeners.size) {
+      current.source.close()
+      sources.delete(siteId)
+    }
+  }
+}
+
+export function useStream(siteId: number | null | undefined, listener: Listener) {
+  const ref = useRef(listener)
+  ref.current = listener
+
+  useEffect(() => {
+    if (!siteId) return
+    return connect(siteId, (kind, data) => ref.current(kind, data))
+  }, [siteId])
+}
@@ -21,6 +21,11 @@ export interface Metric {
   device_id: number
   value: number
   device_name: string
+  // bucketed resolutions only (value is the mean)
+  min?: number
+  max?: number
+  count?: number
+  last?: number
 }
 
 export interface MetricsResponse {
@@ -88,3 +93,26 @@ export interface KpiData {
   peak_today: number
   cost_estimate: number
 }
+
+export interface DeviceKpis {
+  device_id: number
+  device_name: string
+  unit: string
+  current_power: number | null
+  current_ts: string | null
+  energy_kwh: number
+  peak: number | null
+  peak_ts: string | null
+}
+
+export interface Kpis {
+  site_id: number
+  key: string
+  since: string | null
+  current_power: number
+  energy_kwh: number
+  peak: { value: number; ts: string; device_id: number } | null
+  cost: number
+  price_per_kwh: number
+  devices: DeviceKpis[]
+}
@@ -1,4 +1,4 @@
-import os, json, random, time
+import os, json, random, time, zlib
 from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
 
@@ -6,12 +6,28 @@ BROKER = os.getenv("MQTT_BROKER_HOST", "localhost")
 PORT   = int(os.getenv("MQTT_BROKER_PORT", "1883"))
 METER_IDS = ["MTR-1001", "MTR-1002", "MTR-2303"]
 FEEDER = "FDR-12"
+# Batching mode: one envelope per tick carrying every meter's reading
+BATCH  = os.getenv("PUBLISH_BATCH", "false").lower() == "true"
+FORMAT = os.getenv("PUBLISH_FORMAT", "json")  # json | msgpack
+# Batches are split over topics .../batch-<n>/reading by meter, so each meter keeps one ingest partition
+SHARDS = int(os.getenv("PUBLISH_BATCH_SHARDS", "4"))
+
+if FORMAT == "msgpack":
+    import msgpack
+
+def encode(payload):
+    if FORMAT == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload)
 
 client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 client.connect(BROKER, PORT)
+client.loop_start()
 
+sent_messages = sent_bytes = 0
 while True:
     base_kw = 1200 + 800 * (0.5 + 0.5*random.random())
+    batches = {}
     for i, mid in enumerate(METER_IDS):
         ts = datetime.now(timezone.utc).isoformat()
         kw = base_kw/len(METER_IDS) * (0.9 + 0.2*random.random())
@@ -22,7 +38,20 @@ while True:
             "volts": round(volts,2), "hertz": round(hertz,3),
             "voltage_level": "MV" if i==0 else "LV", "feeder": FEEDER
         }
+        if BATCH:
+            shard = zlib.crc32(mid.encode("utf-8")) % max(1, SHARDS)
+            batches.setdefault(shard, []).append({"device_name": mid, **payload})
+            continue
         topic = f"utility/meter/{mid}/reading"
-        client.publish(topic, json.dumps(payload), qos=1)
+        body = encode(payload)
+        client.publish(topic, body, qos=1)
+        sent_messages += 1; sent_bytes += len(body)
         print("->", topic, payload)
-    time.sleep(5)
\ No newline at end of file
+    for shard, batch in batches.items():
+        topic = f"utility/meter/batch-{shard}/reading"
+        body = encode({"readings": batch})
+        client.publish(topic, body, qos=1)
+        sent_messages += 1; sent_bytes += len(body)
+        print("->", topic, f"{len(batch)} readings, {len(body)} bytes ({FORMAT})")
+    print(f"   total: {sent_messages} messages, {sent_bytes} bytes")
+    time.sleep(5)
@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from app.config import load_config
+from app.models import db, init_db
+from app.migrations import run_migrations
+from app.sqlite_profile import configure_sqlite, install_sqlite_pragmas
+from app.api import api_bp
+from app.registry_cache import init_registry_cache
+from app.last_seen import last_seen
+from app.latest import latest
+from app.response_cache import init_response_cache
+from app.live import init_live
+from app.kpis import init_kpis
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Flask app on a throwaway SQLite file, without MQTT or scheduler threads"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("SQLITE_PROFILE", "production")
+    app = Flask("app")
+    load_config(app)
+    app.config["SQLALCHEMY_DATABASE_URI"] = app.config["DATABASE_URL"]
+    app.config["TESTING"] = True
+    configure_sqlite(app)
+    db.init_app(app)
+    install_sqlite_pragmas(app, db)
+    init_registry_cache(app)
+    init_response_cache(app)
+    init_live(app)
+    init_kpis(app)
+    last_seen.clear()
+    latest.clear()
+    with app.app_context():
+        init_db()
+        run_migrations()
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app
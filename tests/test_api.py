@@ -1,7 +1,9 @@
 from app import create_app
 
-def test_health():
+def test_health(tmp_path, monkeypatch):
+    # a throwaway database, so the test never touches the committed instance/energy.db
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
     app = create_app()
     c = app.test_client()
     r = c.get("/api/daily")
-    assert r.status_code == 200
\ No newline at end of file
+    assert r.status_code == 200
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import pandas as pd
+import pytest
+from app.buckets import bucket_series, offset_periods
+from app.metric_writer import insert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+from app.rollups import floor_local, parse_span
+from app.segments import compact_metrics
+
+TORONTO = ZoneInfo("America/Toronto")
+# 2025-03-09 07:00 UTC is 02:00 EST, when Toronto moves to EDT
+DST_START = datetime(2025, 3, 9, 7, 0)
+
+def _expected(rows, span, start, end):
+    """Reference aggregation: floor every point with app.rollups.floor_local"""
+    df = pd.DataFrame([r for r in rows if start <= r["ts"] <= end])
+    df["bucket"] = [floor_local(ts, span, TORONTO) for ts in df["ts"]]
+    df = df.sort_values("ts")
+    out = df.groupby("bucket").agg(count=("value", "count"), mean=("value", "mean"), min=("value", "min"),
+                                   max=("value", "max"), last=("value", "last"))
+    return [(ts.to_pydatetime(), *values) for ts, values in zip(out.index, out.itertuples(index=False))]
+
+def _actual(df):
+    return [(ts.to_pydatetime(), count, mean, low, high, last)
+            for ts, count, mean, low, high, last in df[["ts", "count", "mean", "min", "max", "last"]].itertuples(index=False)]
+
+def test_offset_periods_split_at_dst_change():
+    periods = offset_periods(TORONTO, DST_START - timedelta(days=2), DST_START + timedelta(days=1))
+    assert [(lo, hi, offset.total_seconds() / 3600) for lo, hi, offset in periods] == [
+        (DST_START - timedelta(days=2), DST_START, -5.0),
+        (DST_START, DST_START + timedelta(days=1), -4.0),
+    ]
+    assert len(offset_periods(ZoneInfo("UTC"), DST_START, DST_START + timedelta(days=30))) == 1
+
+@pytest.mark.parametrize("res", ["90s", "10m", "2h", "1d", "2d"])
+def test_buckets_match_local_floor_across_dst(app, res):
+    span = parse_span(res)
+    start, end = DST_START - timedelta(days=2), DST_START + timedelta(days=2)
+    rows = [{"ts": start + timedelta(seconds=45 * i), "device_id": 0, "key": "power", "value": float(i % 97)}
+            for i in range(int((end - start) / timedelta(seconds=45)))]
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        for row in rows:
+            row["device_id"] = device.id
+        insert_metrics(rows)
+        db.session.commit()
+        df = bucket_series(span, start, end, "power", device_ids=[device.id])
+    # rollup-backed reads count the tier bucket overlapping start whole, which is aligned here
+    assert _actual(df) == pytest.approx(_expected(rows, span, start, end))
+
+def test_raw_buckets_include_compacted_points(app):
+    start = datetime(2025, 1, 15, 12, 0)
+    rows = [{"ts": start + timedelta(seconds=10 * i), "device_id": 0, "key": "power", "value": float(i)}
+            for i in range(720)]
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        for row in rows:
+            row["device_id"] = device.id
+        insert_metrics(rows)
+        db.session.commit()
+        compact_metrics(start + timedelta(hours=1))  # the first hour moves to a segment
+        df = bucket_series(parse_span("30s"), start, start + timedelta(hours=2), "power", device_ids=[device.id])
+    assert _actual(df) == pytest.approx(_expected(rows, parse_span("30s"), start, start + timedelta(hours=2)))
+
+def test_metrics_api_returns_bucket_aggregates(app):
+    start = datetime(2025, 1, 15, 12, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics([{"ts": start + timedelta(seconds=10 * i), "device_id": device.id, "key": "power",
+                         "value": float(i)} for i in range(12)])
+        db.session.commit()
+    params = {"device_id": device.id, "key": "power", "from": "2025-01-15T12:00:00Z", "to": "2025-01-15T12:02:00Z"}
+    series = app.test_client().get("/api/metrics", query_string={**params, "res": "45s"}).get_json()["series"]
+    assert [(p["t"], p["count"], p["value"], p["min"], p["max"], p["last"]) for p in series] == [
+        ("2025-01-15T12:00:00", 5, 2.0, 0.0, 4.0, 4.0),
+        ("2025-01-15T12:00:45", 4, 6.5, 5.0, 8.0, 8.0),
+        ("2025-01-15T12:01:30", 3, 10.0, 9.0, 11.0, 11.0),
+    ]
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import numpy as np
+from app.downsample import lttb_indices, minmax_indices
+from app.metric_writer import insert_metrics
+from app.models import db, Event
+from app.registry_cache import registry_cache
+
+def test_selectors_keep_shape_and_extremes():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 5.0
+    picked = lttb_indices(x, y, 200)
+    assert len(picked) == 200 and picked[0] == 0 and picked[-1] == 9999
+    assert np.all(np.diff(picked) > 0) and 4321 in picked
+
+    picked = minmax_indices(x, y, 200)
+    assert len(picked) <= 200 and 4321 in picked and int(np.argmin(y)) in picked
+    assert list(lttb_indices(x[:50], y[:50], 200)) == list(range(50))
+
+def test_metrics_api_bounds_points_and_keeps_events(app):
+    start = datetime(2025, 1, 15, 12, 0)
+    rng = np.random.default_rng(7)
+    values = 1000 + rng.normal(0, 50, 5000)
+    values[3000:3003] = [600.0, 550.0, 600.0]  # a sag smaller than the noise spread LTTB favours
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics([{"ts": start + timedelta(seconds=i), "device_id": device.id, "key": "power",
+                         "value": float(v)} for i, v in enumerate(values)])
+        db.session.add(Event(site_id=device.site_id, start_ts=start + timedelta(seconds=3000),
+                             end_ts=start + timedelta(seconds=3002), type="sag", severity=3,
+                             device_ids=[device.id]))
+        db.session.commit()
+
+    client = app.test_client()
+    params = {"device_id": device.id, "key": "power", "from": start.isoformat(),
+              "to": (start + timedelta(hours=2)).isoformat()}
+    sag = (start + timedelta(seconds=3001)).isoformat()
+    for method in ("lttb", "minmax"):
+        series = client.get("/api/metrics", query_string={**params, "max_points": 20, "downsample": method}).get_json()["series"]
+        assert len(series) <= 20 and sag in [p["t"] for p in series]
+
+    app.config["METRICS_MAX_POINTS"] = 300
+    assert len(client.get("/api/metrics", query_string=params).get_json()["series"]) <= 300
+    assert len(client.get("/api/metrics", query_string={**params, "max_points": 10000}).get_json()["series"]) <= 300
+    assert client.get("/api/metrics", query_string={**params, "max_points": 1}).status_code == 400
+    assert client.get("/api/metrics", query_string={**params, "downsample": "avg"}).status_code == 400
@@ -0,0 +1,56 @@
+import io
+import json
+from datetime import datetime, timedelta
+import pyarrow.parquet as pq
+from app.metric_writer import insert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+from app.segments import compact_metrics
+from app.timeseries import iter_metrics, read_metrics
+
+T0 = datetime(2025, 1, 15, 12, 0)
+
+def _load(app):
+    with app.app_context():
+        fridge = registry_cache.resolve_device("Home", "Fridge, kitchen")
+        oven = registry_cache.resolve_device("Home", "Oven")
+        insert_metrics([{"ts": T0 + timedelta(seconds=i), "device_id": device.id, "key": "power", "value": i + 0.5}
+                        for i in range(3 * 3600) for device in (fridge, oven)])
+        db.session.commit()
+        compact_metrics(T0 + timedelta(hours=1, minutes=30))  # first hour goes to segments
+    return fridge, oven
+
+def test_iter_metrics_matches_read_metrics(app):
+    _load(app)
+    with app.app_context():
+        end = T0 + timedelta(hours=3)
+        chunks = list(iter_metrics(T0, end, key="power", chunk_rows=1000))
+        assert max(len(c) for c in chunks) <= 1000
+        streamed = [row for c in chunks for row in c.itertuples(index=False)]
+        assert streamed == list(read_metrics(T0, end, key="power").itertuples(index=False))
+
+def test_export_formats(app):
+    fridge, oven = _load(app)
+    client = app.test_client()
+    params = {"site_id": fridge.site_id, "key": "power", "from": T0.isoformat(),
+              "to": (T0 + timedelta(hours=3)).isoformat()}
+
+    response = client.get("/api/export", query_string={**params, "format": "csv"})
+    assert response.is_streamed and response.mimetype == "text/csv"
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == "timestamp,device_id,device_name,key,value,unit"
+    assert lines[1] == f'2025-01-15T12:00:00,{fridge.id},"Fridge, kitchen",power,0.5,W'
+    assert len(lines) == 1 + 2 * 3 * 3600
+
+    rows = [json.loads(line) for line in client.get("/api/export", query_string={**params, "format": "ndjson"})
+            .get_data(as_text=True).splitlines()]
+    assert len(rows) == 2 * 3 * 3600
+    assert rows[-1] == {"timestamp": "2025-01-15T14:59:59", "device_id": oven.id, "device_name": "Oven",
+                        "key": "power", "value": 10799.5, "unit": "W"}
+
+    data = client.get("/api/export", query_string={**params, "format": "parquet"}).get_data()
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_rows == 2 * 3 * 3600 and parquet.metadata.num_row_groups > 1
+    assert parquet.read().column("device_name")[0].as_py() == "Fridge, kitchen"
+
+    assert client.get("/api/export", query_string={**params, "format": "xml"}).status_code == 400
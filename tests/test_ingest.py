@@ -0,0 +1,162 @@
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.exc import DataError
+from app.ingest import IngestPipeline
+from app.decoder import PayloadDecoder, parse_ts, encode_batch, batch_segment
+from app.models import db, Device, Metric, Reading, Meter
+from app.last_seen import last_seen
+
+def _reading(device, ts, **values):
+    return {"site": "Home", "device": device, "ts": ts, "payload": {"type": "power", "unit": "W", **values}}
+
+def test_flush_writes_batch(app):
+    pipeline = IngestPipeline(app, batch_size=10)
+    t0 = datetime(2025, 1, 15, 12, 0, 0)
+    batch = [_reading("MTR-1", t0 + timedelta(seconds=i), kw=1.5 + i, volts=240.0) for i in range(5)]
+    with app.app_context():
+        pipeline._flush(batch)
+        device = db.session.scalars(select(Device).where(Device.name == "MTR-1")).one()
+        assert last_seen.get(device.id) == t0 + timedelta(seconds=4)  # data time, not arrival
+        # legacy meter payloads are stored once, as power and voltage metrics
+        keys = db.session.scalars(select(Metric.key).where(Metric.device_id == device.id)).all()
+        assert sorted(set(keys)) == ["power", "voltage"] and len(keys) == 10
+        assert db.session.scalar(select(func.count()).select_from(Reading)) == 0
+        assert db.session.scalar(select(func.count()).select_from(Meter)) == 1
+
+def test_flush_skips_duplicates(app):
+    pipeline = IngestPipeline(app, batch_size=10)
+    t0 = datetime(2025, 1, 15, 12, 0, 0)
+    with app.app_context():
+        pipeline._flush([_reading("MTR-2", t0, kw=1.0)])
+        # retransmission of t0 next to a fresh reading
+        pipeline._flush([_reading("MTR-2", t0, kw=1.0), _reading("MTR-2", t0 + timedelta(seconds=1), kw=2.0)])
+        values = db.session.scalars(select(Metric.value).order_by(Metric.ts)).all()
+        assert values == [1.0, 2.0]
+        # a reading without metrics stores nothing and does not count as seen
+        pipeline._flush([_reading("MTR-3", t0)])
+        device = db.session.scalars(select(Device).where(Device.name == "MTR-3")).one()
+        assert last_seen.get(device.id) is None
+
+def test_restart_and_late_rows_upsert(app):
+    t0 = datetime(2025, 1, 15, 12, 0, 0)
+    with app.app_context():
+        IngestPipeline(app)._flush([_reading("MTR-3", t0, kw=1.0)])
+        # a fresh pipeline has an empty window, so the retransmit reaches the database
+        pipeline = IngestPipeline(app, out_of_order_seconds=60)
+        pipeline._flush([_reading("MTR-3", t0, kw=1.0), _reading("MTR-3", t0 + timedelta(minutes=5), kw=3.0)])
+        # older than the window: written through ON CONFLICT DO NOTHING
+        pipeline._flush([_reading("MTR-3", t0, kw=9.0), _reading("MTR-3", t0 + timedelta(minutes=1), kw=2.0)])
+        assert pipeline.buffers[0].late == 2
+        values = db.session.scalars(select(Metric.value).order_by(Metric.ts)).all()
+        assert values == [1.0, 2.0, 3.0]
+
+class _PoisonDecoder(PayloadDecoder):
+    """Stands in for a reading the database rejects, e.g. a value out of the column's range"""
+
+    def decode(self, topic, raw):
+        if b"poison" in raw:
+            raise DataError("INSERT INTO metrics", {}, ValueError("value out of range"))
+        return super().decode(topic, raw)
+
+def test_poison_record_is_dead_lettered(app, tmp_path):
+    pipeline = IngestPipeline(app, decoder=_PoisonDecoder(), batch_size=10, flush_interval=0.05,
+                              spool_dir=str(tmp_path), max_attempts=2)
+    spool = pipeline.queues[0]
+    for i, body in enumerate(('{"kw": 1.0}', '{"kw": "poison"}', '{"kw": 3.0}')):
+        payload = f'{{"ts": "2025-01-15T12:00:0{i}Z", {body[1:]}'.encode()
+        pipeline.submit("utility/meter/MTR-5/reading", payload)
+    pipeline.start()
+    deadline = time.monotonic() + 10
+    while (spool.pending() or pipeline.written[0] < 2) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    # the records around the poison one are written, and it is set aside instead of retried forever
+    assert pipeline.written[0] == 2 and spool.dead_lettered == 1
+    assert spool.depth_bytes() == 0
+    with open(os.path.join(spool.directory, "deadletter.spool"), "rb") as f:
+        assert b"poison" in f.read()
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Metric)) == 2
+
+def test_poison_record_in_memory_loses_only_itself(app):
+    pipeline = IngestPipeline(app, decoder=_PoisonDecoder(), batch_size=10, flush_interval=0.05, max_attempts=2)
+    queue = pipeline.queues[0]
+    for i, body in enumerate(('{"kw": 1.0}', '{"kw": "poison"}', '{"kw": 3.0}')):
+        payload = f'{{"ts": "2025-01-15T12:00:0{i}Z", {body[1:]}'.encode()
+        pipeline.submit("utility/meter/MTR-5/reading", payload)
+    pipeline.start()
+    deadline = time.monotonic() + 10
+    while (queue.pending() or pipeline.written[0] < 2) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    assert pipeline.written[0] == 2 and queue.dead_lettered == 1
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Metric)) == 2
+
+def test_submit_drops_when_full(app):
+    pipeline = IngestPipeline(app, queue_limit=1)
+    assert pipeline.submit("utility/meter/MTR-1/reading", b"{}", timeout=0)
+    assert not pipeline.submit("utility/meter/MTR-1/reading", b"{}", timeout=0)
+    assert pipeline.dropped == 1
+
+def test_topics_keep_their_partition():
+    pipeline = IngestPipeline(None, partitions=4, process_partition=(1, 2))
+    topics = [f"utility/meter/MTR-{i}/reading" for i in range(200)]
+    owned = [t for t in topics if pipeline.owns(t)]
+    assert 0 < len(owned) < len(topics)
+    partitions = {pipeline.partition_for(t) for t in owned}
+    assert partitions == {0, 1, 2, 3}
+    # routing is a pure function of the topic, so it is stable across restarts
+    other = IngestPipeline(None, partitions=4, process_partition=(1, 2))
+    assert all(other.partition_for(t) == pipeline.partition_for(t) for t in owned)
+
+def test_decode_message_reads_topic_device():
+    decoder = PayloadDecoder()
+    readings = decoder.decode("utility/meter/MTR-9/reading", b'{"ts": "2025-01-15T12:00:00Z", "kw": 1.2}')
+    assert readings[0]["device"] == "MTR-9" and readings[0]["site"] == "Home"
+    assert readings[0]["ts"] == datetime(2025, 1, 15, 12, 0, 0)
+    assert decoder.decode("utility/meter/MTR-9/reading", b"not json") == []
+
+def test_parse_ts_normalizes_to_naive_utc():
+    assert parse_ts("2025-01-15T14:00:00+02:00") == datetime(2025, 1, 15, 12, 0, 0)
+    assert parse_ts("2025-01-15 12:00:00") == datetime(2025, 1, 15, 12, 0, 0)
+    assert parse_ts(1736942400) == datetime(2025, 1, 15, 12, 0, 0)
+
+def test_metric_values_respect_unit():
+    decoder = PayloadDecoder()
+    payload = {"power": 1.5, "voltage": 240.0, "humidity": None}
+    assert list(decoder.metric_values("W", payload)) == [("power", 1.5)]
+    assert list(decoder.metric_values("V", payload)) == [("voltage", 240.0)]
+    assert dict(decoder.metric_values("kWh", payload)) == {"power": 1.5, "voltage": 240.0}
+    # legacy meters report every quantity whatever the device unit
+    legacy = {"kw": 1.5, "kvar": 0.5, "volts": 240.0, "hertz": "n/a"}
+    assert dict(decoder.metric_values("W", legacy)) == {"power": 1.5, "reactive_power": 0.5, "voltage": 240.0}
+
+def test_decode_batch_envelopes():
+    decoder = PayloadDecoder()
+    readings = [
+        {"device_name": "MTR-1", "ts": "2025-01-15T12:00:00Z", "kw": 1.0},
+        {"device_name": "MTR-2", "ts": "2025-01-15T12:00:01Z", "kw": 2.0, "site": "Lab"},
+    ]
+    for fmt in ("json", "msgpack"):
+        decoded = decoder.decode("utility/meter/batch-0/reading", encode_batch(readings, fmt, site="Home"))
+        assert [(r["site"], r["device"]) for r in decoded] == [("Home", "MTR-1"), ("Lab", "MTR-2")]
+        assert decoded[1]["payload"]["kw"] == 2.0
+    # bare JSON array; readings without a device name fall back to the topic
+    decoded = decoder.decode("sensor/Home/Main Meter/reading", b'[{"ts": 1736942400, "power": 5}]')
+    assert decoded[0]["device"] == "Main Meter" and decoded[0]["ts"] == datetime(2025, 1, 15, 12, 0, 0)
+
+def test_batch_topics_spread_by_device_and_name_no_device():
+    decoder = PayloadDecoder()
+    # a reading without device_name on a batch topic is skipped instead of creating a "batch-1" device
+    raw = encode_batch([{"ts": 1736942400, "kw": 1.0}, {"device_name": "MTR-1", "ts": 1736942400, "kw": 2.0}])
+    assert [r["device"] for r in decoder.decode("utility/meter/batch-1/reading", raw)] == ["MTR-1"]
+    assert decoder.decode("utility/meter/batch/reading", b'{"ts": 1736942400, "kw": 1.0}') == []
+
+    # devices keep one shard each, and the shards of many devices reach every partition
+    assert batch_segment("MTR-1", 4) == batch_segment("MTR-1", 4)
+    pipeline = IngestPipeline(None, partitions=4)
+    topics = {f"sensor/Home/{batch_segment(f'MTR-{i}', 8)}/reading" for i in range(100)}
+    assert {pipeline.partition_for(t) for t in topics} == {0, 1, 2, 3}
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+import pytest
+import app.kpis as kpis_module
+from app.kpis import kpis
+from app.metric_writer import insert_metrics, upsert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+
+MIDNIGHT = datetime(2025, 1, 15, 5, 0)  # local midnight in Toronto (UTC-5)
+NOW = MIDNIGHT + timedelta(hours=3)
+
+def _write(device, points, writer=insert_metrics):
+    writer([{"ts": ts, "device_id": device.id, "key": "power", "value": value} for ts, value in points])
+    db.session.commit()
+
+def _snapshot(device):
+    day = kpis.for_devices([device.id], now=NOW)[device.id]
+    return day.day_start, day.energy_wh, day.peak, day.peak_ts
+
+def test_running_totals_match_recompute(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _write(device, [(MIDNIGHT - timedelta(minutes=10), 5000.0)])  # yesterday, local time
+        assert _snapshot(device) == (MIDNIGHT, 0.0, None, None)
+
+        # one hour at 1 kW every 10 s, a 10 minute gap (not integrated), then 2 kW
+        _write(device, [(MIDNIGHT + timedelta(seconds=10 * i), 1000.0) for i in range(361)])
+        _write(device, [(MIDNIGHT + timedelta(minutes=70), 2000.0), (MIDNIGHT + timedelta(minutes=100), 2500.0)])
+        _write(device, [(MIDNIGHT + timedelta(minutes=100, seconds=10 * i), 2000.0) for i in range(1, 181)])
+        running = _snapshot(device)
+        assert running[1] == pytest.approx(1000.0 + 2500.0 * 10 / 3600 + 2000.0 * 1790 / 3600)
+        assert running[2:] == (2500.0, MIDNIGHT + timedelta(minutes=100))
+
+        kpis.clear()
+        assert _snapshot(device) == pytest.approx(running)
+
+def test_late_point_recomputes(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _snapshot(device)
+        _write(device, [(MIDNIGHT + timedelta(minutes=i), 600.0) for i in range(0, 61, 2)])
+        _write(device, [(MIDNIGHT + timedelta(minutes=31), 6000.0)])  # out of order
+        assert _snapshot(device)[1:3] == pytest.approx((600.0 - 600.0 / 60 + 6000.0 / 60, 6000.0))
+        _write(device, [(MIDNIGHT + timedelta(minutes=31), 60.0)], lambda rows: upsert_metrics(rows, True))
+        assert _snapshot(device)[1:3] == pytest.approx((600.0 - 600.0 / 60 + 60.0 / 60, 600.0))
+
+def test_overwritten_last_point_recomputes(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _snapshot(device)
+        _write(device, [(MIDNIGHT, 600.0), (MIDNIGHT + timedelta(minutes=2), 9000.0)])
+        assert _snapshot(device)[2] == 9000.0
+        _write(device, [(MIDNIGHT + timedelta(minutes=2), 600.0)], lambda rows: upsert_metrics(rows, True))
+        assert _snapshot(device)[1:3] == pytest.approx((20.0, 600.0))
+
+def test_points_stored_during_recompute_are_kept(app, monkeypatch):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _write(device, [(MIDNIGHT + timedelta(minutes=i), 600.0) for i in range(3)])
+        late = [{"ts": MIDNIGHT + timedelta(minutes=3), "device_id": device.id, "key": "power", "value": 9000.0}]
+        read = kpis_module.read_metrics
+
+        def read_then_store(*args, **kwargs):
+            df = read(*args, **kwargs)
+            kpis.update(late + late)  # committed after the recompute read, before its totals are installed
+            return df
+        monkeypatch.setattr(kpis_module, "read_metrics", read_then_store)
+        assert _snapshot(device)[1:3] == pytest.approx((30.0, 9000.0))
+        assert device.id not in kpis._stale
+
+def test_legacy_kw_power_in_watts(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "MTR-1")
+        registry_cache.ensure_meter("Home_MTR-1")
+        db.session.commit()
+        _write(device, [(MIDNIGHT + timedelta(minutes=i), 1.5) for i in range(61)])  # kW, as legacy payloads store it
+        assert _snapshot(device)[1:3] == pytest.approx((1500.0, 1500.0))
+        kpis.clear()
+        assert _snapshot(device)[1:3] == pytest.approx((1500.0, 1500.0))
+
+def test_kpis_endpoint(app):
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        fridge = registry_cache.resolve_device("Home", "Fridge")
+        oven = registry_cache.resolve_device("Home", "Oven")
+        _write(fridge, [(now - timedelta(seconds=30 * i), 100.0 + i) for i in range(10, -1, -1)])
+        _write(oven, [(now - timedelta(seconds=30 * i), 2000.0) for i in range(10, -1, -1)])
+        fridge_day, oven_day = (kpis.for_devices([d.id])[d.id] for d in (fridge, oven))
+    client = app.test_client()
+    body = client.get("/api/kpis", query_string={"site_id": fridge.site_id}).get_json()
+
+    energy = (fridge_day.energy_wh + oven_day.energy_wh) / 1000
+    assert body["energy_kwh"] == pytest.approx(energy)
+    assert body["cost"] == pytest.approx(energy * app.config["ENERGY_PRICE_PER_KWH"], abs=1e-4)
+    assert body["current_power"] == 2100.0
+    assert body["peak"]["device_id"] == oven.id and body["peak"]["value"] == 2000.0
+    by_device = {d["device_id"]: d for d in body["devices"]}
+    assert by_device[fridge.id]["current_ts"] == now.isoformat()
+
+    only_fridge = client.get("/api/kpis", query_string={"site_id": fridge.site_id, "device_id": fridge.id}).get_json()
+    assert [d["device_id"] for d in only_fridge["devices"]] == [fridge.id]
+    assert client.get("/api/kpis").status_code == 400
+    assert client.get("/api/kpis", query_string={"site_id": 999}).status_code == 404
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from app.models import db, Device
+from app.last_seen import LastSeenTracker, last_seen
+from app.registry_cache import registry_cache
+
+def test_touch_keeps_newest_and_flushes_once(app):
+    tracker = LastSeenTracker()
+    t0 = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        for i in range(50):
+            tracker.touch(device.id, t0 + timedelta(seconds=i))
+        tracker.touch(device.id, t0)  # older timestamps never move it back
+        assert tracker.get(device.id) == t0 + timedelta(seconds=49)
+        assert db.session.get(Device, device.id).last_seen_at is None
+
+        assert tracker.flush() == 1
+        assert tracker.flush() == 0
+        db.session.expire_all()
+        assert db.session.get(Device, device.id).last_seen_at == t0 + timedelta(seconds=49)
+
+def test_devices_endpoint_reads_tracker(app):
+    ts = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+    last_seen.touch(device.id, ts)
+    body = app.test_client().get("/api/devices").get_json()
+    assert next(d for d in body if d["id"] == device.id)["last_seen_at"] == ts.isoformat()
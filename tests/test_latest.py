@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from app.alert_engine import AlertEngine
+from app.kpis import kpis, init_kpis
+from app.latest import latest, init_latest
+from app.metric_writer import insert_metrics, upsert_metrics
+from app.models import db, Alert, AlertEvent, Metric
+from app.registry_cache import registry_cache
+from app.response_cache import init_response_cache, watermarks
+
+def _store(device_id, points, key="power"):
+    insert_metrics([{"ts": ts, "device_id": device_id, "key": key, "value": value} for ts, value in points])
+    db.session.commit()
+
+def test_writes_keep_newest_point_per_series(app):
+    t0 = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _store(device.id, [(t0 + timedelta(seconds=i), float(i)) for i in range(10)])
+        _store(device.id, [(t0, 230.0)], key="voltage")
+        upsert_metrics([{"ts": t0 - timedelta(minutes=5), "device_id": device.id, "key": "power", "value": 99.0}])
+        db.session.commit()
+
+    assert latest.get(device.id, "power") == (t0 + timedelta(seconds=9), 9.0)  # late rows don't move it back
+    assert latest.newest_ts(device.id) == t0 + timedelta(seconds=9)
+
+    body = app.test_client().get("/api/latest", query_string={"site_id": device.site_id}).get_json()
+    assert [(r["device_id"], r["key"], r["value"]) for r in body] == [(device.id, "power", 9.0), (device.id, "voltage", 230.0)]
+    body = app.test_client().get("/api/latest", query_string={"key": "voltage"}).get_json()
+    assert [(r["key"], r["ts"]) for r in body] == [("voltage", t0.isoformat())]
+
+def test_rolled_back_writes_leave_memory_untouched(app):
+    t0 = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        db.session.commit()
+        before = watermarks.token("metrics", closed=False)
+        upsert_metrics([{"ts": t0, "device_id": device.id, "key": "power", "value": 5.0}])
+        assert latest.get(device.id, "power") is None  # not before the commit
+        db.session.rollback()
+        assert latest.get(device.id, "power") is None
+        assert watermarks.token("metrics", closed=False) == before
+        # the savepoint of insert_metrics does not apply them early either
+        insert_metrics([{"ts": t0, "device_id": device.id, "key": "power", "value": 6.0}])
+        assert latest.get(device.id, "power") is None
+        db.session.commit()
+        assert latest.get(device.id, "power") == (t0, 6.0)
+        assert watermarks.token("metrics", closed=False) != before
+
+def test_prime_loads_stored_points_after_restart(app):
+    t0 = datetime(2024, 1, 1, 12, 0, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _store(device.id, [(t0 + timedelta(seconds=i), float(i)) for i in range(5)])
+        latest.clear()
+        latest.update([{"ts": t0 - timedelta(hours=1), "device_id": device.id, "key": "power", "value": -1.0}])
+        latest.prime()
+    assert latest.get(device.id, "power") == (t0 + timedelta(seconds=4), 4.0)
+
+def test_nodata_alert_uses_latest_values(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        fresh = registry_cache.resolve_device("Home", "Fridge")
+        stale = registry_cache.resolve_device("Home", "Heater")
+        _store(fresh.id, [(now - timedelta(seconds=30), 1.0)])
+        _store(stale.id, [(now - timedelta(hours=1), 1.0)])
+        engine = AlertEngine(app)
+
+        for device, expected in ((fresh, 0), (stale, 1)):
+            alert = Alert(site_id=device.site_id, name="quiet", rule_json={
+                "type": "nodata", "device_ids": [device.id], "duration_sec": 300
+            })
+            db.session.add(alert)
+            db.session.commit()
+            engine._evaluate_nodata_alert(alert)
+            assert db.session.query(AlertEvent).filter_by(alert_id=alert.id).count() == expected
+
+def test_multi_process_ingest_reads_through(app):
+    app.config["MULTI_PROCESS_INGEST"] = True
+    init_latest(app)
+    init_kpis(app)
+    assert init_response_cache(app).max_bytes == 0
+    t0, now = datetime(2025, 1, 15, 18, 0), datetime(2025, 1, 15, 19, 0)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        _store(device.id, [(t0, 100.0)])
+        assert kpis.for_devices([device.id], now=now)[device.id].peak == 100.0
+        # a row written by another ingest process never passes through this one's write path
+        db.session.add(Metric(ts=t0 + timedelta(seconds=10), device_id=device.id, key="power", value=300.0))
+        db.session.commit()
+        latest.prime()
+        assert latest.get(device.id, "power") == (t0 + timedelta(seconds=10), 300.0)
+        assert kpis.for_devices([device.id], now=now)[device.id].peak == 300.0
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from app.legacy import legacy_readings_frame, split_meter_id
+from app.migrations import migrate_legacy_readings
+from app.models import db, Device, Metric, Reading, Meter
+
+def test_split_meter_id():
+    assert split_meter_id("Home_MTR-1", ["Home", "Lab"]) == ("Home", "MTR-1")
+    assert split_meter_id("Big_Site_Meter_2", ["Big_Site", "Big"]) == ("Big_Site", "Meter_2")
+
+def test_migration_moves_readings_into_metrics(app):
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        db.session.add_all([
+            Reading(meter_id="Home_MTR-1", ts=now - timedelta(minutes=i), kw=1.0 + i, volts=240.0, hertz=60.0)
+            for i in range(3)
+        ])
+        db.session.commit()
+
+        migrate_legacy_readings(batch_size=2)
+        migrate_legacy_readings()  # idempotent
+
+        assert db.session.scalar(select(func.count()).select_from(Reading)) == 0
+        device = db.session.scalars(select(Device).where(Device.name == "MTR-1")).one()
+        assert db.session.scalar(select(func.count()).select_from(Metric).where(Metric.device_id == device.id)) == 9
+        assert db.session.scalars(select(Meter.meter_id)).all() == ["Home_MTR-1"]
+
+        df = legacy_readings_frame(now - timedelta(hours=1), now + timedelta(seconds=1))
+        assert sorted(df["kw"]) == [1.0, 2.0, 3.0]
+        assert set(df["meter_id"]) == {"Home_MTR-1"}
+        assert df["kvar"].isna().all()
+
+    r = app.test_client().get("/api/timeseries?hours=1")
+    assert r.status_code == 200
+    assert r.get_json()["peak"]["kw"] == 3.0
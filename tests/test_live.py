@@ -0,0 +1,70 @@
+import json
+from datetime import datetime, timedelta
+from app.ingest import IngestPipeline
+from app.live import LiveBroker, broker
+from app.registry_cache import registry_cache
+
+def _frames(subscription, count):
+    """The first count messages of a subscription as (event, data) pairs"""
+    stream = broker.listen(subscription)
+    assert next(stream) == "retry: 3000\n\n"
+    frames = []
+    for frame in stream:
+        event, data = frame.strip().split("\n")
+        frames.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        if len(frames) == count:
+            return frames
+
+def test_ingest_fans_out_to_site_subscribers(app):
+    with app.app_context():
+        home = registry_cache.resolve_site("Home")
+        lab = registry_cache.resolve_site("Lab")
+    home_client, lab_client, all_client = broker.subscribe(home), broker.subscribe(lab), broker.subscribe()
+    assert broker.stats()["clients"] == 3
+
+    t0 = datetime(2025, 1, 15, 12, 0)
+    with app.app_context():
+        IngestPipeline(app)._flush([{"site": "Home", "device": "MTR-1", "ts": t0 + timedelta(seconds=i),
+                                     "payload": {"type": "power", "unit": "W", "power": 100.0 + i}} for i in range(3)])
+
+    (event, points), = _frames(home_client, 1)
+    assert event == "metrics" and [p["value"] for p in points] == [100.0, 101.0, 102.0]
+    assert points[0]["t"] == "2025-01-15T12:00:00" and points[0]["key"] == "power"
+    assert _frames(all_client, 1)[0][0] == "metrics"
+    assert lab_client.queue.empty()
+
+    stats = broker.stats()
+    assert stats["published"] == 1 and stats["delivered"] == 2 and stats["fanout_ms"]["max"] >= 0
+
+    # a redelivered reading (here after a restart) is already stored, so it is not charted twice
+    with app.app_context():
+        assert IngestPipeline(app)._flush([{"site": "Home", "device": "MTR-1", "ts": t0,
+                                            "payload": {"type": "power", "unit": "W", "power": 100.0}}]) == 0
+    assert home_client.queue.empty() and broker.stats()["published"] == 1
+
+def test_slow_client_dropped():
+    live = LiveBroker(buffer_size=2, max_clients=2)
+    slow, fast = live.subscribe(1), live.subscribe(1)
+    assert live.subscribe(1) is None  # at max_clients
+
+    for i in range(3):
+        live.publish(1, "metrics", [{"value": i}])
+        fast.queue.get_nowait()
+    assert slow.dropped and not fast.dropped
+    assert live.stats()["clients"] == 1 and live.stats()["dropped_clients"] == 1
+
+    frames = list(live.listen(slow))
+    assert frames[-1].startswith("event: dropped")
+
+def test_stream_endpoint(app):
+    client = app.test_client()
+    response = client.get("/api/stream?site_id=1")
+    assert response.mimetype == "text/event-stream" and response.headers["Cache-Control"] == "no-cache"
+    assert client.get("/api/stream/stats").get_json()["clients"] == 1
+
+    broker.publish(1, "alert", {"alert_id": 7})
+    chunks = iter(response.response)
+    assert next(chunks) == b"retry: 3000\n\n"
+    assert next(chunks) == b'event: alert\ndata: {"alert_id":7}\n\n'
+    response.close()
+    assert client.get("/api/stream/stats").get_json()["clients"] == 0
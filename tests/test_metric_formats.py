@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import pyarrow as pa
+from app.metric_writer import insert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+
+T0 = datetime(2025, 1, 15, 12, 0)
+
+def _load(app):
+    with app.app_context():
+        devices = [registry_cache.resolve_device("Home", name) for name in ("Fridge", "Oven")]
+        insert_metrics([{"ts": T0 + timedelta(seconds=30 * i), "device_id": device.id, "key": "power",
+                         "value": float(i + n)} for i in range(240) for n, device in enumerate(devices)])
+        db.session.commit()
+    return devices
+
+def test_columnar_and_arrow_match_points(app):
+    fridge, oven = _load(app)
+    client = app.test_client()
+    params = {"site_id": fridge.site_id, "key": "power", "from": T0.isoformat(),
+              "to": (T0 + timedelta(hours=2)).isoformat()}
+    points = client.get("/api/metrics", query_string=params).get_json()["series"]
+
+    body = client.get("/api/metrics", query_string={**params, "format": "columnar"}).get_json()
+    by_device = {s["device_id"]: s for s in body["series"]}
+    assert set(by_device) == {fridge.id, oven.id} and by_device[oven.id]["device_name"] == "Oven"
+    assert by_device[fridge.id]["t"][:2] == [1736942400000, 1736942430000]
+    assert sorted(v for s in body["series"] for v in s["value"]) == sorted(p["value"] for p in points)
+
+    response = client.get("/api/metrics", query_string={**params, "format": "arrow"})
+    assert response.mimetype == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.get_data()).read_all()
+    assert table.num_rows == len(points) and table.column_names == ["device_id", "t", "value"]
+    assert table.column("t").type == pa.timestamp("ms")
+    assert b"Oven" in table.schema.metadata[b"devices"]
+
+    # bucketed resolutions carry the bucket aggregates in every format
+    body = client.get("/api/metrics", query_string={**params, "res": "1h", "format": "columnar"}).get_json()
+    fridge_series = next(s for s in body["series"] if s["device_id"] == fridge.id)
+    assert fridge_series["count"] == [120, 120] and fridge_series["last"] == [119.0, 239.0]
+    table = pa.ipc.open_stream(client.get("/api/metrics", query_string={**params, "res": "1h", "format": "arrow"})
+                               .get_data()).read_all()
+    assert table.column_names == ["device_id", "t", "value", "count", "min", "max", "last"]
+
+    assert client.get("/api/metrics", query_string={**params, "format": "xml"}).status_code == 400
+    empty = client.get("/api/metrics", query_string={**params, "key": "voltage", "format": "arrow"}).get_data()
+    assert pa.ipc.open_stream(empty).read_all().num_rows == 0
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.metric_writer import insert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+
+T0 = datetime(2025, 1, 15, 12, 0)
+
+def _load(app):
+    with app.app_context():
+        fridge = registry_cache.resolve_device("Home", "Fridge")
+        oven = registry_cache.resolve_device("Home", "Oven")
+        insert_metrics([{"ts": T0 + timedelta(seconds=30 * i), "device_id": device.id, "key": key,
+                         "value": float(i + n)}
+                        for i in range(240) for n, device in enumerate((fridge, oven))
+                        for key in ("power", "voltage", "temp")])
+        db.session.commit()
+    return fridge, oven
+
+def _get(client, params):
+    return client.get("/api/metrics", query_string={**params, "format": "columnar"}).get_json()["series"]
+
+def test_batch_matches_single_queries(app):
+    fridge, oven = _load(app)
+    client = app.test_client()
+    window = {"from": T0.isoformat(), "to": (T0 + timedelta(hours=2)).isoformat()}
+    body = client.post("/api/metrics/batch", json={**window, "site_id": fridge.site_id, "selections": [
+        {"key": "power", "device_ids": [fridge.id, oven.id]},
+        {"key": "voltage", "device_ids": [oven.id]},
+        {"key": "temp", "res": "15m"},
+        {"key": "power", "res": "1h", "device_ids": [fridge.id]},
+    ]}).get_json()
+
+    assert [(r["key"], r["res"]) for r in body["results"]] == [
+        ("power", "raw"), ("voltage", "raw"), ("temp", "15m"), ("power", "1h")]
+    assert body["results"][0]["series"] == _get(client, {**window, "key": "power", "site_id": fridge.site_id})
+    assert body["results"][1]["series"] == _get(client, {**window, "key": "voltage", "device_id": oven.id})
+    assert body["results"][2]["series"] == _get(client, {**window, "key": "temp", "res": "15m",
+                                                         "site_id": fridge.site_id})
+    hourly = body["results"][3]["series"]
+    assert [s["device_id"] for s in hourly] == [fridge.id] and hourly[0]["count"] == [120, 120]
+    assert body["devices"][str(oven.id)]["name"] == "Oven"
+
+def test_batch_reads_once_per_resolution(app):
+    fridge, _ = _load(app)
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if " metrics" in statement:
+            statements.append(statement)
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        app.test_client().post("/api/metrics/batch", json={
+            "from": T0.isoformat(), "to": (T0 + timedelta(hours=2)).isoformat(),
+            "selections": [{"key": key, "device_ids": [fridge.id]} for key in ("power", "voltage", "temp")]})
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+    assert len(statements) == 1
+
+def test_batch_validation(app):
+    client = app.test_client()
+    for body in ({}, {"selections": []}, {"selections": [{"device_ids": [1]}]},
+                 {"selections": [{"key": "power", "res": "fortnight"}]},
+                 {"selections": [{"key": "power"}], "max_points": 1},
+                 {"selections": [{"key": "power", "res": 15}]}, {"selections": [{"key": "power"}], "site_id": "1"},
+                 {"selections": [{"key": "power", "device_ids": ["1"]}]}):
+        assert client.post("/api/metrics/batch", json=body).status_code == 400
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, tuple_
+from app.models import db, Alert, AlertEvent, Event, Site
+from app.pagination import decode_cursor, encode_cursor
+
+T0 = datetime(2025, 1, 15, 12, 0)
+
+def _load(app, count=25):
+    with app.app_context():
+        site = Site(name="Home", tz="UTC")
+        db.session.add(site)
+        db.session.flush()
+        alert = Alert(site_id=site.id, name="high", rule_json={"type": "threshold"})
+        db.session.add(alert)
+        db.session.flush()
+        # pairs of rows share a timestamp so the id breaks ties
+        db.session.add_all(Event(site_id=site.id, start_ts=T0 + timedelta(minutes=i // 2),
+                                 end_ts=T0 + timedelta(minutes=i // 2, seconds=30), type="spike", severity=2,
+                                 device_ids=[1], meta={"peak_value": i}) for i in range(count))
+        db.session.add_all(AlertEvent(alert_id=alert.id, ts=T0 + timedelta(minutes=i // 2), payload={"n": i})
+                           for i in range(count))
+        db.session.commit()
+        return site.id, alert.id
+
+def _pages(client, path, params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, query_string={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(T0, 42)) == (T0, 42)
+
+def test_events_keyset_pages(app):
+    site_id, _ = _load(app)
+    client = app.test_client()
+    pages = _pages(client, "/api/events", {"site_id": site_id, "limit": 10})
+    assert [len(p) for p in pages] == [10, 10, 5]
+    rows = [e for p in pages for e in p]
+    assert [e["meta"]["peak_value"] for e in rows] == list(range(24, -1, -1))
+
+    # a row inserted before the cursor position does not shift the following pages
+    first = client.get("/api/events", query_string={"site_id": site_id, "limit": 10})
+    with app.app_context():
+        db.session.add(Event(site_id=site_id, start_ts=T0 + timedelta(hours=1), end_ts=T0 + timedelta(hours=2),
+                             type="sag", severity=1, device_ids=[1]))
+        db.session.commit()
+    second = client.get("/api/events", query_string={"site_id": site_id, "limit": 10,
+                                                     "cursor": first.headers["X-Next-Cursor"]})
+    assert [e["meta"]["peak_value"] for e in second.get_json()] == list(range(14, 4, -1))
+
+def test_alert_events_newest_first(app):
+    _, alert_id = _load(app)
+    pages = _pages(app.test_client(), "/api/alert-events", {"alert_id": alert_id, "limit": 7})
+    assert [len(p) for p in pages] == [7, 7, 7, 4]
+    assert [e["payload"]["n"] for p in pages for e in p] == list(range(24, -1, -1))
+
+def test_events_first_page_holds_newest(app):
+    site_id, _ = _load(app)
+    app.config["API_PAGE_LIMIT"] = 10
+    # the dashboard fetches one page without a limit; past the cap it still shows the newest events
+    first = app.test_client().get("/api/events", query_string={"site_id": site_id})
+    assert first.headers["X-Next-Cursor"]
+    assert [e["meta"]["peak_value"] for e in first.get_json()] == list(range(24, 14, -1))
+
+def test_limit_and_cursor_validation(app):
+    site_id, _ = _load(app, count=3)
+    client = app.test_client()
+    assert len(client.get("/api/events", query_string={"site_id": site_id}).get_json()) == 3
+    for params in ({"limit": 0}, {"limit": app.config["API_PAGE_LIMIT"] + 1}, {"cursor": "not-a-cursor"}):
+        assert client.get("/api/events", query_string={"site_id": site_id, **params}).status_code == 400
+        assert client.get("/api/alert-events", query_string=params).status_code == 400
+
+def test_page_query_uses_composite_index(app):
+    site_id, alert_id = _load(app)
+    after = tuple_(T0 + timedelta(minutes=3), 7)
+    with app.app_context():
+        for query, index in (
+            (select(Event).where(Event.site_id == site_id, tuple_(Event.start_ts, Event.id) < after)
+             .order_by(Event.start_ts.desc(), Event.id.desc()), "ix_events_site_start_id"),
+            (select(AlertEvent).where(AlertEvent.alert_id == alert_id, tuple_(AlertEvent.ts, AlertEvent.id) < after)
+             .order_by(AlertEvent.ts.desc(), AlertEvent.id.desc()), "ix_alert_events_alert_ts_id"),
+            (select(AlertEvent).where(tuple_(AlertEvent.ts, AlertEvent.id) < after)
+             .order_by(AlertEvent.ts.desc(), AlertEvent.id.desc()), "ix_alert_events_ts_id"),
+        ):
+            compiled = query.limit(11).compile(db.engine, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            assert len(plan) == 1 and "SEARCH" in plan[0] and index in plan[0], plan
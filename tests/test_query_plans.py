@@ -0,0 +1,69 @@
+"""The hot metric reads must be index range scans, never full scans of metrics."""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.alert_engine import AlertEngine
+from app.event_detector import EventDetector
+from app.metric_writer import insert_metrics
+from app.models import db, Alert
+from app.registry_cache import registry_cache
+
+@contextmanager
+def captured_metric_selects():
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and " metrics" in statement:
+            statements.append((statement, parameters))
+    engines = list(db.engines.values())  # reads may go to the read-only bind
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+
+def query_plan(statement, parameters):
+    rows = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+@pytest.fixture
+def device(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        now = datetime.utcnow()
+        insert_metrics([{"ts": now - timedelta(seconds=i), "device_id": device.id, "key": "power", "value": 1.0}
+                        for i in range(20)])
+        db.session.commit()
+    return device
+
+def _run_api(app, device):
+    client = app.test_client()
+    client.get("/api/metrics", query_string={"device_id": device.id, "key": "power"})
+    client.get("/api/metrics", query_string={"device_id": device.id, "key": "power", "res": "10s"})
+    client.get("/api/export", query_string={"device_id": device.id, "key": "power"})
+
+def _run_event_detector(app, device):
+    EventDetector(app).detect_events(device.site_id)
+
+def _run_threshold_alert(app, device):
+    alert = Alert(site_id=device.site_id, name="high", rule_json={
+        "type": "threshold", "device_ids": [device.id], "key": "power", "op": ">", "value": 10
+    })
+    AlertEngine(app)._evaluate_threshold_alert(alert)
+
+@pytest.mark.parametrize("run", [_run_api, _run_event_detector, _run_threshold_alert])
+def test_hot_queries_use_composite_index(app, device, run):
+    with app.app_context():
+        with captured_metric_selects() as statements:
+            run(app, device)
+        assert statements
+        for statement, parameters in statements:
+            plan = query_plan(statement, parameters)
+            metrics_steps = [step for step in plan if step.split()[1:2] == ["metrics"]]
+            assert metrics_steps, plan
+            for step in metrics_steps:
+                assert step.startswith("SEARCH metrics USING"), plan
+                # range reads use the composite index; exact (device, ts, key) lookups may use the unique key
+                assert "ix_metrics_device_key_ts" in step or "ts=?" in step, plan
@@ -0,0 +1,29 @@
+from sqlalchemy import select, func
+from app.models import db, Device
+from app.registry_cache import RegistryCache, registry_cache
+
+def test_resolve_creates_once_and_caches(app):
+    cache = RegistryCache(max_size=8)
+    with app.app_context():
+        first = cache.resolve_device("Home", "Fridge", device_type="power", unit="W")
+        second = cache.resolve_device("Home", "Fridge")
+        assert first == second
+        assert cache.misses == 2 and cache.hits >= 1
+        assert db.session.scalar(select(func.count()).select_from(Device).where(Device.name == "Fridge")) == 1
+
+def test_lru_eviction(app):
+    cache = RegistryCache(max_size=2)
+    with app.app_context():
+        site_id = cache.resolve_site("Home")
+        cache.resolve_site_device(site_id, "A")
+        cache.resolve_site_device(site_id, "B")
+        assert cache.stats()["size"] == 2
+        assert ("site", "Home") not in cache._entries
+
+def test_api_writes_invalidate(app):
+    with app.app_context():
+        registry_cache.resolve_site("Home")
+    assert registry_cache.stats()["size"] > 0
+    r = app.test_client().post("/api/sites", json={"name": "Office"})
+    assert r.status_code == 201
+    assert registry_cache.stats()["size"] == 0
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+from app.reorder import ReorderBuffer
+
+T0 = datetime(2025, 1, 15, 12, 0, 0)
+
+def _row(seconds, key="power", device_id=1):
+    return {"device_id": device_id, "ts": T0 + timedelta(seconds=seconds), "key": key, "value": 1.0}
+
+def test_sorts_and_drops_duplicates():
+    buffer = ReorderBuffer(window_seconds=120)
+    fresh, late = buffer.admit([_row(10), _row(0), _row(10, "voltage")])
+    assert [r["ts"] for r in fresh] == [T0, T0 + timedelta(seconds=10), T0 + timedelta(seconds=10)]
+    fresh, late = buffer.admit([_row(0), _row(5)])
+    assert [r["ts"] for r in fresh] == [T0 + timedelta(seconds=5)]
+    assert buffer.duplicates == 1 and not late
+
+def test_rows_beyond_window_are_late():
+    buffer = ReorderBuffer(window_seconds=60)
+    buffer.admit([_row(0), _row(300)])
+    fresh, late = buffer.admit([_row(0), _row(250), _row(0, device_id=2)])
+    assert [r["ts"] for r in late] == [T0]
+    assert len(fresh) == 2
+    # expired entries are forgotten
+    assert (T0, "power") not in buffer._devices[1].seen
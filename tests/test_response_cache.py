@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from app.metric_writer import insert_metrics, upsert_metrics
+from app.models import db
+from app.registry_cache import registry_cache
+from app.response_cache import response_cache
+
+def _load(app, start, minutes=60):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics([{"ts": start + timedelta(minutes=i), "device_id": device.id, "key": "power",
+                         "value": float(i)} for i in range(minutes)])
+        db.session.commit()
+    return device
+
+def _write(app, device, ts, value):
+    with app.app_context():
+        upsert_metrics([{"ts": ts, "device_id": device.id, "key": "power", "value": value}], update_existing=True)
+        db.session.commit()
+
+def test_closed_window_served_from_cache_until_backfill(app):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=1)
+    device = _load(app, start)
+    client = app.test_client()
+    params = {"device_id": device.id, "key": "power", "from": start.isoformat(),
+              "to": (start + timedelta(hours=1)).isoformat()}
+
+    first = client.get("/api/metrics", query_string=params)
+    assert first.status_code == 200 and first.headers["ETag"] and first.headers["Last-Modified"]
+    assert client.get("/api/metrics", query_string=params).get_data() == first.get_data()
+    assert response_cache.stats()["hits"] == 1
+
+    revalidated = client.get("/api/metrics", query_string=params, headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304 and not revalidated.get_data()
+
+    # live ingest does not touch a closed window
+    _write(app, device, datetime.utcnow(), 1.0)
+    assert client.get("/api/metrics", query_string=params,
+                      headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # late data inside the window does
+    _write(app, device, start + timedelta(minutes=5), 99.0)
+    changed = client.get("/api/metrics", query_string=params, headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.headers["ETag"] != first.headers["ETag"]
+    assert 99.0 in [p["value"] for p in changed.get_json()["series"]]
+
+def test_open_window_invalidated_by_ingest(app):
+    now = datetime.utcnow().replace(microsecond=0)
+    device = _load(app, now - timedelta(minutes=30), minutes=20)
+    client = app.test_client()
+    params = {"device_id": device.id, "key": "power", "from": (now - timedelta(hours=1)).isoformat()}
+
+    first = client.get("/api/metrics", query_string=params)
+    assert client.get("/api/metrics", query_string=params).get_data() == first.get_data()
+    assert response_cache.stats()["hits"] == 1
+
+    _write(app, device, now - timedelta(minutes=1), 42.0)
+    second = client.get("/api/metrics", query_string=params)
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert len(second.get_json()["series"]) == len(first.get_json()["series"]) + 1
+
+def test_open_window_body_matches_its_floored_key(app):
+    response_cache.ttl = 3600
+    now = datetime.utcnow()
+    floored = datetime(now.year, now.month, now.day, now.hour)
+    device = _load(app, floored - timedelta(minutes=1), minutes=1)
+    _write(app, device, now, 7.0)  # after the floored to, so in no entry of this hour
+    client = app.test_client()
+    series = client.get("/api/metrics", query_string={"device_id": device.id, "key": "power"}).get_json()["series"]
+    assert [p["t"] for p in series] == [(floored - timedelta(minutes=1)).isoformat()]
+
+def test_events_and_devices_are_conditional(app):
+    device = _load(app, datetime(2025, 1, 15), minutes=1)
+    client = app.test_client()
+    for path, params in (("/api/events", {"site_id": device.site_id}), ("/api/devices", {})):
+        first = client.get(path, query_string=params)
+        assert client.get(path, query_string=params,
+                          headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    client.post("/api/devices", json={"site_id": device.site_id, "name": "Oven", "type": "power", "unit": "W"})
+    assert client.get("/api/devices", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+
+def test_lru_bounded_by_bytes(app):
+    start = datetime(2025, 1, 15)
+    device = _load(app, start)
+    response_cache.max_bytes = 4096
+    client = app.test_client()
+    for hour in range(10):
+        client.get("/api/metrics", query_string={
+            "device_id": device.id, "from": (start + timedelta(minutes=hour)).isoformat(),
+            "to": (start + timedelta(hours=1)).isoformat()})
+    stats = response_cache.stats()
+    assert 0 < stats["bytes"] <= 4096 and stats["entries"] < 10
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import select, func
+from app.models import db, Metric, MetricRollup
+from app.metric_writer import insert_metrics
+from app.registry_cache import registry_cache
+from app.timeseries import read_metrics
+from app.retention import load_policies, load_archive_retention, enforce_retention
+import app.archive as archive_module
+from app.archive import ParquetArchive
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+def test_load_policies():
+    policies = load_policies({"default": {"raw": "90d", "1m": "365d"}, "keys": {"power": {"raw": "30d", "1h": "forever"}}})
+    assert policies[None] == {"raw": timedelta(days=90), "1m": timedelta(days=365)}
+    assert policies["power"] == {"raw": timedelta(days=30), "1m": timedelta(days=365), "1h": None}
+    with pytest.raises(ValueError):
+        load_policies({"default": {"5m": "30d"}})
+
+def test_enforce_retention_per_key_and_tier(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        rows = []
+        for age in (10, 45, 120, 400):
+            ts = NOW - timedelta(days=age)
+            rows += [{"ts": ts, "device_id": device.id, "key": key, "value": 1.0} for key in ("power", "temp")]
+        insert_metrics(rows)
+        db.session.commit()
+
+        policies = load_policies({"default": {"raw": "90d", "1m": "365d"}, "keys": {"power": {"raw": "30d"}}})
+        enforce_retention(policies, now=NOW, batch_size=1)
+
+        def raw_ages(key):
+            return sorted((NOW - ts).days for ts in db.session.scalars(select(Metric.ts).where(Metric.key == key)))
+        assert raw_ages("power") == [10]
+        assert raw_ages("temp") == [10, 45]
+        assert db.session.scalar(select(func.count()).select_from(MetricRollup).where(MetricRollup.tier == "1m")) == 6
+        # tiers without a policy are kept forever
+        assert db.session.scalar(select(func.count()).select_from(MetricRollup).where(MetricRollup.tier == "1h")) == 8
+
+def test_enforce_retention_drops_expired_archive_days(app, tmp_path, monkeypatch):
+    archive = ParquetArchive(str(tmp_path))
+    monkeypatch.setattr(archive_module, "archive", archive)
+    for age in (20, 60, 120):
+        day = (NOW - timedelta(days=age)).date()
+        archive.write_day(1, day, pd.DataFrame({"ts": [datetime.combine(day, datetime.min.time())], "device_id": 1,
+                                                "key": "power", "value": [1.0]}))
+    policies = load_policies({"default": {"raw": "90d"}, "keys": {"power": {"raw": "30d"}}})
+    with app.app_context():
+        # days mix keys, so by default they go once past the longest raw retention
+        assert enforce_retention(policies, now=NOW)["archive"] == 1
+        assert len(archive.read(NOW - timedelta(days=200), NOW)) == 2
+        assert enforce_retention(policies, now=NOW, archive_keep=load_archive_retention({"archive": "30d"}))["archive"] == 1
+        assert enforce_retention(policies, now=NOW, archive_keep=load_archive_retention({"archive": "forever"})) == {"archived": 0}
+
+def test_raw_retention_archives_instead_of_deleting(app, tmp_path, monkeypatch):
+    archive = ParquetArchive(str(tmp_path))
+    monkeypatch.setattr(archive_module, "archive", archive)
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics([{"ts": NOW - timedelta(days=age), "device_id": device.id, "key": key, "value": float(age)}
+                        for age in (10, 45) for key in ("power", "temp")])
+        db.session.commit()
+
+        policies = load_policies({"default": {"raw": "90d"}, "keys": {"power": {"raw": "30d"}}})
+        deleted = enforce_retention(policies, now=NOW, archive_keep=load_archive_retention({"archive": "730d"}))
+        # the 45 day old day leaves the live database for the archive rather than being deleted
+        assert deleted["archived"] == 2
+        assert sorted((NOW - ts).days for ts in db.session.scalars(select(Metric.ts))) == [10, 10]
+        df = read_metrics(NOW - timedelta(days=60), NOW, key="power")
+        assert df["value"].tolist() == [45.0, 10.0]
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import select, delete
+from app.models import db, Metric, MetricRollup
+from app.metric_writer import insert_metrics, upsert_metrics
+from app.migrations import backfill_rollups
+from app.registry_cache import registry_cache
+from app.retention import load_policies, enforce_retention
+from app.rollups import floor_local, parse_span, select_tier
+
+T0 = datetime(2025, 1, 15, 4, 50, 0)  # 23:50 the day before in America/Toronto
+
+def _rows(device_id, count, start=T0, step=timedelta(minutes=1), value=lambda i: float(i)):
+    return [{"ts": start + i * step, "device_id": device_id, "key": "power", "value": value(i)} for i in range(count)]
+
+def _rollup(tier, bucket_start):
+    return db.session.scalars(select(MetricRollup).where(
+        MetricRollup.tier == tier, MetricRollup.bucket_start == bucket_start)).one()
+
+def test_buckets_follow_site_timezone():
+    toronto = ZoneInfo("America/Toronto")
+    assert floor_local(T0, timedelta(days=1), toronto) == datetime(2025, 1, 14, 5, 0)
+    assert floor_local(T0 + timedelta(minutes=10), timedelta(days=1), toronto) == datetime(2025, 1, 15, 5, 0)
+    # a 23-hour local day at the spring DST change
+    assert floor_local(datetime(2025, 3, 10, 3, 0), timedelta(days=1), toronto) == datetime(2025, 3, 9, 5, 0)
+    assert floor_local(datetime(2025, 1, 15, 4, 50), timedelta(hours=1), ZoneInfo("Asia/Kolkata")) == datetime(2025, 1, 15, 4, 30)
+    assert select_tier(parse_span("30m")) == "15m" and select_tier(parse_span("2d")) == "1d"
+    assert select_tier(parse_span("30s")) is None and parse_span("36h") is None
+
+def test_incremental_rollups(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics(_rows(device.id, 20))
+        insert_metrics(_rows(device.id, 20, start=T0 + timedelta(minutes=20), value=lambda i: 20.0 + i))
+        db.session.commit()
+
+        hour = _rollup("1h", datetime(2025, 1, 15, 4, 0))
+        assert (hour.count, hour.sum, hour.min, hour.max, hour.last) == (10, 45.0, 0.0, 9.0, 9.0)
+        day = _rollup("1d", datetime(2025, 1, 15, 5, 0))
+        assert (day.count, day.min, day.max, day.last) == (30, 10.0, 39.0, 39.0)
+
+        # retransmissions are not counted twice; overwritten values rebuild their buckets
+        assert upsert_metrics(_rows(device.id, 10)) == []
+        upsert_metrics([{"ts": T0, "device_id": device.id, "key": "power", "value": 100.0}], update_existing=True)
+        db.session.commit()
+        hour = _rollup("1h", datetime(2025, 1, 15, 4, 0))
+        assert (hour.count, hour.sum, hour.max) == (10, 145.0, 100.0)
+        assert _rollup("1d", datetime(2025, 1, 14, 5, 0)).max == 100.0
+
+def test_metrics_api_reads_rollups(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics(_rows(device.id, 120, start=datetime(2025, 1, 15, 12, 0)))
+        db.session.commit()
+        # the API must not need raw rows for aggregated resolutions
+        db.session.execute(delete(Metric))
+        db.session.commit()
+
+    client = app.test_client()
+    params = {"device_id": device.id, "key": "power", "from": "2025-01-15T12:00:00Z", "to": "2025-01-15T13:59:00Z"}
+    series = client.get("/api/metrics", query_string={**params, "res": "15m"}).get_json()["series"]
+    assert len(series) == 8 and series[0]["value"] == 7.0
+    series = client.get("/api/metrics", query_string={**params, "res": "1h"}).get_json()["series"]
+    assert [p["value"] for p in series] == [29.5, 89.5]
+    series = client.get("/api/metrics", query_string={**params, "res": "30m"}).get_json()["series"]
+    assert [p["t"] for p in series][:2] == ["2025-01-15T12:00:00", "2025-01-15T12:30:00"]
+    assert client.get("/api/metrics", query_string={**params, "res": "fast"}).status_code == 400
+
+def test_backfill_from_existing_metrics(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        db.session.add_all([Metric(**row) for row in _rows(device.id, 90, start=datetime(2025, 1, 15, 12, 0))])
+        db.session.commit()
+        backfill_rollups()
+        assert _rollup("1h", datetime(2025, 1, 15, 12, 0)).count == 60
+        assert _rollup("1d", datetime(2025, 1, 15, 5, 0)).count == 90
+
+def test_overwrite_after_retention_keeps_coarse_buckets(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics(_rows(device.id, 10, start=datetime(2025, 1, 15, 12, 0)))
+        db.session.commit()
+        # 1m and 15m buckets expire while the raw points and the 1h/1d buckets remain
+        enforce_retention(load_policies({"default": {"raw": "30d", "1m": "7d", "15m": "7d"}}),
+                          now=datetime(2025, 1, 25))
+        assert set(db.session.scalars(select(MetricRollup.tier).distinct())) == {"1h", "1d"}
+
+        upsert_metrics([{"ts": datetime(2025, 1, 15, 12, 9), "device_id": device.id, "key": "power", "value": 100.0}],
+                       update_existing=True)
+        db.session.commit()
+        hour = _rollup("1h", datetime(2025, 1, 15, 12, 0))
+        assert (hour.count, hour.sum, hour.max, hour.last) == (10, 136.0, 100.0, 100.0)
+        day = _rollup("1d", datetime(2025, 1, 15, 5, 0))
+        assert (day.count, day.sum, day.max) == (10, 136.0, 100.0)
+        assert db.session.scalar(select(MetricRollup.id).where(MetricRollup.tier == "1m")) is None
@@ -0,0 +1,57 @@
+import os
+import queue
+import pytest
+from app.spool import Spool
+
+def _topics(batch):
+    return [topic for topic, _ in batch]
+
+def test_replays_until_acked(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(5):
+        spool.put((f"t/{i}", b'{"kw": 1}'))
+    batch = spool.get_batch(3, timeout=0)
+    assert _topics(batch) == ["t/0", "t/1", "t/2"]
+    assert batch[0][1] == b'{"kw": 1}'
+    spool.rewind()  # the database write failed
+    assert _topics(spool.get_batch(10, timeout=0)) == ["t/0", "t/1", "t/2", "t/3", "t/4"]
+    spool.ack()
+    assert spool.get_batch(10, timeout=0) == []
+    assert spool.depth_bytes() == 0 and not spool.pending()
+
+def test_rotates_and_survives_restart(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=64)
+    for i in range(10):
+        spool.put((f"t/{i}", b"x" * 20))
+    assert spool.stats()["segments"] > 1
+    assert _topics(spool.get_batch(4, timeout=0)) == ["t/0", "t/1", "t/2", "t/3"]
+    spool.ack()
+    spool.get_batch(2, timeout=0)  # read but never acknowledged
+    spool.close()
+
+    reopened = Spool(str(tmp_path), segment_bytes=64)
+    reopened.put(("t/10", b"y"))
+    assert _topics(reopened.get_batch(100, timeout=0)) == [f"t/{i}" for i in range(4, 11)]
+    reopened.ack()
+    assert len(os.listdir(tmp_path)) <= 3  # consumed segments are deleted
+
+def test_skips_torn_tail_record(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.put(("t/0", b"ok"))
+    spool._writer.write(b"\x10\x00")  # crash halfway through a header
+    spool.close()
+    reopened = Spool(str(tmp_path))
+    reopened.put(("t/1", b"ok"))
+    assert _topics(reopened.get_batch(10, timeout=0)) == ["t/0", "t/1"]
+
+def test_put_raises_full_past_max_bytes(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=100)
+    for i in range(3):
+        spool.put((f"t/{i}", b"x" * 20))  # 33 bytes a record with its header
+    with pytest.raises(queue.Full):
+        spool.put(("t/3", b"x" * 20), timeout=0.01)
+    # acknowledged records free their space
+    spool.get_batch(2, timeout=0)
+    spool.ack()
+    spool.put(("t/3", b"x" * 20), timeout=0)
+    assert _topics(spool.get_batch(10, timeout=0)) == ["t/2", "t/3"]
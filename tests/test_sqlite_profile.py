@@ -0,0 +1,76 @@
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from app.models import db, Device, Metric
+from app.metric_writer import insert_metrics
+from app.registry_cache import registry_cache
+from app.sqlite_profile import READER_BIND
+
+def test_pragmas_and_read_routing(app):
+    with app.app_context():
+        writer, reader = db.engines[None], db.engines[READER_BIND]
+        with writer.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        with reader.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == app.config["SQLITE_BUSY_TIMEOUT_MS"]
+
+        assert db.session.get_bind(clause=select(Device)) is reader
+        device = registry_cache.resolve_device("Home", "Fridge")
+        insert_metrics([{"ts": datetime(2025, 1, 15), "device_id": device.id, "key": "power", "value": 1.0}])
+        # until commit, the session reads its own writes from the writer
+        assert db.session.get_bind(clause=select(Metric)) is writer
+        assert db.session.scalar(select(func.count()).select_from(Metric)) == 1
+        db.session.commit()
+        assert db.session.get_bind(clause=select(Metric)) is reader
+        assert db.session.scalar(select(func.count()).select_from(Metric)) == 1
+
+def test_concurrent_writers_queue_instead_of_locking(app):
+    with app.app_context():
+        device = registry_cache.resolve_device("Home", "Fridge")
+    errors = []
+
+    def write(worker):
+        with app.app_context():
+            try:
+                for i in range(20):
+                    ts = datetime(2025, 1, 15) + timedelta(seconds=worker * 100 + i)
+                    insert_metrics([{"ts": ts, "device_id": device.id, "key": "power", "value": float(i)}])
+                    db.session.commit()
+                    db.session.execute(select(func.count()).select_from(Metric)).scalar()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Metric)) == 120
+
+def test_writer_waits_and_maintenance_yield(app):
+    from app.sqlite_profile import writer_waits, yield_writer
+    writer_waits.clear()
+    with app.app_context():
+        held = db.engines[None].connect()
+    waited = threading.Event()
+
+    def checkout():
+        with app.app_context():
+            with db.engines[None].connect():
+                waited.set()
+
+    thread = threading.Thread(target=checkout)
+    thread.start()
+    while not writer_waits.waiting:
+        pass
+    # a maintenance job between transactions steps aside while someone waits for the writer
+    timer = threading.Timer(0.1, held.close)
+    timer.start()
+    yield_writer(limit=5)
+    thread.join()
+    assert waited.is_set()
+    stats = writer_waits.stats()
+    assert stats["waiting"] == 0 and stats["wait_ms"]["max"] >= 90